@@ -0,0 +1,364 @@
+#      This file is part of pyttygif.
+#
+#      pyttygif is free software: you can redistribute it and/or modify
+#      it under the terms of the GNU General Public License as published by
+#      the Free Software Foundation, either version 3 of the License, or
+#      (at your option) any later version.
+#
+#      pyttygif is distributed in the hope that it will be useful,
+#      but WITHOUT ANY WARRANTY; without even the implied warranty of
+#      MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#      GNU General Public License for more details.
+#
+#      You should have received a copy of the GNU General Public License
+#      along with pyttygif.  If not, see <https://www.gnu.org/licenses/>.
+
+"""
+Throughput benchmarks of pyttygif pipeline stages.
+
+Runs every stage on synthetic ttyrecs in a fresh process and reports
+frames/sec, bytes/sec and peak RSS. X11 tools are replaced with local
+stand-ins from fakebin directory and in-process capture talks to a fake
+X server (fakex.py), so no display is needed.
+
+Usage: python3 benchmarks/bench.py [--kinds tiny,huge] [--scale 0.1]
+"""
+
+import argparse
+import ctypes.util
+import json
+import multiprocessing
+import os
+import resource
+import signal
+import subprocess
+import sys
+import tempfile
+import time
+
+BENCH_DIR = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, os.path.dirname(BENCH_DIR))
+
+import ttyrecgen  # noqa: E402
+from pyttygif import (ttyplay, ttyindex, capture, gifbuilder,  # noqa: E402
+                      xwd, ximage)
+
+FAKEBIN = os.path.join(BENCH_DIR, 'fakebin')
+# Size of the fake terminal window, captured by fake xwd.
+WINDOW_SIZE = '800x480'
+# Display number of fake X server.
+FAKE_DISPLAY = 97
+
+
+def _gif_delays(path):
+    """
+    Compute ttyrec and GIF frame delays, like the CLI does.
+
+    :param path: Path to ttyrec.
+    :return: Tuple of ttyrec delays and GIF delays.
+    """
+    with ttyindex.IndexedTtyPlay(path) as tp:
+        delays = tp.compute_framedelays()
+    delays.append(5.0)
+    return delays, ttyplay.coalesce_delays(delays)
+
+
+def stage_read(path, ctx):
+    """Read all frames with TtyPlay."""
+    frames = size = 0
+    start = time.perf_counter()
+    tp = ttyplay.TtyPlay(path)
+    while tp.read_frame():
+        frames += 1
+        size += tp.length
+    return frames, size, time.perf_counter() - start
+
+
+def stage_read_indexed(path, ctx):
+    """Read all frames with IndexedTtyPlay."""
+    frames = size = 0
+    start = time.perf_counter()
+    tp = ttyindex.IndexedTtyPlay(path)
+    while tp.read_frame():
+        frames += 1
+        size += tp.length
+    return frames, size, time.perf_counter() - start
+
+
+def stage_delays(path, ctx):
+    """Compute frame delays with TtyPlay."""
+    start = time.perf_counter()
+    with ttyplay.TtyPlay(path) as tp:
+        delays = tp.compute_framedelays()
+    return len(delays) + 1, os.path.getsize(path), \
+        time.perf_counter() - start
+
+
+def stage_delays_indexed(path, ctx):
+    """Compute frame delays with IndexedTtyPlay."""
+    start = time.perf_counter()
+    with ttyindex.IndexedTtyPlay(path) as tp:
+        delays = tp.compute_framedelays()
+    return len(delays) + 1, os.path.getsize(path), \
+        time.perf_counter() - start
+
+
+def stage_coalesce(path, ctx):
+    """Join short ttyrec frames into GIF frames."""
+    with ttyindex.IndexedTtyPlay(path) as tp:
+        delays = tp.compute_framedelays()
+    start = time.perf_counter()
+    ttyplay.coalesce_delays(delays)
+    return len(delays), 0, time.perf_counter() - start
+
+
+def _queue_worker(taskqueue, resultqueue):
+    while True:
+        task = taskqueue.get()
+        if task is None:
+            return
+        resultqueue.put((task[0], task[1][:16]))
+
+
+def stage_queues(path, ctx):
+    """Pass captured frames through worker queues."""
+    frames = min(len(_gif_delays(path)[1]), ctx['max_captures'])
+    image = capture.capturewindow('1')
+    workers = multiprocessing.cpu_count()
+    taskqueue = multiprocessing.Queue(workers)
+    resultqueue = multiprocessing.Queue()
+    procs = [multiprocessing.Process(target=_queue_worker,
+                                     args=(taskqueue, resultqueue))
+             for _ in range(workers)]
+    start = time.perf_counter()
+    for p in procs:
+        p.start()
+    for frmno in range(frames):
+        taskqueue.put((frmno, image))
+    for _ in range(frames):
+        resultqueue.get()
+    for _ in procs:
+        taskqueue.put(None)
+    for p in procs:
+        p.join()
+    return frames, frames * len(image), time.perf_counter() - start
+
+
+def stage_capture(path, ctx):
+    """Capture window with (fake) xwd."""
+    frames = min(len(_gif_delays(path)[1]), ctx['max_captures'])
+    size = 0
+    start = time.perf_counter()
+    for _ in range(frames):
+        size += len(capture.capturewithretry('1'))
+    return frames, size, time.perf_counter() - start
+
+
+def stage_capture_xlib(path, ctx):
+    """Capture window in-process from fake X server."""
+    frames = min(len(_gif_delays(path)[1]), ctx['max_captures'])
+    size = 0
+    start = time.perf_counter()
+    with ximage.WindowCapture(1) as window:
+        for _ in range(frames):
+            size += len(window.capture().pixels)
+    return frames, size, time.perf_counter() - start
+
+
+def stage_convert(path, ctx):
+    """Convert captures with (fake) ImageMagick."""
+    frames = min(len(_gif_delays(path)[1]), ctx['max_captures'])
+    image = capture.capturewindow('1')
+    start = time.perf_counter()
+    for _ in range(frames):
+        capture.convertimage(image)
+    return frames, frames * len(image), time.perf_counter() - start
+
+
+def stage_convert_builtin(path, ctx):
+    """Convert captures with built-in XWD decoder."""
+    frames = min(len(_gif_delays(path)[1]), ctx['max_captures'])
+    image = capture.capturewindow('1')
+    start = time.perf_counter()
+    for _ in range(frames):
+        xwd.convertimage(image)
+    return frames, frames * len(image), time.perf_counter() - start
+
+
+def stage_gifbuilder(path, ctx):
+    """Feed GIF frames to (fake) gifsicle."""
+    delays, gifdelays = _gif_delays(path)
+    still = subprocess.run(['convert'], input=b'',
+                           stdout=subprocess.PIPE).stdout
+    output = os.path.join(ctx['workdir'], 'gifbuilder.gif')
+    start = time.perf_counter()
+    gif = gifbuilder.GifBuilder(output, None)
+    gif.start()
+    for delay in gifdelays:
+        gif.add_image(still, delay)
+    gif.close()
+    return len(gifdelays), len(gifdelays) * len(still), \
+        time.perf_counter() - start
+
+
+def _run_cli(path, ctx, args):
+    """
+    Run the whole pyttygif CLI.
+
+    :param path: Path to ttyrec.
+    :param ctx: Benchmark context.
+    :param args: Additional CLI arguments.
+    :return: Tuple of number of frames, bytes and elapsed time.
+    """
+    output = os.path.join(ctx['workdir'], 'pipeline.gif')
+    cmd = [sys.executable, '-m', 'pyttygif', path, output] + args
+    start = time.perf_counter()
+    subprocess.run(cmd, check=True, stdout=subprocess.DEVNULL,
+                   stderr=subprocess.DEVNULL,
+                   cwd=os.path.dirname(BENCH_DIR))
+    elapsed = time.perf_counter() - start
+    frames = len(_gif_delays(path)[0])
+    return frames, os.path.getsize(path), elapsed
+
+
+def stage_pipeline_x11(path, ctx):
+    """Render whole ttyrec with X11 backend and fake tools."""
+    return _run_cli(path, ctx, ['-f', '1000', '-D'])
+
+
+def stage_pipeline_headless(path, ctx):
+    """Render whole ttyrec with headless backend."""
+    return _run_cli(path, ctx, ['-B', 'headless'])
+
+
+STAGES = {
+    'read': stage_read,
+    'read-indexed': stage_read_indexed,
+    'delays': stage_delays,
+    'delays-indexed': stage_delays_indexed,
+    'coalesce': stage_coalesce,
+    'capture': stage_capture,
+    'capture-xlib': stage_capture_xlib,
+    'queues': stage_queues,
+    'convert': stage_convert,
+    'convert-builtin': stage_convert_builtin,
+    'gifbuilder': stage_gifbuilder,
+    'pipeline-x11': stage_pipeline_x11,
+    'pipeline-headless': stage_pipeline_headless,
+}
+
+
+def _run_stage(name, path, ctx, results):
+    """
+    Run the stage and report its results with peak RSS.
+
+    :return: None.
+    """
+    frames, size, elapsed = STAGES[name](path, ctx)
+    rss = max(resource.getrusage(resource.RUSAGE_SELF).ru_maxrss,
+              resource.getrusage(resource.RUSAGE_CHILDREN).ru_maxrss)
+    results.put((frames, size, elapsed, rss * 1024))
+
+
+def run_stage(name, path, ctx):
+    """
+    Run the stage in a fresh process, so that peak RSS is its own.
+
+    :param name: Name of the stage.
+    :param path: Path to ttyrec.
+    :param ctx: Benchmark context.
+    :return: Dict with stage results.
+    """
+    spawn = multiprocessing.get_context('spawn')
+    results = spawn.Queue()
+    proc = spawn.Process(target=_run_stage, args=(name, path, ctx, results))
+    proc.start()
+    proc.join()
+    if proc.exitcode:
+        raise RuntimeError("Stage {0} has failed".format(name))
+    frames, size, elapsed, rss = results.get()
+    elapsed = max(elapsed, 1e-9)
+    return {
+        'stage': name,
+        'frames': frames,
+        'bytes': size,
+        'seconds': elapsed,
+        'frames_per_sec': frames / elapsed,
+        'bytes_per_sec': size / elapsed,
+        'peak_rss': rss,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description='Benchmark pyttygif pipeline stages')
+    parser.add_argument('-k', '--kinds', default='tiny,huge,idle',
+                        help="Kinds of synthetic ttyrecs ({0})"
+                        .format(','.join(ttyrecgen.KINDS)))
+    stages = [name for name in STAGES if name != 'capture-xlib' or
+              ctypes.util.find_library('X11') is not None]
+    parser.add_argument('-s', '--stages', default=','.join(stages),
+                        help="Stages to run")
+    parser.add_argument('-x', '--scale', default=1.0, type=float,
+                        help="Multiplier of number of frames in ttyrecs")
+    parser.add_argument('-m', '--max-captures', default=200, type=int,
+                        help="Number of frames for per-capture stages")
+    parser.add_argument('-j', '--json', default=False, action='store_true',
+                        help="Print results as JSON")
+    args = parser.parse_args()
+
+    os.environ['PATH'] = FAKEBIN + os.pathsep + os.environ['PATH']
+    os.environ['WINDOWID'] = '1'
+    os.environ['FAKE_XWD_SIZE'] = WINDOW_SIZE
+    os.environ['DISPLAY'] = ':{0}'.format(FAKE_DISPLAY)
+    server = None
+    if 'capture-xlib' in args.stages.split(','):
+        server = subprocess.Popen([sys.executable,
+                                   os.path.join(BENCH_DIR, 'fakex.py'),
+                                   '--size', WINDOW_SIZE, str(FAKE_DISPLAY)])
+        path = '/tmp/.X11-unix/X{0}'.format(FAKE_DISPLAY)
+        while not os.path.exists(path) and server.poll() is None:
+            time.sleep(0.01)
+    results = []
+    try:
+        _run_kinds(args, results)
+    finally:
+        if server is not None:
+            server.send_signal(signal.SIGINT)
+            server.wait()
+    if args.json:
+        print(json.dumps(results, indent=2))
+
+
+def _run_kinds(args, results):
+    """
+    Generate ttyrecs of every kind and run the stages on them.
+
+    :param args: Parsed command line arguments.
+    :param results: List to append results of stages to.
+    :return: None.
+    """
+    with tempfile.TemporaryDirectory() as workdir:
+        ctx = {'workdir': workdir, 'max_captures': args.max_captures}
+        for kind in args.kinds.split(','):
+            path = os.path.join(workdir, kind + '.ttyrec')
+            count = int(ttyrecgen.KINDS[kind][1] * args.scale) or 1
+            frames, size = ttyrecgen.generate(path, kind, count)
+            if not args.json:
+                print("{0}: {1} frames, {2:.1f} MiB".format(
+                    kind, frames, size / 2**20))
+            for name in args.stages.split(','):
+                result = run_stage(name, path, ctx)
+                result['kind'] = kind
+                results.append(result)
+                if not args.json:
+                    print("  {0:<18} {1:>12.0f} frames/s {2:>9.2f} MiB/s "
+                          "{3:>8.1f} MiB RSS {4:>9.3f} s".format(
+                              name, result['frames_per_sec'],
+                              result['bytes_per_sec'] / 2**20,
+                              result['peak_rss'] / 2**20,
+                              result['seconds']))
+
+
+if __name__ == '__main__':
+    main()
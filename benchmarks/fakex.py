@@ -0,0 +1,381 @@
+#!/usr/bin/env python3
+#      This file is part of pyttygif.
+#
+#      pyttygif is free software: you can redistribute it and/or modify
+#      it under the terms of the GNU General Public License as published by
+#      the Free Software Foundation, either version 3 of the License, or
+#      (at your option) any later version.
+#
+#      pyttygif is distributed in the hope that it will be useful,
+#      but WITHOUT ANY WARRANTY; without even the implied warranty of
+#      MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#      GNU General Public License for more details.
+#
+#      You should have received a copy of the GNU General Public License
+#      along with pyttygif.  If not, see <https://www.gnu.org/licenses/>.
+
+"""
+Stand-in X server for in-process capture (-G xlib), so that it could be
+tested and benchmarked without Xvfb. It speaks just enough of X protocol
+for Xlib to connect, get attributes of window 1 and capture it with
+GetImage or MIT-SHM. Every capture draws a bar of a different length over
+a checkerboard. Window is resized, when the size file changes, and
+ConfigureNotify is sent to the clients, that have selected it.
+
+Usage: python3 benchmarks/fakex.py [--size 800x480] [--size-file PATH]
+                                   [--no-shm] [--fail-shm] [--log PATH]
+                                   DISPLAY
+"""
+
+import argparse
+import ctypes
+import os
+import select
+import socket
+import struct
+import sys
+
+ROOT = 0x100
+WINDOW = 1
+VISUAL = 0x21
+COLORMAP = 0x20
+# Major opcode of MIT-SHM extension.
+SHM_OPCODE = 130
+# Requests, replies and errors of X protocol, that are used.
+GET_WINDOW_ATTRIBUTES = 3
+CHANGE_WINDOW_ATTRIBUTES = 2
+GET_GEOMETRY = 14
+GET_PROPERTY = 20
+GET_INPUT_FOCUS = 43
+CREATE_GC = 55
+FREE_GC = 60
+GET_IMAGE = 73
+QUERY_EXTENSION = 98
+SHM_QUERY_VERSION = 0
+SHM_ATTACH = 1
+SHM_DETACH = 2
+SHM_GET_IMAGE = 4
+BAD_REQUEST = 1
+BAD_WINDOW = 3
+BAD_MATCH = 8
+BAD_ACCESS = 10
+CONFIGURE_NOTIFY = 22
+STRUCTURE_NOTIFY_MASK = 1 << 17
+Z_PIXMAP = 2
+
+
+def _checkerboard(width, height, bar):
+    """
+    Draw the window contents.
+
+    :param width: Width of the window.
+    :param height: Height of the window.
+    :param bar: Length of the bar in 8 pixel cells.
+    :return: Bytes of 32-bit pixels.
+    """
+    dark = struct.pack('<I', 0x000000) * 8
+    light = struct.pack('<I', 0x203040) * 8
+    even = ((light + dark) * (width // 16 + 1))[:width * 4]
+    odd = ((dark + light) * (width // 16 + 1))[:width * 4]
+    top = (struct.pack('<I', 0xff8000) * min(width, bar * 8) + even)
+    rows = [top[:width * 4]] * min(height, 8)
+    for y in range(len(rows), height):
+        rows.append(odd if (y // 8) % 2 else even)
+    return b''.join(rows)
+
+
+def _setup():
+    """
+    Make the connection setup reply with a single 24-bit TrueColor screen.
+
+    :return: Bytes of the reply.
+    """
+    vendor = b'fake'
+    formats = struct.pack('<BBB5x', 1, 1, 32) + \
+        struct.pack('<BBB5x', 24, 32, 32)
+    visual = struct.pack('<IBBHIII4x', VISUAL, 4, 8, 256, 0xff0000, 0xff00,
+                         0xff)
+    depth = struct.pack('<BxH4x', 24, 1) + visual
+    screen = struct.pack('<IIIIIHHHHHHIBBBB', ROOT, COLORMAP, 0xffffff, 0,
+                         0, 1024, 768, 300, 200, 1, 1, VISUAL, 0, 0, 24,
+                         1) + depth
+    body = struct.pack('<IIIIHHBBBBBBBB4x', 1, 0x400000, 0x3fffff, 0,
+                       len(vendor), 65535, 1, 2, 0, 0, 32, 32, 8, 255) + \
+        vendor + b'\0' * (-len(vendor) % 4) + formats + screen
+    return struct.pack('<BxHHH', 1, 11, 0, len(body) // 4) + body
+
+
+def _reply(seq, data, body=b'', extra=b''):
+    """
+    Make a reply to the request.
+
+    :param seq: Sequence number of the request.
+    :param data: Byte in the header of the reply.
+    :param body: Fixed part of the reply (up to 24 bytes).
+    :param extra: Variable part of the reply.
+    :return: Bytes of the reply.
+    """
+    body = body.ljust(24, b'\0') + extra
+    return struct.pack('<BBHI', 1, data, seq & 0xffff,
+                       (len(body) - 24) // 4) + body
+
+
+def _error(seq, code, major, minor=0, bad=0):
+    """
+    Make an error reply to the request.
+
+    :return: Bytes of the error.
+    """
+    return struct.pack('<BBHIHB21x', 0, code, seq & 0xffff, bad, minor,
+                       major)
+
+
+class FakeClient(object):
+    """
+    Connection of a single client.
+    """
+    def __init__(self, conn, options):
+        """
+        Take the accepted connection.
+
+        :param conn: Client socket.
+        :param options: Parsed command line arguments.
+        """
+        self.conn = conn
+        self.options = options
+        self.width, self.height = options.size
+        self.selected = False  # Whether ConfigureNotify is selected
+        self.captures = 0
+        self.segments = {}  # Addresses of attached segments by their ID
+        self.buffer = b''
+        self.seq = 0  # Sequence number of the last request
+        self.libc = ctypes.CDLL(None, use_errno=True)
+        self.libc.shmat.restype = ctypes.c_void_p
+        self.libc.shmat.argtypes = [ctypes.c_int, ctypes.c_void_p,
+                                    ctypes.c_int]
+        self.libc.shmdt.argtypes = [ctypes.c_void_p]
+
+    def _need(self, size):
+        """
+        Receive at least the number of bytes.
+
+        :param size: Number of bytes.
+        :return: None.
+        """
+        while len(self.buffer) < size:
+            # Resize is noticed while client is idle too, as real X server
+            # sends ConfigureNotify without waiting for a request.
+            if not select.select([self.conn], [], [], 0.05)[0]:
+                event = self._resize()
+                if event:
+                    self.conn.sendall(event)
+                continue
+            data = self.conn.recv(65536)
+            if not data:
+                raise EOFError
+            self.buffer += data
+
+    def serve(self):
+        """
+        Handle the requests, until client disconnects.
+
+        :return: None.
+        """
+        self._need(12)
+        namelen, datalen = struct.unpack_from('<HH', self.buffer, 6)
+        size = 12 + namelen + (-namelen % 4) + datalen + (-datalen % 4)
+        self._need(size)
+        self.buffer = self.buffer[size:]
+        self.conn.sendall(_setup())
+        while True:
+            self._need(4)
+            opcode, data, length = struct.unpack_from('<BBH', self.buffer)
+            header = 4
+            if length == 0:  # BIG-REQUESTS
+                self._need(8)
+                length = struct.unpack_from('<I', self.buffer, 4)[0]
+                header = 8
+            self._need(length * 4)
+            request = self.buffer[:4] + self.buffer[header:length * 4]
+            self.buffer = self.buffer[length * 4:]
+            self.seq += 1
+            if self.options.log is not None:
+                self.options.log.write('{0} {1}\n'.format(opcode, data))
+                self.options.log.flush()
+            out = self._resize() + self._handle(opcode, data, request,
+                                                 self.seq)
+            if out:
+                self.conn.sendall(out)
+
+    def _resize(self):
+        """
+        Resize the window to the size from the size file.
+
+        :return: Bytes of ConfigureNotify event (empty if there's none).
+        """
+        if self.options.size_file is None:
+            return b''
+        try:
+            with open(self.options.size_file) as f:
+                size = _size(f.read().strip())
+        except (OSError, ValueError):
+            return b''
+        if size == (self.width, self.height):
+            return b''
+        self.width, self.height = size
+        if not self.selected:
+            return b''
+        return struct.pack('<BxHIIIhhHHHB5x', CONFIGURE_NOTIFY,
+                           self.seq & 0xffff, WINDOW, WINDOW, 0, 0, 0,
+                           self.width, self.height, 0, 0)
+
+    def _handle(self, opcode, data, request, seq):
+        """
+        Handle the request.
+
+        :param opcode: Major opcode.
+        :param data: Data byte of the request header (minor opcode).
+        :param request: Bytes of the request (without the length).
+        :param seq: Sequence number of the request.
+        :return: Bytes of the reply (empty if there's none).
+        """
+        if opcode == QUERY_EXTENSION:
+            namelen = struct.unpack_from('<H', request, 4)[0]
+            name = request[8:8 + namelen]
+            if name == b'MIT-SHM' and self.options.shm:
+                return _reply(seq, 0, struct.pack('<BBBB', 1, SHM_OPCODE,
+                                                  0, 0))
+            return _reply(seq, 0, struct.pack('<BBBB', 0, 0, 0, 0))
+        if opcode == GET_WINDOW_ATTRIBUTES:
+            window = struct.unpack_from('<I', request, 4)[0]
+            if window not in (WINDOW, ROOT):
+                return _error(seq, BAD_WINDOW, opcode, bad=window)
+            return _reply(seq, 0, struct.pack(
+                '<IHBBIIBBBBIIIH2x', VISUAL, 1, 0, 0, 0, 0, 0, 1, 2, 0,
+                COLORMAP, 0, 0, 0))
+        if opcode == CHANGE_WINDOW_ATTRIBUTES:
+            mask = struct.unpack_from('<I', request, 8)[0]
+            if mask & 0x800:  # Event mask
+                events = struct.unpack_from('<I', request, 12)[0]
+                self.selected = bool(events & STRUCTURE_NOTIFY_MASK)
+            return b''
+        if opcode in (CREATE_GC, FREE_GC):  # Default GC of Xlib
+            return b''
+        if opcode == GET_GEOMETRY:
+            return _reply(seq, 24, struct.pack('<IhhHHH', ROOT, 0, 0,
+                                               self.width, self.height, 0))
+        if opcode == GET_PROPERTY:
+            return _reply(seq, 0, struct.pack('<III', 0, 0, 0))
+        if opcode == GET_INPUT_FOCUS:
+            return _reply(seq, 0, struct.pack('<I', WINDOW))
+        if opcode == GET_IMAGE:
+            window, x, y, width, height = struct.unpack_from('<IhhHH',
+                                                             request, 4)
+            if (width, height) != (self.width, self.height) or \
+                    data != Z_PIXMAP:
+                return _error(seq, BAD_MATCH, opcode)
+            return _reply(seq, 24, struct.pack('<I', VISUAL), self._draw())
+        if opcode == SHM_OPCODE:
+            return self._handle_shm(data, request, seq)
+        return _error(seq, BAD_REQUEST, opcode, data)
+
+    def _handle_shm(self, minor, request, seq):
+        """
+        Handle the request of MIT-SHM extension.
+
+        :return: Bytes of the reply (empty if there's none).
+        """
+        if minor == SHM_QUERY_VERSION:
+            return _reply(seq, 0, struct.pack('<HHHHB', 1, 2, 0, 0,
+                                              Z_PIXMAP))
+        if minor == SHM_ATTACH:
+            segment, shmid = struct.unpack_from('<II', request, 4)
+            address = None
+            if not self.options.fail_shm:
+                address = self.libc.shmat(shmid, None, 0)
+            if address in (None, ctypes.c_void_p(-1).value):
+                return _error(seq, BAD_ACCESS, SHM_OPCODE, minor)
+            self.segments[segment] = address
+            return b''
+        if minor == SHM_DETACH:
+            segment = struct.unpack_from('<I', request, 4)[0]
+            self.libc.shmdt(self.segments.pop(segment))
+            return b''
+        if minor == SHM_GET_IMAGE:
+            window, x, y, width, height, mask, fmt, segment, offset = \
+                struct.unpack_from('<IhhHHIB3xII', request, 4)
+            if (width, height) != (self.width, self.height):
+                return _error(seq, BAD_MATCH, SHM_OPCODE, minor)
+            pixels = self._draw()
+            ctypes.memmove(self.segments[segment] + offset, pixels,
+                           len(pixels))
+            return _reply(seq, 24, struct.pack('<II', VISUAL, len(pixels)))
+        return _error(seq, BAD_REQUEST, SHM_OPCODE, minor)
+
+    def _draw(self):
+        """
+        Draw the next capture.
+
+        :return: Bytes of pixels.
+        """
+        self.captures += 1
+        return _checkerboard(self.width, self.height, self.captures % 8)
+
+
+def _size(text):
+    """
+    Parse the window size.
+
+    :param text: String like 800x480.
+    :return: Tuple of width and height.
+    """
+    width, height = text.split('x')
+    return int(width), int(height)
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description='Stand-in X server for in-process capture')
+    parser.add_argument('display', type=int, help="Display number")
+    parser.add_argument('-s', '--size', default=(800, 480), type=_size,
+                        help="Size of the window, WIDTHxHEIGHT")
+    parser.add_argument('-f', '--size-file', default=None,
+                        help="File with the new size of the window")
+    parser.add_argument('-n', '--no-shm', dest='shm', default=True,
+                        action='store_false', help="Don't offer MIT-SHM")
+    parser.add_argument('-r', '--fail-shm', default=False,
+                        action='store_true',
+                        help="Refuse to attach shared memory")
+    parser.add_argument('-l', '--log', default=None,
+                        type=argparse.FileType('a'),
+                        help="File to log opcodes of requests to")
+    options = parser.parse_args()
+
+    os.makedirs('/tmp/.X11-unix', exist_ok=True)
+    path = '/tmp/.X11-unix/X{0}'.format(options.display)
+    if os.path.exists(path):
+        os.unlink(path)
+    server = socket.socket(socket.AF_UNIX)
+    server.bind(path)
+    server.listen(5)
+    try:
+        while True:
+            conn, _ = server.accept()
+            if os.fork() == 0:
+                server.close()
+                try:
+                    FakeClient(conn, options).serve()
+                except (EOFError, ConnectionError):
+                    pass
+                os._exit(0)
+            conn.close()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.close()
+        os.unlink(path)
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,120 @@
+#      This file is part of pyttygif.
+#
+#      pyttygif is free software: you can redistribute it and/or modify
+#      it under the terms of the GNU General Public License as published by
+#      the Free Software Foundation, either version 3 of the License, or
+#      (at your option) any later version.
+#
+#      pyttygif is distributed in the hope that it will be useful,
+#      but WITHOUT ANY WARRANTY; without even the implied warranty of
+#      MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#      GNU General Public License for more details.
+#
+#      You should have received a copy of the GNU General Public License
+#      along with pyttygif.  If not, see <https://www.gnu.org/licenses/>.
+
+"""
+Generators of synthetic ttyrecs for benchmarks.
+"""
+
+import random
+import struct
+
+HEADER = struct.Struct('<III')
+
+
+def _write(f, frames):
+    """
+    Write the frames into ttyrec.
+
+    :param f: File object open for binary writing.
+    :param frames: Iterable of (timestamp, payload) tuples.
+    :return: Tuple of number of frames and bytes written.
+    """
+    count = size = 0
+    for timestamp, payload in frames:
+        sec = int(timestamp)
+        usec = int((timestamp - sec) * 1000000)
+        f.write(HEADER.pack(sec, usec, len(payload)))
+        f.write(payload)
+        count += 1
+        size += HEADER.size + len(payload)
+    return count, size
+
+
+def tiny_frames(count, seed=0):
+    """
+    Lots of short frames with a few characters each (e.g. typing).
+
+    :param count: Number of frames.
+    :param seed: Random seed.
+    :return: Generator of (timestamp, payload) tuples.
+    """
+    rnd = random.Random(seed)
+    timestamp = 1000000000.0
+    for i in range(count):
+        timestamp += rnd.choice((0.001, 0.002, 0.005, 0.05, 0.12))
+        payload = '\x1b[{0};{1}H{2}'.format(
+            rnd.randint(1, 24), rnd.randint(1, 80),
+            chr(rnd.randint(0x21, 0x7e)) * rnd.randint(1, 4))
+        yield timestamp, payload.encode()
+
+
+def huge_frames(count, seed=0):
+    """
+    Few frames, each redrawing the whole screen in colors.
+
+    :param count: Number of frames.
+    :param seed: Random seed.
+    :return: Generator of (timestamp, payload) tuples.
+    """
+    rnd = random.Random(seed)
+    timestamp = 1000000000.0
+    for i in range(count):
+        timestamp += rnd.uniform(0.1, 1.0)
+        lines = ['\x1b[H\x1b[2J']
+        for row in range(24):
+            lines.append(''.join(
+                '\x1b[3{0}m{1}'.format(rnd.randint(0, 7),
+                                       chr(rnd.randint(0x21, 0x7e)))
+                for col in range(80)))
+        yield timestamp, '\r\n'.join(lines).encode() * 4
+
+
+def idle_gaps(count, seed=0):
+    """
+    Frames separated by long periods of inactivity.
+
+    :param count: Number of frames.
+    :param seed: Random seed.
+    :return: Generator of (timestamp, payload) tuples.
+    """
+    rnd = random.Random(seed)
+    timestamp = 1000000000.0
+    for i in range(count):
+        timestamp += rnd.choice((0.01, 0.1, 30.0, 600.0, 3600.0))
+        yield timestamp, '$ command {0}\r\n'.format(i).encode()
+
+
+# Kinds of synthetic ttyrecs and default number of frames in them.
+KINDS = {
+    'tiny': (tiny_frames, 100000),
+    'huge': (huge_frames, 200),
+    'idle': (idle_gaps, 10000),
+    'long': (tiny_frames, 2000000),
+}
+
+
+def generate(path, kind, count=None, seed=0):
+    """
+    Generate a synthetic ttyrec.
+
+    :param path: Path to write ttyrec to.
+    :param kind: Kind of ttyrec (key of KINDS).
+    :param count: Number of frames (None - default for the kind).
+    :param seed: Random seed.
+    :return: Tuple of number of frames and size in bytes.
+    """
+    generator, default = KINDS[kind]
+    with open(path, 'wb') as f:
+        return _write(f, generator(count or default, seed))
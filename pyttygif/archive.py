@@ -0,0 +1,245 @@
+#      This file is part of pyttygif.
+#
+#      pyttygif is free software: you can redistribute it and/or modify
+#      it under the terms of the GNU General Public License as published by
+#      the Free Software Foundation, either version 3 of the License, or
+#      (at your option) any later version.
+#
+#      pyttygif is distributed in the hope that it will be useful,
+#      but WITHOUT ANY WARRANTY; without even the implied warranty of
+#      MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#      GNU General Public License for more details.
+#
+#      You should have received a copy of the GNU General Public License
+#      along with pyttygif.  If not, see <https://www.gnu.org/licenses/>.
+
+import array
+import os
+import struct
+import sys
+import time
+
+from pyttygif import gifbuilder, ttyplay
+
+# Header of frame archive: magic and format version.
+ARCHIVE_MAGIC = b'PYTTYARC'
+ARCHIVE_VERSION = 1
+ARCHIVE_HEADER = struct.Struct('<8sI')
+# Header of each frame: size of the converted GIF frame.
+FRAME_HEADER = struct.Struct('<I')
+# Trailer of archive: offset of timings, number of recorded delays, number
+# of frames and magic.
+ARCHIVE_TRAILER = struct.Struct('<QQQ8s')
+
+
+def is_archive(path):
+    """
+    Check if the file is a frame archive.
+
+    :param path: Path to the file.
+    :return: True if file starts with archive magic.
+    """
+    with open(path, 'rb') as f:
+        return f.read(len(ARCHIVE_MAGIC)) == ARCHIVE_MAGIC
+
+
+class FrameArchive(object):
+    """
+    Writer of converted GIF frames, that are kept together with recorded
+    ttyrec timings, so that GIF could be rebuilt with other timing options
+    without rendering it again. Frames are written by GIF builder process,
+    timings are appended by the main process.
+    """
+    def __init__(self, path):
+        """
+        Create a new archive writer.
+
+        :param path: Path of the archive to create.
+        """
+        self.path = path
+        self.file = None
+
+    def start(self):
+        """
+        Create the archive file.
+
+        :return: None.
+        """
+        self.file = open(self.path, 'wb')
+        self.file.write(ARCHIVE_HEADER.pack(ARCHIVE_MAGIC, ARCHIVE_VERSION))
+
+    def add_frame(self, frame):
+        """
+        Save the converted frame.
+
+        :param frame: GIF image of the frame.
+        :return: None.
+        """
+        self.file.write(FRAME_HEADER.pack(len(frame)))
+        self.file.write(frame)
+
+    def close(self):
+        """
+        Close the archive file (it's finished with write_timings).
+
+        :return: None.
+        """
+        if self.file is not None:
+            self.file.close()
+            self.file = None
+
+    def write_timings(self, rawdelays, ends):
+        """
+        Append ttyrec timings to the archive with all frames written.
+
+        :param rawdelays: List of recorded ttyrec frame delays (without
+                          speed and time compression).
+        :param ends: List of the last ttyrec frame (zero-based), that is
+                     shown by each GIF frame.
+        :return: None.
+        """
+        with open(self.path, 'r+b') as f:
+            offset = f.seek(0, os.SEEK_END)
+            rawdelays = array.array('d', rawdelays)
+            if sys.byteorder != 'little':
+                rawdelays.byteswap()
+            f.write(rawdelays.tobytes())
+            f.write(struct.pack('<{0}I'.format(len(ends)), *ends))
+            f.write(ARCHIVE_TRAILER.pack(offset, len(rawdelays), len(ends),
+                                         ARCHIVE_MAGIC))
+
+
+class ArchiveReader(object):
+    """
+    Reader of frame archive.
+    """
+    def __init__(self, path):
+        """
+        Open the archive and read ttyrec timings.
+
+        :param path: Path to the archive.
+        """
+        self.file = open(path, 'rb')
+        try:
+            self._read_timings()
+        except (ValueError, struct.error):
+            self.file.close()
+            raise
+
+    def _read_timings(self):
+        """
+        Read ttyrec timings from the end of archive.
+
+        :return: None.
+        """
+        magic, version = ARCHIVE_HEADER.unpack(
+            self.file.read(ARCHIVE_HEADER.size))
+        if magic != ARCHIVE_MAGIC:
+            raise ValueError("Not a frame archive")
+        if version != ARCHIVE_VERSION:
+            raise ValueError("Unsupported frame archive version: {0}"
+                             .format(version))
+        self.file.seek(-ARCHIVE_TRAILER.size, os.SEEK_END)
+        offset, ndelays, nframes, magic = ARCHIVE_TRAILER.unpack(
+            self.file.read(ARCHIVE_TRAILER.size))
+        if magic != ARCHIVE_MAGIC:
+            raise ValueError("Frame archive is incomplete")
+        self.timings = offset  # Offset where frames end
+        self.file.seek(offset)
+        self.rawdelays = array.array('d')
+        self.rawdelays.frombytes(self.file.read(8 * ndelays))
+        if sys.byteorder != 'little':
+            self.rawdelays.byteswap()
+        self.ends = list(struct.unpack(
+            '<{0}I'.format(nframes), self.file.read(4 * nframes)))
+
+    def frames(self):
+        """
+        Read the converted frames.
+
+        :return: Generator of GIF images.
+        """
+        self.file.seek(ARCHIVE_HEADER.size)
+        count = 0
+        while self.file.tell() < self.timings:
+            if count == len(self.ends):
+                raise ValueError("Frame archive has more frames than "
+                                 "timings")
+            size, = FRAME_HEADER.unpack(self.file.read(FRAME_HEADER.size))
+            frame = self.file.read(size)
+            if len(frame) < size:
+                raise ValueError("Short read: Couldn't read a whole frame!")
+            count += 1
+            yield frame
+        if count != len(self.ends):
+            raise ValueError("Frame archive has less frames than timings")
+
+    def close(self):
+        """
+        Close the archive.
+
+        :return: None.
+        """
+        self.file.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        self.close()
+
+
+def frame_delays(delays, ends, delaycap=float('+inf')):
+    """
+    Compute delays of archived GIF frames. Each frame is shown for all the
+    ttyrec frames after the previous GIF frame, up to its own. Frames are
+    already captured, so they can't be joined and are shown for at least
+    the shortest GIF delay.
+
+    :param delays: List of ttyrec frame delays (including the last frame).
+    :param ends: List of the last ttyrec frame of each GIF frame.
+    :param delaycap: Maximum delay of a single GIF frame.
+    :return: List of GIF frame delays.
+    """
+    gifdelays = []
+    start = 0
+    for end in ends:
+        delay = min(delaycap, sum(delays[start:end + 1]))
+        gifdelays.append(max(ttyplay.MIN_GIF_DELAY, delay))
+        start = end + 1
+    return gifdelays
+
+
+def retime(path, output, options):
+    """
+    Rebuild GIF from frame archive with new timing and compression options.
+
+    :param path: Path to the frame archive.
+    :param output: Path to save the resulting GIF.
+    :param options: Namespace with options (speed, logarithmic, lastframe,
+                    delaycap, loop, optimize_level, no_conserve_memory and
+                    lossy are used).
+    :return: Dict with stats.
+    """
+    time_start = time.time()
+    with ArchiveReader(path) as archive:
+        delays = ttyplay.scale_delays(archive.rawdelays, options.speed,
+                                      options.logarithmic)
+        delays.append(options.lastframe)
+        gifdelays = frame_delays(delays, archive.ends, options.delaycap)
+        # Frames carry their own delays, so that argument list of gifsicle
+        # doesn't grow with their number.
+        gif = gifbuilder.GifBuilder(output, None, options.loop,
+                                    options.optimize_level,
+                                    not options.no_conserve_memory,
+                                    options.lossy)
+        gif.start()
+        for frame, delay in zip(archive.frames(), gifdelays):
+            gif.add_image(frame, delay)
+        gif.close()
+    return {
+        'render_time': time.time() - time_start,
+        'input_frames': len(delays),
+        'output_frames': len(gifdelays),
+        'gif_duration': sum(d for d in gifdelays if round(d * 100)),
+    }
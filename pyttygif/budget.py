@@ -0,0 +1,125 @@
+#      This file is part of pyttygif.
+#
+#      pyttygif is free software: you can redistribute it and/or modify
+#      it under the terms of the GNU General Public License as published by
+#      the Free Software Foundation, either version 3 of the License, or
+#      (at your option) any later version.
+#
+#      pyttygif is distributed in the hope that it will be useful,
+#      but WITHOUT ANY WARRANTY; without even the implied warranty of
+#      MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#      GNU General Public License for more details.
+#
+#      You should have received a copy of the GNU General Public License
+#      along with pyttygif.  If not, see <https://www.gnu.org/licenses/>.
+
+import heapq
+
+from pyttygif import ttyplay
+
+
+def frame_limit(max_frames=None, target_size=None, frame_size=None):
+    """
+    Compute the number of GIF frames, that fit into the budget.
+
+    :param max_frames: Maximum number of GIF frames (None - unlimited).
+    :param target_size: Desired size of GIF in bytes (None - unlimited).
+    :param frame_size: Estimated size of a single GIF frame in bytes.
+    :return: Maximum number of GIF frames or None if unlimited.
+    """
+    limits = []
+    if max_frames is not None:
+        limits.append(max_frames)
+    if target_size is not None and frame_size:
+        limits.append(target_size // frame_size)
+    if not limits:
+        return None
+    return max(1, min(limits))
+
+
+def decimate(delays, lengths, limit, delaycap=float('+inf')):
+    """
+    Choose the ttyrec frames to capture, so that GIF has no more than the
+    limit of frames. Captures, that follow the least output to terminal
+    (and so are likely to change the least), are dropped first, and their
+    delays are joined with the next capture. The last capture is always
+    kept to show the final screen.
+
+    :param delays: List of ttyrec frame delays (including the last frame).
+    :param lengths: List of ttyrec frame payload lengths.
+    :param limit: Maximum number of GIF frames.
+    :param delaycap: Maximum delay of a single GIF frame.
+    :return: List in the format of ttyplay.capture_delays.
+    """
+    points = ttyplay.capture_delays(delays)
+    captures = [i for i, p in enumerate(points) if p is not None]
+    excess = len(captures) - limit
+    if excess > 0:
+        # Bytes drawn since the previous capture.
+        drawn = []
+        start = 0
+        for i in captures:
+            drawn.append(sum(lengths[start:i + 1]))
+            start = i + 1
+        # Kept captures are linked, so that the dropped one could pass its
+        # delay and output to the next one. Merged captures get pushed to
+        # the heap again and stale entries are skipped.
+        following = list(range(1, len(captures) + 1))
+        preceding = list(range(-1, len(captures) - 1))
+        heap = [(drawn[k], points[i], k)
+                for k, i in enumerate(captures[:-1])]
+        heapq.heapify(heap)
+        while excess > 0:
+            weight, delay, k = heapq.heappop(heap)
+            if points[captures[k]] is None or weight != drawn[k] or \
+                    delay != points[captures[k]]:
+                continue
+            nxt = following[k]
+            drawn[nxt] += weight
+            points[captures[nxt]] += delay
+            points[captures[k]] = None
+            if preceding[k] >= 0:
+                following[preceding[k]] = nxt
+            preceding[nxt] = preceding[k]
+            if nxt < len(captures) - 1:
+                heapq.heappush(heap, (drawn[nxt], points[captures[nxt]],
+                                      nxt))
+            excess -= 1
+    return [None if p is None else min(delaycap, p) for p in points]
+
+
+def merge_identical(tp, screen, points, first=0):
+    """
+    Join the captures, that show the same screen as the previous ones, into
+    the following captures, so that identical frames aren't captured and
+    GIF delays are still known in advance. Screens are compared by playing
+    ttyrec on the terminal model. Consumes the ttyrec player.
+
+    :param tp: TtyPlay at the beginning of ttyrec.
+    :param screen: terminal.Screen to play on.
+    :param points: List in the format of ttyplay.capture_delays.
+    :param first: Number of the ttyrec frame, that points start with (frames
+                  before it are only drawn).
+    :return: Tuple of list in the format of ttyplay.capture_delays and
+             number of merged captures.
+    """
+    points = list(points)
+    merged = 0
+    previous = prevdigest = None
+    while tp.frameno < first and tp.read_frame():
+        screen.feed(tp.frame)
+    while tp.frameno - first < len(points) and tp.read_frame():
+        screen.feed(tp.frame)
+        i = tp.frameno - 1 - first
+        if points[i] is None:
+            continue
+        digest = screen.digest()
+        if digest == prevdigest:
+            # The screen is the same, so capturing it later shows the
+            # previous frame as well. Delays are capped per capture.
+            points[i] += points[previous]
+            points[previous] = None
+            merged += 1
+        prevdigest = digest
+        previous = i
+    return points, merged
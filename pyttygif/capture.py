@@ -13,22 +13,28 @@
 #      You should have received a copy of the GNU General Public License
 #      along with pyttygif.  If not, see <https://www.gnu.org/licenses/>.
 
+import asyncio
 import subprocess
+import time
 
 
-def capturewithretry(windowid, retries=5):
+def capturewithretry(windowid, retries=5, timer=None):
     """
     Wrapper for capturewindow. xwd sometimes seems to fail randomly. In that
     case, retry the screenshot capture.
 
     :param windowid: Window ID of the window to capture.
     :param retries: Number of times to retry capture.
+    :param timer: StageTimer to account failed captures to (None - don't).
     :return: Raw image bytes.
     """
     while True:
+        start = time.perf_counter()
         try:
             return capturewindow(windowid)
         except ChildProcessError:
+            if timer is not None:
+                timer.add('capture retry', time.perf_counter() - start)
             retries -= 1
             if retries == 0:
                 raise
@@ -51,14 +57,59 @@ def capturewindow(windowid):
     return image
 
 
-def convertimage(image):
+async def capturewithretry_async(windowid, retries=5, timer=None):
+    """
+    Same as capturewithretry, but doesn't block the event loop while xwd
+    is running.
+
+    :param windowid: Window ID of the window to capture.
+    :param retries: Number of times to retry capture.
+    :param timer: StageTimer to account failed captures to (None - don't).
+    :return: Raw image bytes.
+    """
+    while True:
+        start = time.perf_counter()
+        try:
+            return await capturewindow_async(windowid)
+        except ChildProcessError:
+            if timer is not None:
+                timer.add('capture retry', time.perf_counter() - start)
+            retries -= 1
+            if retries == 0:
+                raise
+
+
+async def capturewindow_async(windowid):
+    """
+    Capture the window with xwd, running as asyncio subprocess.
+
+    :param windowid: Window ID of the window to capture.
+    :return: Raw image bytes.
+    """
+    cap = await asyncio.create_subprocess_exec(
+        'xwd', '-silent', '-id', windowid, stdout=subprocess.PIPE,
+        stderr=subprocess.PIPE)
+    image = (await cap.communicate())[0]
+    if cap.returncode:
+        raise ChildProcessError("Failed to capture the window: {0}"
+                                .format(cap.returncode))
+    return image
+
+
+def convertimage(image, region=None):
     """
     Convert XWD image into a still GIF frame.
 
     :param image: Raw XWD image bytes.
+    :param region: Tuple of (left, top, width, height) to crop the frame to
+                   (None - whole image).
     :return: Compressed GIF image.
     """
     convcmd = ['convert', 'xwd:-', 'gif:-']
+    if region is not None:
+        # Cropped image keeps its offset on the page, which ends up as
+        # position of the frame on the GIF logical screen.
+        convcmd[2:2] = ['-crop', '{2}x{3}+{0}+{1}'.format(*region)]
     conv = subprocess.Popen(convcmd, stdin=subprocess.PIPE,
                             stdout=subprocess.PIPE, stderr=subprocess.PIPE,
                             bufsize=-1)
@@ -0,0 +1,236 @@
+#      This file is part of pyttygif.
+#
+#      pyttygif is free software: you can redistribute it and/or modify
+#      it under the terms of the GNU General Public License as published by
+#      the Free Software Foundation, either version 3 of the License, or
+#      (at your option) any later version.
+#
+#      pyttygif is distributed in the hope that it will be useful,
+#      but WITHOUT ANY WARRANTY; without even the implied warranty of
+#      MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#      GNU General Public License for more details.
+#
+#      You should have received a copy of the GNU General Public License
+#      along with pyttygif.  If not, see <https://www.gnu.org/licenses/>.
+
+import json
+import os
+import struct
+
+# Files in the checkpoint directory.
+KEY_FILE = 'key.json'
+FRAMES_FILE = 'frames'
+ENDS_FILE = 'ends'
+# Marks the directory, that was created by pyttygif, to be removed along
+# with the checkpoint.
+CREATED_FILE = 'created'
+# Header of each checkpointed frame: GIF frame number, delay and size of
+# the converted frame.
+FRAME_RECORD = struct.Struct('<IdI')
+# Record of each sent frame: GIF frame number, the last ttyrec frame shown
+# by it and number of duplicates merged so far.
+END_RECORD = struct.Struct('<III')
+# Options, that don't change the resulting animation.
+VOLATILE_OPTIONS = ('progress', 'stats_file', 'checkpoint_dir', 'dry_run',
+                    'json', 'batch', 'retime', 'save_index', 'max_backlog',
+                    'backlog_memory', 'shared_memory', 'dirty',
+                    'no_disable_screensaver')
+
+
+def render_key(input, output, options):
+    """
+    Identify the render, so that checkpoint is only resumed by the same one.
+
+    :param input: Path to the ttyrec file.
+    :param output: Path to save the resulting animation or file object.
+    :param options: Namespace with options.
+    :return: JSON string.
+    """
+    st = os.stat(input)
+    return json.dumps({
+        'input': os.path.abspath(input),
+        'size': st.st_size,
+        'mtime': st.st_mtime_ns,
+        'output': output if isinstance(output, str) else None,
+        'options': {name: value for name, value in vars(options).items()
+                    if name not in VOLATILE_OPTIONS},
+    }, sort_keys=True, default=str)
+
+
+class Checkpoint(object):
+    """
+    Directory, where converted frames of the render are kept until it
+    completes, so that an interrupted render could be resumed. Frames are
+    appended by GIF builder process in their final order, ends of the
+    frames are appended by the main process before the frames are queued.
+    """
+    def __init__(self, directory, key):
+        """
+        Create a new checkpoint.
+
+        :param directory: Path to the checkpoint directory.
+        :param key: Key of the render (see render_key).
+        """
+        self.directory = directory
+        self.key = key
+        self.lastframe = 0  # GIF frame number of the last saved frame
+        self.end = -1  # The last ttyrec frame, shown by the saved frames
+        self.duplicates = 0  # Captures merged into the saved frames
+        self.gifdelays = []  # Delays of the saved frames
+        self.ends = []  # The last ttyrec frame, shown by each saved frame
+        self.frmnos = []  # GIF frame numbers of the saved frames
+        self.merged = []  # Captures merged so far, by each saved frame
+        self.size = 0  # Size of the saved frames in the frames file
+        self.file = None  # Frames file of GIF builder
+        self.endsfile = None  # Ends file of the main process
+
+    def _path(self, name):
+        """
+        Get the path of the checkpoint file.
+
+        :param name: Name of the file.
+        :return: Path to the file.
+        """
+        return os.path.join(self.directory, name)
+
+    def load(self):
+        """
+        Find the saved frames of the interrupted render. Files, that are
+        left by another render, are discarded.
+
+        :return: True if there are saved frames to resume from.
+        """
+        if not os.path.isdir(self.directory):
+            os.makedirs(self.directory)
+            open(self._path(CREATED_FILE), 'w').close()
+        try:
+            with open(self._path(KEY_FILE)) as f:
+                resumed = f.read() == self.key
+        except FileNotFoundError:
+            resumed = False
+        if resumed:
+            try:
+                self._read()
+            except FileNotFoundError:
+                pass
+        if not self.gifdelays:
+            with open(self._path(KEY_FILE), 'w') as f:
+                f.write(self.key)
+        # Frames past the last complete one are dropped, they are captured
+        # again.
+        with open(self._path(FRAMES_FILE), 'ab') as f:
+            f.truncate(self.size)
+        with open(self._path(ENDS_FILE), 'wb') as f:
+            for frmno, end, duplicates in zip(self.frmnos, self.ends,
+                                              self.merged):
+                f.write(END_RECORD.pack(frmno, end, duplicates))
+        return bool(self.gifdelays)
+
+    def _read(self):
+        """
+        Read the frames, that are saved along with their ends.
+
+        :return: None.
+        """
+        ends = {}
+        with open(self._path(ENDS_FILE), 'rb') as f:
+            data = f.read()
+        for offset in range(0, len(data) - END_RECORD.size + 1,
+                            END_RECORD.size):
+            frmno, end, duplicates = END_RECORD.unpack_from(data, offset)
+            ends[frmno] = (end, duplicates)
+        with open(self._path(FRAMES_FILE), 'rb') as f:
+            filesize = f.seek(0, os.SEEK_END)
+            f.seek(0)
+            while True:
+                header = f.read(FRAME_RECORD.size)
+                if len(header) < FRAME_RECORD.size:
+                    break
+                frmno, delay, size = FRAME_RECORD.unpack(header)
+                if frmno not in ends or f.seek(size, os.SEEK_CUR) > filesize:
+                    break
+                self.lastframe = frmno
+                self.end, self.duplicates = ends[frmno]
+                self.gifdelays.append(delay)
+                self.ends.append(self.end)
+                self.frmnos.append(frmno)
+                self.merged.append(self.duplicates)
+                self.size = f.tell()
+
+    def saved_frames(self):
+        """
+        Read the saved frames.
+
+        :return: Generator of (frame, delay) tuples.
+        """
+        with open(self._path(FRAMES_FILE), 'rb') as f:
+            while f.tell() < self.size:
+                frmno, delay, size = FRAME_RECORD.unpack(
+                    f.read(FRAME_RECORD.size))
+                yield f.read(size), delay
+
+    def start(self):
+        """
+        Open the frames file to append new frames to.
+
+        :return: None.
+        """
+        self.file = open(self._path(FRAMES_FILE), 'ab')
+
+    def add_frame(self, frmno, frame, delay):
+        """
+        Save the converted frame.
+
+        :param frmno: GIF frame number.
+        :param frame: Converted frame.
+        :param delay: Delay of the frame.
+        :return: None.
+        """
+        self.file.write(FRAME_RECORD.pack(frmno, delay, len(frame)))
+        self.file.write(frame)
+        self.file.flush()
+
+    def add_end(self, frmno, end, duplicates):
+        """
+        Save the last ttyrec frame, shown by the GIF frame.
+
+        :param frmno: GIF frame number.
+        :param end: The last ttyrec frame (zero-based).
+        :param duplicates: Number of captures, merged so far.
+        :return: None.
+        """
+        if self.endsfile is None:
+            self.endsfile = open(self._path(ENDS_FILE), 'ab')
+        self.endsfile.write(END_RECORD.pack(frmno, end, duplicates))
+        self.endsfile.flush()
+
+    def close(self):
+        """
+        Close the files, keeping the checkpoint to resume from.
+
+        :return: None.
+        """
+        for f in (self.file, self.endsfile):
+            if f is not None:
+                f.close()
+        self.file = self.endsfile = None
+
+    def finish(self):
+        """
+        Remove the checkpoint of the completed render. The directory is
+        removed as well, if pyttygif has created it and nothing else was put
+        there.
+
+        :return: None.
+        """
+        self.close()
+        for name in (KEY_FILE, FRAMES_FILE, ENDS_FILE):
+            try:
+                os.unlink(self._path(name))
+            except FileNotFoundError:
+                pass
+        try:
+            os.unlink(self._path(CREATED_FILE))
+            os.rmdir(self.directory)
+        except OSError:
+            pass  # Directory isn't ours or there's something else in it
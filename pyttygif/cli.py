@@ -0,0 +1,388 @@
+#      This file is part of pyttygif.
+#
+#      pyttygif is free software: you can redistribute it and/or modify
+#      it under the terms of the GNU General Public License as published by
+#      the Free Software Foundation, either version 3 of the License, or
+#      (at your option) any later version.
+#
+#      pyttygif is distributed in the hope that it will be useful,
+#      but WITHOUT ANY WARRANTY; without even the implied warranty of
+#      MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#      GNU General Public License for more details.
+#
+#      You should have received a copy of the GNU General Public License
+#      along with pyttygif.  If not, see <https://www.gnu.org/licenses/>.
+
+import argparse
+import datetime
+import math
+import multiprocessing
+import os
+import sys
+
+from pyttygif import archive, encoders, plan, render, timing
+
+
+def print_err(*args, **kwargs):
+    print(*args, file=sys.stderr, **kwargs)
+
+
+def make_parser():
+    """
+    Make the parser of CLI arguments.
+
+    :return: ArgumentParser.
+    """
+    parser = argparse.ArgumentParser(
+        description='Convert ttyrec to GIF animation')
+    maingroup = parser.add_argument_group("Main options")
+    maingroup.add_argument('input', default=None, nargs='?',
+                           help="Path to the ttyrec file to convert "
+                                "(- = stdin)")
+    maingroup.add_argument('output', default=None, nargs='?',
+                           help="Path to save the resulting GIF "
+                                "(- = stdout)")
+    maingroup.add_argument('-s', '--speed', default=1.0,
+                           type=float, help="Speed multiplier")
+    maingroup.add_argument('-t', '--start', default=None,
+                           help="Render from this recorded time "
+                                "([[HH:]MM:]SS) or ttyrec frame (Nf)")
+    maingroup.add_argument('-u', '--end', default=None,
+                           help="Render until this recorded time "
+                                "([[HH:]MM:]SS) or up to this ttyrec frame "
+                                "(Nf)")
+    maingroup.add_argument('-a', '--format', default=None,
+                           choices=['gif', 'apng', 'webp'],
+                           help="Output format (by default guessed by output "
+                                "file extension)")
+    maingroup.add_argument('-l', '--loop', default=1, type=int,
+                           help="Number of times to play the GIF "
+                                "(0 = infinity)")
+
+    advgroup = parser.add_argument_group("Advanced options")
+    advgroup.add_argument('-L', '--lastframe', default=5.0, type=float,
+                          help="How long to display the last frame")
+    advgroup.add_argument('-m', '--no-conserve-memory', default=False,
+                          action='store_true',
+                          help="Use more RAM for speedup")
+    advgroup.add_argument('-o', '--optimize-level', default=2,
+                          choices=range(0, 4), type=int,
+                          help="Optimize the GIF (levels 0-3)")
+    advgroup.add_argument('-S', '--no-disable-screensaver', default=False,
+                          action='store_true',
+                          help="Don't disable screensaver during record")
+    advgroup.add_argument('-b', '--max-backlog',
+                          default=multiprocessing.cpu_count(), type=int,
+                          help="In-RAM image backlog size (0 = infinite)")
+    advgroup.add_argument('-Y', '--backlog-memory', default=None, type=int,
+                          help="Limit memory of frames in flight (in MiB) "
+                               "instead of their number, spilling the rest "
+                               "to disk")
+    advgroup.add_argument('-D', '--dirty', default=False,
+                          action='store_true',
+                          help="Don't clear screen before record")
+    advgroup.add_argument('-f', '--fps', default=25, type=int,
+                          help="How many frames to screenshot per second")
+    advgroup.add_argument('-A', '--settle', default='fixed',
+                          choices=['fixed', 'adaptive', 'quiesce'],
+                          help="How to wait for terminal to draw the frame")
+    advgroup.add_argument('-c', '--delaycap', default=float('+inf'),
+                          type=float,
+                          help="Cap the display time of single frame "
+                               "(in seconds)")
+    advgroup.add_argument('-k', '--max-frames', default=None, type=int,
+                          help="Drop the least changing frames to fit GIF "
+                               "into this number of frames")
+    advgroup.add_argument('-z', '--target-size', default=None, type=int,
+                          help="Drop the least changing frames to fit GIF "
+                               "into about this size (in KiB, before "
+                               "optimization)")
+    advgroup.add_argument('-x', '--lossy', default=None, type=int,
+                          help="Use gifsicle lossy GIF compression mode")
+    advgroup.add_argument('-e', '--encoding', default=None,
+                          help="Reencode ttyrec to match terminal "
+                               "(source:target)")
+    advgroup.add_argument('-C', '--logarithmic', const=math.e, default=0,
+                          action="store_const",
+                          help="Enable logarithmic time compression "
+                               "(base = e)")
+    advgroup.add_argument('-X', '--converter', default='imagemagick',
+                          choices=['imagemagick', 'builtin'],
+                          help="Convert screenshots with ImageMagick or with "
+                               "built-in XWD decoder")
+    advgroup.add_argument('-G', '--capture', default='xwd',
+                          choices=['xwd', 'xlib'],
+                          help="Capture the window with xwd or in-process "
+                               "through Xlib (uses built-in decoder)")
+    advgroup.add_argument('-Q', '--palette', default=None,
+                          help="Map all frames onto a fixed palette: xterm, "
+                               "ansi or path to color scheme file")
+    advgroup.add_argument('-W', '--no-crop', default=False,
+                          action='store_true',
+                          help="Don't crop frames to the changed region")
+    advgroup.add_argument('-I', '--save-index', default=False,
+                          action='store_true',
+                          help="Keep ttyrec frame index in a file next to it")
+    advgroup.add_argument('-T', '--stream', default=False,
+                          action='store_true',
+                          help="Read ttyrec in a single pass (allows pipes)")
+    advgroup.add_argument('-U', '--no-dedupe', default=False,
+                          action='store_true',
+                          help="Don't merge identical consecutive frames")
+    advgroup.add_argument('-M', '--shared-memory', default=False,
+                          action='store_true',
+                          help="Pass captured frames to workers in shared "
+                               "memory")
+    advgroup.add_argument('-P', '--progress', default=False,
+                          action='store_true',
+                          help="Show progress line with ETA")
+    advgroup.add_argument('-J', '--stats-file', default=None,
+                          help="Save rendering stats to JSON file")
+    advgroup.add_argument('-n', '--dry-run', default=False,
+                          action='store_true',
+                          help="Estimate the cost of rendering and quit")
+    advgroup.add_argument('-j', '--json', default=False,
+                          action='store_true',
+                          help="Print dry run estimate as JSON")
+    advgroup.add_argument('-K', '--batch', default=None,
+                          help="Render all ttyrecs from the list file "
+                               "(- = stdin) in one process")
+    advgroup.add_argument('-R', '--save-frames', default=None,
+                          help="Save converted frames and ttyrec timings to "
+                               "archive file")
+    advgroup.add_argument('-w', '--checkpoint-dir', default=None,
+                          help="Keep converted frames in this directory "
+                               "until render completes, so that interrupted "
+                               "render resumes where it stopped")
+    advgroup.add_argument('-E', '--retime', default=False,
+                          action='store_true',
+                          help="Rebuild GIF from frame archive (given as "
+                               "input) with new timing options")
+
+    headlessgroup = parser.add_argument_group("Headless rendering options")
+    headlessgroup.add_argument('-B', '--backend', default='x11',
+                               choices=['x11', 'headless'],
+                               help="Capture X11 terminal window or render "
+                                    "with built-in terminal emulator")
+    headlessgroup.add_argument('-F', '--font', default=None,
+                               help="Font to render with (PSF, BDF or "
+                                    "TrueType)")
+    headlessgroup.add_argument('-Z', '--font-size', default=16, type=int,
+                               help="Pixel size of TrueType font")
+    headlessgroup.add_argument('-g', '--geometry', default='80x24',
+                               help="Terminal size in characters "
+                                    "(COLSxROWS)")
+    headlessgroup.add_argument('-N', '--segments', default=1, type=int,
+                               help="Split ttyrec into segments and render "
+                                    "them in parallel")
+
+    return parser
+
+
+def read_batch(path, extension='.gif'):
+    """
+    Read the list of ttyrecs to render. Each line holds path to the ttyrec
+    and optionally path to the GIF (by default ttyrec extension is replaced
+    with the one of output format). Empty lines and lines starting with #
+    are skipped.
+
+    :param path: Path to the list (- = stdin).
+    :param extension: Extension of output files.
+    :return: List of (input, output) tuples.
+    """
+    f = sys.stdin if path == '-' else open(path)
+    jobs = []
+    with f:
+        for line in f:
+            line = line.strip()
+            if not line or line.startswith('#'):
+                continue
+            parts = line.split(None, 1)
+            if len(parts) == 1:
+                parts.append(os.path.splitext(parts[0])[0] + extension)
+            jobs.append((parts[0], parts[1].strip()))
+    return jobs
+
+
+def print_stats(stats, options):
+    """
+    Print rendering stats for humans.
+
+    :param stats: Dict, returned by Renderer.render.
+    :param options: Parsed CLI arguments.
+    :return: None.
+    """
+    name = stats['format']
+    print_err("Stats:\n")
+    print_err("Rendered {0} in {1}".format(
+        name, str(datetime.timedelta(seconds=stats['render_time']))))
+    print_err("ttyrec duration (original speed): {0}".format(
+        str(datetime.timedelta(seconds=stats['ttyrec_duration']))))
+    print_err("ttyrec duration: {0}".format(
+        str(datetime.timedelta(seconds=stats['played_duration']))))
+    print_err("{0} duration: {1}".format(
+        name, str(datetime.timedelta(seconds=stats['gif_duration']))))
+    print_err("Input frames from ttyrec: {0}".format(stats['input_frames']))
+    print_err("Output frames in {0}: {1}".format(name,
+                                                 stats['output_frames']))
+    print_err("Dropped frames: {0}".format(stats['dropped_frames']))
+    print_err("Duplicate frames: {0}\n".format(stats['duplicate_frames']))
+    if options.backend != 'headless':
+        saved = stats['settle_saved']
+        print_err("Settle time {0}: {1}\n".format(
+            "saved" if saved >= 0 else "lost",
+            str(datetime.timedelta(seconds=abs(saved)))))
+    print_err("Time spent in stages (summed over workers):\n")
+    for line in timing.format_stages(stats['stages']):
+        print_err(line)
+    print_err("")
+
+
+def run_batch(renderer, options):
+    """
+    Render all ttyrecs from the batch list with the same renderer.
+
+    :param renderer: Renderer to use.
+    :param options: Parsed CLI arguments.
+    :return: Exit code.
+    """
+    try:
+        jobs = read_batch(options.batch, encoders.FORMAT_EXTENSIONS[
+            options.format or 'gif'])
+    except OSError as e:
+        print_err("Couldn't read batch list: {0}".format(e))
+        return 1
+    results = []
+    failed = 0
+    for input, output in jobs:
+        try:
+            stats = renderer.render(input, output)
+        except (render.RenderError, OSError, ValueError) as e:
+            print_err("{0}: {1}".format(input, e))
+            failed += 1
+            continue
+        print_err("{0} -> {1}: {2} frames in {3}".format(
+            input, output, stats['output_frames'],
+            str(datetime.timedelta(seconds=stats['render_time']))))
+        stats['input'] = input
+        stats['output'] = output
+        results.append(stats)
+    print_err("Rendered {0} of {1} ttyrecs".format(len(results), len(jobs)))
+    if options.stats_file:
+        timing.write_stats(options.stats_file, results)
+    return 1 if failed else 0
+
+
+def run_retime(options):
+    """
+    Rebuild GIF from frame archive.
+
+    :param options: Parsed CLI arguments.
+    :return: Exit code.
+    """
+    if not options.output:
+        print_err("Output file not specified, nothing to do.")
+        return 1
+    if options.format not in (None, 'gif'):
+        print_err("Frame archive could only be rebuilt into GIF")
+        return 1
+    try:
+        stats = archive.retime(options.input, options.output, options)
+    except (ChildProcessError, OSError, ValueError) as e:
+        print_err("Couldn't rebuild GIF: {0}".format(e))
+        return 1
+    print_err("Rebuilt GIF in {0}".format(
+        str(datetime.timedelta(seconds=stats['render_time']))))
+    print_err("GIF duration: {0}".format(
+        str(datetime.timedelta(seconds=stats['gif_duration']))))
+    print_err("Output frames in GIF: {0}".format(stats['output_frames']))
+    if options.stats_file:
+        timing.write_stats(options.stats_file, stats)
+    print_err("Done!")
+    return 0
+
+
+def main(argv=None):
+    """
+    Run pyttygif CLI.
+
+    :param argv: List of CLI arguments (None - take from sys.argv).
+    :return: Exit code.
+    """
+    parser = make_parser()
+    try:
+        args = parser.parse_args(argv)
+    except argparse.ArgumentError:
+        parser.print_help()
+        return 0
+
+    if args.batch:
+        if args.input or args.output or args.dry_run:
+            print_err("Batch mode takes ttyrecs from the list only")
+            return 1
+        if args.save_frames:
+            print_err("Batch mode can't save frames of all ttyrecs to a "
+                      "single archive")
+            return 1
+        if args.checkpoint_dir:
+            print_err("Batch mode can't keep checkpoints of all ttyrecs in "
+                      "a single directory")
+            return 1
+    elif not args.input:
+        print_err("Input ttyrec file omitted, nothing to do.")
+        return 1
+    elif not args.output and not args.dry_run:
+        print_err("Output file not specified, nothing to do.")
+        return 1
+
+    if (args.max_frames is not None and args.max_frames < 1) or \
+            (args.target_size is not None and args.target_size < 1):
+        print_err("Frame budget should be positive")
+        return 1
+    if args.backlog_memory is not None and args.backlog_memory < 1:
+        print_err("Backlog memory limit should be positive")
+        return 1
+    if args.font_size < 1:
+        print_err("Font size should be positive")
+        return 1
+
+    if args.format is None and args.output:
+        args.format = encoders.detect_format(args.output)
+
+    if args.retime:
+        if args.start or args.end:
+            print_err("Frame archive is rebuilt as a whole, without time "
+                      "range")
+            return 1
+        return run_retime(args)
+
+    try:
+        renderer = render.Renderer(args, print_err)
+    except render.RenderError as e:
+        print_err(e)
+        return 1
+    with renderer:
+        try:
+            if args.batch:
+                return run_batch(renderer, args)
+            if args.dry_run:
+                estimate = renderer.plan(args.input)
+                if args.json:
+                    print(plan.dump_plan(estimate))
+                else:
+                    print_err("Render plan:\n")
+                    for line in plan.format_plan(estimate):
+                        print_err(line)
+                return 0
+            stats = renderer.render(args.input, args.output)
+        except (render.RenderError, OSError, ValueError) as e:
+            print_err(e)
+            return 1
+        except KeyboardInterrupt:
+            print_err("User has cancelled rendering")
+            return 1
+    print_stats(stats, args)
+    if args.stats_file:
+        timing.write_stats(args.stats_file, stats)
+    print_err("Done!")
+    return 0
@@ -0,0 +1,132 @@
+#      This file is part of pyttygif.
+#
+#      pyttygif is free software: you can redistribute it and/or modify
+#      it under the terms of the GNU General Public License as published by
+#      the Free Software Foundation, either version 3 of the License, or
+#      (at your option) any later version.
+#
+#      pyttygif is distributed in the hope that it will be useful,
+#      but WITHOUT ANY WARRANTY; without even the implied warranty of
+#      MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#      GNU General Public License for more details.
+#
+#      You should have received a copy of the GNU General Public License
+#      along with pyttygif.  If not, see <https://www.gnu.org/licenses/>.
+
+import hashlib
+
+from pyttygif import image, xwd
+
+
+def digest(capture):
+    """
+    Compute the content hash of the capture.
+
+    :param capture: Capture (XWD bytes, Pixmap or IndexedImage).
+    :return: Bytes of digest.
+    """
+    if isinstance(capture, (image.IndexedImage, xwd.Pixmap)):
+        capture = capture.pixels
+    return hashlib.blake2b(capture, digest_size=16).digest()
+
+
+def _row_span(old, new, rowsize):
+    """
+    Find the span of bytes that differ between two rows.
+
+    :param old: Bytes-like previous row.
+    :param new: Bytes-like current row.
+    :param rowsize: Length of the row in bytes.
+    :return: Tuple of first and last differing byte (None if rows match).
+    """
+    diff = int.from_bytes(old, 'big') ^ int.from_bytes(new, 'big')
+    if not diff:
+        return None
+    first = rowsize - (diff.bit_length() + 7) // 8
+    last = rowsize - 1 - ((diff & -diff).bit_length() - 1) // 8
+    return first, last
+
+
+def changed_pixels(old, new, width, height, stride, offset=0, pixelsize=1):
+    """
+    Find the bounding box of pixels that differ between two pixmaps.
+
+    :param old: Bytes of previous pixmap.
+    :param new: Bytes of current pixmap (of the same layout).
+    :param width: Width of the pixmap in pixels.
+    :param height: Height of the pixmap in pixels.
+    :param stride: Length of the pixmap row in bytes (including padding).
+    :param offset: Offset of the first row in bytes.
+    :param pixelsize: Size of the pixel in bytes.
+    :return: Tuple of (left, top, width, height), None if nothing changed.
+    """
+    old = memoryview(old)
+    new = memoryview(new)
+    rowsize = width * pixelsize
+
+    def row(buf, y):
+        start = offset + y * stride
+        return buf[start:start + rowsize]
+
+    top = 0
+    while top < height and row(old, top) == row(new, top):
+        top += 1
+    if top == height:
+        return None
+    bottom = height - 1
+    while row(old, bottom) == row(new, bottom):
+        bottom -= 1
+    left = rowsize
+    right = -1
+    for y in range(top, bottom + 1):
+        span = _row_span(row(old, y), row(new, y), rowsize)
+        if span is not None:
+            left = min(left, span[0])
+            right = max(right, span[1])
+    left //= pixelsize
+    right //= pixelsize
+    return left, top, right - left + 1, bottom - top + 1
+
+
+def changed_region(previous, current):
+    """
+    Find the region of the screen that differs from the previous capture.
+
+    :param previous: Previous capture (XWD bytes, Pixmap or IndexedImage),
+                     or None.
+    :param current: Current capture of the same kind.
+    :return: Tuple of (left, top, width, height), None to keep whole frame.
+    """
+    if previous is None:
+        return None
+    if isinstance(current, image.IndexedImage):
+        if (previous.width, previous.height) != (current.width,
+                                                 current.height):
+            return None
+        region = changed_pixels(previous.pixels, current.pixels,
+                                current.width, current.height, current.width)
+    elif isinstance(current, xwd.Pixmap):
+        layout = current.layout
+        if previous.layout.key != layout.key:
+            return None
+        region = changed_pixels(previous.pixels, current.pixels, layout.width,
+                                layout.height, layout.bytes_per_line, 0,
+                                layout.bits_per_pixel // 8)
+    else:
+        try:
+            old = xwd.XwdHeader(previous)
+            new = xwd.XwdHeader(current)
+        except ValueError:
+            return None  # Let the converter report a broken image
+        if (old.width, old.height, old.bytes_per_line, old.pixmap_offset) != \
+                (new.width, new.height, new.bytes_per_line, new.pixmap_offset):
+            return None
+        if previous[old.colormap_offset:old.pixmap_offset] != \
+                current[new.colormap_offset:new.pixmap_offset]:
+            return None
+        region = changed_pixels(previous, current, new.width, new.height,
+                                new.bytes_per_line, new.pixmap_offset,
+                                new.bits_per_pixel // 8)
+    # Frame still has to be emitted to keep its delay, so leave a single
+    # (unchanged) pixel in it.
+    return region if region is not None else (0, 0, 1, 1)
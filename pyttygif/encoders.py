@@ -0,0 +1,427 @@
+#      This file is part of pyttygif.
+#
+#      pyttygif is free software: you can redistribute it and/or modify
+#      it under the terms of the GNU General Public License as published by
+#      the Free Software Foundation, either version 3 of the License, or
+#      (at your option) any later version.
+#
+#      pyttygif is distributed in the hope that it will be useful,
+#      but WITHOUT ANY WARRANTY; without even the implied warranty of
+#      MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#      GNU General Public License for more details.
+#
+#      You should have received a copy of the GNU General Public License
+#      along with pyttygif.  If not, see <https://www.gnu.org/licenses/>.
+
+import os
+import shutil
+import struct
+import subprocess
+import sys
+import tempfile
+import zlib
+
+from pyttygif import pngencode
+
+# Output formats by file extension.
+EXTENSIONS = {
+    '.gif': 'gif',
+    '.png': 'apng',
+    '.apng': 'apng',
+    '.webp': 'webp',
+}
+# Default file extensions of output formats.
+FORMAT_EXTENSIONS = {
+    'gif': '.gif',
+    'apng': '.png',
+    'webp': '.webp',
+}
+# Frame control chunk of APNG: sequence number, size, position, delay
+# fraction, dispose and blend operations.
+FRAME_CONTROL = struct.Struct('>IIIIIHHBB')
+# zlib level of full frames, handed over to img2webp.
+WEBP_FRAME_LEVEL = 1
+# Size of chunks, that animation is copied to output stream with.
+CHUNK_SIZE = 64 * 1024
+
+
+def detect_format(path):
+    """
+    Guess the output format by file extension.
+
+    :param path: Path of the output file.
+    :return: Format name (gif, if extension is unknown).
+    """
+    return EXTENSIONS.get(os.path.splitext(path)[1].lower(), 'gif')
+
+
+class Encoder(object):
+    """
+    Base of animation encoders. Frames are added one by one with add_image
+    between start and close. Each frame is shown for its own delay, that
+    is either given in advance or passed along with the frame.
+    """
+    name = 'animation'  # Name of the format in messages
+
+    def __init__(self, path, delays):
+        """
+        Create a new encoder.
+
+        :param path: Path of animation to create (- = stdout) or writable
+                     binary file object.
+        :param delays: A list of delays for each frame (None - stream frames
+                       with delays given to add_image).
+        """
+        self.stream = None  # File object to write animation to
+        if path == '-':
+            self.stream = sys.stdout.buffer
+        elif not isinstance(path, (str, bytes, os.PathLike)):
+            self.stream = path
+        self.path = path if self.stream is None else None
+        self.delays = delays
+        self.frameno = 0  # Number of frames added so far
+        self.closed = False
+
+    @staticmethod
+    def gifdelay(s):
+        """
+        Convert float seconds into integer hundredths of seconds.
+
+        :param s: Float, representing the delay.
+        :return: Integer, representing the delay in GIF format.
+        """
+        return round(s * 100)
+
+    def frame_delay(self, delay):
+        """
+        Get the delay of the next frame.
+
+        :param delay: Delay, passed along with the frame.
+        :return: Float delay in seconds.
+        """
+        if self.delays is not None:
+            return self.delays[self.frameno]
+        return delay
+
+    def copy_to_stream(self, f):
+        """
+        Copy the animation to the output stream in chunks.
+
+        :param f: Binary file object to read the animation from.
+        :return: None.
+        """
+        while True:
+            chunk = f.read(CHUNK_SIZE)
+            if not chunk:
+                break
+            self.stream.write(chunk)
+        self.stream.flush()
+
+    def start(self):
+        """
+        Prepare to receive frames.
+
+        :return: None.
+        """
+
+    def add_image(self, image, delay=None):
+        """
+        Add a frame to the animation.
+
+        :param image: Bytes, representing the converted frame.
+        :param delay: Float delay of the frame in seconds (only used when
+                      delays weren't given in advance).
+        :return: None.
+        """
+        raise NotImplementedError
+
+    def terminate(self):
+        """
+        Abandon the animation.
+
+        :return: None.
+        """
+        self.closed = True
+
+    def close(self):
+        """
+        Finish the animation.
+
+        :return: None.
+        """
+        self.closed = True
+
+    def __enter__(self):
+        """
+        Allows to use encoder with context management.
+
+        :return: Self
+        """
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        """
+        Allows to use encoder with context management.
+
+        :param exc_type: Exception type (if any).
+        :param exc_val: Exception object (if any).
+        :param exc_tb: Exception backtrace (if any).
+        :return: None
+        """
+        self.close()
+
+
+class ApngEncoder(Encoder):
+    """
+    Writer of animated PNG. Frames are PNG frames (see pngencode), that are
+    written as they come, keeping their position on the screen.
+    """
+    name = 'APNG'
+
+    def __init__(self, path, delays, loop=1, colors=None):
+        """
+        Create a new APNG writer.
+
+        :param path: Path of APNG to create (- = stdout) or file object.
+        :param delays: A list of delays for each frame (None - stream frames
+                       with delays given to add_image).
+        :param loop: Number of plays of animation (0 - infinity).
+        :param colors: Palette of the frames (list of (r, g, b) tuples).
+        """
+        super().__init__(path, delays)
+        self.plays = max(0, loop)
+        self.colors = colors
+        self.file = None
+        self.sequence = 0  # Sequence number of the next chunk
+        self.counter = None  # Offset of the frame count
+
+    def start(self):
+        """
+        Create the APNG file. Frame count is filled in at the end, so if
+        output stream can't seek, APNG is made in a temporary file first.
+
+        :return: None.
+        """
+        if self.stream is None:
+            self.file = open(self.path, 'wb')
+        elif self.stream.seekable():
+            self.file = self.stream
+        else:
+            self.file = tempfile.TemporaryFile()
+        self.file.write(pngencode.PNG_SIGNATURE)
+
+    def _write_header(self, width, height):
+        """
+        Write chunks, that precede the frames. Frame count is filled in
+        when all the frames are written.
+
+        :param width: Width of the screen.
+        :param height: Height of the screen.
+        :return: None.
+        """
+        self.file.write(pngencode.header(width, height))
+        self.counter = self.file.tell() + 8
+        self.file.write(pngencode.chunk(b'acTL', struct.pack('>II', 0,
+                                                             self.plays)))
+        self.file.write(pngencode.color_table(self.colors))
+
+    def add_image(self, image, delay=None):
+        """
+        Add a PNG frame to the animation.
+
+        :param image: Bytes, representing the PNG frame.
+        :param delay: Float delay of the frame in seconds (only used when
+                      delays weren't given in advance).
+        :return: None.
+        """
+        if self.closed or self.file is None:
+            raise ValueError("APNG encoder is not started or already closed")
+        delay = self.frame_delay(delay)
+        swidth, sheight, left, top, width, height = \
+            pngencode.decode_header(image)
+        if not self.frameno:
+            if (left, top, width, height) != (0, 0, swidth, sheight):
+                raise ValueError("First frame should cover the whole screen")
+            self._write_header(swidth, sheight)
+        self.file.write(pngencode.chunk(b'fcTL', FRAME_CONTROL.pack(
+            self.sequence, width, height, left, top,
+            min(Encoder.gifdelay(delay), 0xFFFF), 100, 0, 0)))
+        self.sequence += 1
+        data = image[pngencode.FRAME_HEADER.size:]
+        if not self.frameno:
+            self.file.write(pngencode.chunk(b'IDAT', data))
+        else:
+            self.file.write(pngencode.chunk(
+                b'fdAT', struct.pack('>I', self.sequence) + data))
+            self.sequence += 1
+        self.frameno += 1
+
+    def terminate(self):
+        """
+        Abandon the APNG file.
+
+        :return: None.
+        """
+        if self.file is not None and self.file is not self.stream:
+            self.file.close()
+        self.file = None
+        super().terminate()
+
+    def close(self):
+        """
+        Finish APNG file and fill in the frame count.
+
+        :return: None.
+        """
+        if self.file is None:
+            return
+        try:
+            if not self.frameno:
+                raise ValueError("No frames to write to APNG")
+            self.file.write(pngencode.chunk(b'IEND', b''))
+            actl = struct.pack('>II', self.frameno, self.plays)
+            end = self.file.tell()
+            self.file.seek(self.counter)
+            self.file.write(actl)
+            self.file.write(struct.pack('>I', zlib.crc32(
+                actl, zlib.crc32(b'acTL'))))
+            self.file.seek(end)
+            if self.file is self.stream:
+                self.stream.flush()
+            elif self.stream is not None:
+                self.file.seek(0)
+                self.copy_to_stream(self.file)
+        finally:
+            if self.file is not self.stream:
+                self.file.close()
+            self.file = None
+            super().close()
+
+
+class WebpEncoder(Encoder):
+    """
+    Wrapper around img2webp CLI utility. img2webp takes whole frames from
+    files, so PNG frames are painted onto the screen, that is saved as a
+    quickly compressed PNG after each frame. The animation is made with
+    lossless compression, that suits terminal contents best.
+    """
+    name = 'WebP'
+
+    def __init__(self, path, delays, loop=1, colors=None):
+        """
+        Create a new animated WebP writer.
+
+        :param path: Path of WebP to create (- = stdout) or file object.
+        :param delays: A list of delays for each frame (None - stream frames
+                       with delays given to add_image).
+        :param loop: Number of plays of animation (0 - infinity).
+        :param colors: Palette of the frames (list of (r, g, b) tuples).
+        """
+        super().__init__(path, delays)
+        self.plays = max(0, loop)
+        self.colors = colors
+        self.workdir = None
+        self.screen = None  # Palette indices of the whole screen
+        self.size = None  # Width and height of the screen
+        self.frames = []  # Tuples of frame file name and delay in ms
+
+    def start(self):
+        """
+        Make a directory for the frames.
+
+        :return: None.
+        """
+        if not shutil.which('img2webp'):
+            raise ChildProcessError("img2webp doesn't seem to be installed")
+        self.workdir = tempfile.mkdtemp(prefix='pyttygif-')
+
+    def add_image(self, image, delay=None):
+        """
+        Add a PNG frame to the animation.
+
+        :param image: Bytes, representing the PNG frame.
+        :param delay: Float delay of the frame in seconds (only used when
+                      delays weren't given in advance).
+        :return: None.
+        """
+        if self.closed or self.workdir is None:
+            raise ValueError("WebP encoder is not started or already closed")
+        delay = self.frame_delay(delay)
+        swidth, sheight, left, top, width, height = \
+            pngencode.decode_header(image)
+        if self.screen is None:
+            self.size = (swidth, sheight)
+            self.screen = bytearray(swidth * sheight)
+        if left + width > self.size[0] or top + height > self.size[1]:
+            raise ValueError("Frame is outside of the screen")
+        pixels = pngencode.unfilter(zlib.decompress(
+            image[pngencode.FRAME_HEADER.size:]), width, height)
+        for y in range(height):
+            start = (top + y) * self.size[0] + left
+            self.screen[start:start + width] = \
+                pixels[y * width:(y + 1) * width]
+        name = 'frame{0:08d}.png'.format(self.frameno)
+        with open(os.path.join(self.workdir, name), 'wb') as f:
+            pngencode.write_png(f, self.size[0], self.size[1], self.colors,
+                                self.screen, WEBP_FRAME_LEVEL)
+        self.frames.append((name, Encoder.gifdelay(delay) * 10))
+        self.frameno += 1
+
+    def _cleanup(self):
+        """
+        Remove the frames.
+
+        :return: None.
+        """
+        if self.workdir is not None:
+            shutil.rmtree(self.workdir, ignore_errors=True)
+            self.workdir = None
+
+    def terminate(self):
+        """
+        Abandon the animation.
+
+        :return: None.
+        """
+        self._cleanup()
+        super().terminate()
+
+    def close(self):
+        """
+        Run img2webp on the saved frames and write the WebP to the disk.
+
+        :return: None.
+        """
+        if self.workdir is None:
+            return
+        try:
+            if not self.frames:
+                raise ValueError("No frames to write to WebP")
+            # Arguments are passed in a file, so that the command line
+            # doesn't grow with the number of frames. Paths are relative to
+            # keep them free of whitespace.
+            with open(os.path.join(self.workdir, 'args'), 'w') as f:
+                f.write('-loop {0} -lossless\n'.format(self.plays))
+                for name, delay in self.frames:
+                    f.write('-d {0} {1}\n'.format(delay, name))
+                f.write('-o out.webp\n')
+            try:
+                proc = subprocess.run(['img2webp', 'args'], cwd=self.workdir,
+                                      stdout=subprocess.PIPE,
+                                      stderr=subprocess.PIPE)
+            except FileNotFoundError:
+                raise ChildProcessError("img2webp doesn't seem to be "
+                                        "installed")
+            if proc.returncode:
+                raise ChildProcessError("Failed to build WebP: {0}".format(
+                    proc.stderr.decode(errors='replace').strip() or
+                    proc.returncode))
+            out = os.path.join(self.workdir, 'out.webp')
+            if self.stream is not None:
+                with open(out, 'rb') as f:
+                    self.copy_to_stream(f)
+            else:
+                shutil.move(out, self.path)
+        finally:
+            self._cleanup()
+            super().close()
@@ -0,0 +1,591 @@
+#      This file is part of pyttygif.
+#
+#      pyttygif is free software: you can redistribute it and/or modify
+#      it under the terms of the GNU General Public License as published by
+#      the Free Software Foundation, either version 3 of the License, or
+#      (at your option) any later version.
+#
+#      pyttygif is distributed in the hope that it will be useful,
+#      but WITHOUT ANY WARRANTY; without even the implied warranty of
+#      MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#      GNU General Public License for more details.
+#
+#      You should have received a copy of the GNU General Public License
+#      along with pyttygif.  If not, see <https://www.gnu.org/licenses/>.
+
+import gzip
+import math
+import os
+import struct
+import zlib
+
+# Fonts to try when no font was given explicitly.
+DEFAULT_FONTS = (
+    '/usr/share/fonts/truetype/dejavu/DejaVuSansMono.ttf',
+    '/usr/share/fonts/dejavu/DejaVuSansMono.ttf',
+    '/usr/share/fonts/TTF/DejaVuSansMono.ttf',
+    '/usr/share/fonts/truetype/liberation/LiberationMono-Regular.ttf',
+    '/usr/share/consolefonts/Lat15-Fixed16.psf.gz',
+    '/usr/share/consolefonts/default8x16.psf.gz',
+    '/usr/share/kbd/consolefonts/default8x16.psf.gz',
+    '/usr/share/kbd/consolefonts/lat1-16.psfu.gz',
+)
+
+PSF1_MAGIC = b'\x36\x04'
+PSF2_MAGIC = b'\x72\xb5\x4a\x86'
+
+
+def find_default_font():
+    """
+    Look up a monospace font in the usual system locations.
+
+    :return: Path to the font or None if nothing was found.
+    """
+    for path in DEFAULT_FONTS:
+        if os.path.isfile(path):
+            return path
+    return None
+
+
+def load_font(path, size=16):
+    """
+    Load a font, detecting its format by contents.
+
+    :param path: Path to PSF (optionally gzipped), BDF or TrueType font.
+    :param size: Pixel size for scalable fonts (ignored for bitmap fonts).
+    :return: Font object.
+    """
+    if size < 1:
+        raise ValueError("Font size should be positive")
+    with open(path, 'rb') as f:
+        data = f.read()
+    try:
+        if data[:2] == b'\x1f\x8b':
+            data = gzip.decompress(data)
+        if data[:4] == PSF2_MAGIC or data[:2] == PSF1_MAGIC:
+            return PsfFont(data)
+        if data[:9] == b'STARTFONT':
+            return BdfFont(data)
+        if data[:4] in (b'\x00\x01\x00\x00', b'true', b'ttcf'):
+            return TrueTypeFont(data, size)
+    except (struct.error, KeyError, IndexError, EOFError,
+            zlib.error) as e:
+        # Parsers trust the tables they read, so a corrupt font surfaces
+        # as a failed lookup.
+        raise ValueError("Broken font {0}: {1}".format(path, e))
+    raise ValueError("Unsupported font format: {0}".format(path))
+
+
+class BitmapFont(object):
+    """
+    A fixed-size font, made of cell-sized glyph bitmaps.
+
+    Glyph is a tuple of integers (one per pixel row), where most significant
+    of width bits represents the leftmost pixel.
+    """
+    def __init__(self, width, height, baseline):
+        """
+        Create an empty font.
+
+        :param width: Width of the cell in pixels.
+        :param height: Height of the cell in pixels.
+        :param baseline: Row of the baseline (counted from the top).
+        """
+        self.width = width
+        self.height = height
+        self.baseline = min(baseline, height - 1)
+        self.glyphs = {}
+        self.missing = set()  # Characters, that have no glyph in the font
+        self.blank = (0,) * height
+
+    def _load_glyph(self, char, cells=1):
+        """
+        Make a glyph that isn't in the glyph table yet.
+
+        :param char: Character to render.
+        :param cells: Number of cells the character takes.
+        :return: Glyph or None, if there's no such glyph in the font.
+        """
+        if cells == 1:
+            return None
+        glyph = self.glyph(char, fallback=False)
+        return None if glyph is None else self._center(glyph, cells)
+
+    def _center(self, glyph, cells):
+        """
+        Center the cell-sized glyph in a wider cell.
+
+        :param glyph: Glyph of a single cell.
+        :param cells: Number of cells to center the glyph in.
+        :return: Glyph.
+        """
+        extra = self.width * (cells - 1)
+        return tuple(row << (extra - extra // 2) for row in glyph)
+
+    def glyph(self, char, cells=1, fallback=True):
+        """
+        Get a glyph for the character, falling back to replacement character.
+
+        :param char: Character to render.
+        :param cells: Number of cells the character takes (2 for wide
+                      characters).
+        :param fallback: Use replacement character, if there's no glyph.
+        :return: Glyph (cells times the cell width), None if there's no glyph
+                 and fallback is disabled.
+        """
+        key = char if cells == 1 else (char, cells)
+        glyph = self.glyphs.get(key)
+        if glyph is None and key not in self.missing:
+            glyph = self._load_glyph(char, cells)
+            if glyph is None:
+                self.missing.add(key)
+            else:
+                self.glyphs[key] = glyph
+        if glyph is None and fallback:
+            glyph = self.glyphs.get('�') or self.glyphs.get('?') \
+                or self.blank
+            if cells > 1:
+                glyph = self._center(glyph, cells)
+        return glyph
+
+
+class PsfFont(BitmapFont):
+    """
+    Linux console font (PSF1 or PSF2).
+    """
+    def __init__(self, data):
+        """
+        Parse the font.
+
+        :param data: Uncompressed font file contents.
+        """
+        if data[:4] == PSF2_MAGIC:
+            (_, hdrsize, flags, count, charsize, height,
+             width) = struct.unpack('<7I', data[4:32])
+            has_table = flags & 1
+        else:
+            mode, height = data[2], data[3]
+            hdrsize, width, charsize = 4, 8, height
+            count = 512 if mode & 1 else 256
+            has_table = mode & 6
+        super().__init__(width, height, height - height // 4)
+        rowsize = (width + 7) // 8
+        shift = rowsize * 8 - width
+        if len(data) < hdrsize + count * charsize:
+            raise ValueError("Truncated PSF font")
+        bitmaps = []
+        for i in range(count):
+            pos = hdrsize + i * charsize
+            bitmaps.append(tuple(
+                int.from_bytes(data[pos + r * rowsize:pos + (r + 1) * rowsize],
+                               'big') >> shift for r in range(height)))
+        table = data[hdrsize + count * charsize:]
+        if not has_table:
+            for i, bitmap in enumerate(bitmaps[:256]):
+                self.glyphs[chr(i)] = bitmap
+        elif data[:4] == PSF2_MAGIC:
+            for i, entry in enumerate(table.split(b'\xff')[:count]):
+                # Sequences (after 0xFE) describe combined characters.
+                for char in entry.split(b'\xfe')[0].decode('utf-8', 'ignore'):
+                    self.glyphs.setdefault(char, bitmaps[i])
+        else:
+            codes = struct.unpack('<{0}H'.format(len(table) // 2),
+                                  table[:len(table) // 2 * 2])
+            glyph, sequence = 0, False
+            for code in codes:
+                if code == 0xFFFF:
+                    glyph, sequence = glyph + 1, False
+                    if glyph >= count:
+                        break
+                elif code == 0xFFFE:
+                    sequence = True
+                elif not sequence:
+                    self.glyphs.setdefault(chr(code), bitmaps[glyph])
+
+
+class BdfFont(BitmapFont):
+    """
+    X11 Bitmap Distribution Format font.
+    """
+    def __init__(self, data):
+        """
+        Parse the font.
+
+        :param data: Font file contents.
+        """
+        lines = data.decode('latin-1').splitlines()
+        props = {}
+        for line in lines:
+            key, _, value = line.partition(' ')
+            if key == 'STARTCHAR':
+                break
+            props[key] = value.split()
+        width, height, xoff, yoff = map(int, props['FONTBOUNDINGBOX'])
+        ascent = int(props.get('FONT_ASCENT', [height + yoff])[0])
+        descent = int(props.get('FONT_DESCENT', [-yoff])[0])
+        super().__init__(width, ascent + descent, ascent)
+        encoding, bbx, bitmap = None, None, None
+        for line in lines:
+            key, _, value = line.partition(' ')
+            if key == 'ENCODING':
+                encoding = int(value.split()[0])
+            elif key == 'BBX':
+                bbx = list(map(int, value.split()))
+            elif key == 'BITMAP':
+                bitmap = []
+            elif key == 'ENDCHAR':
+                if encoding is not None and encoding >= 0 and bbx:
+                    self.glyphs[chr(encoding)] = self._place(bbx, bitmap,
+                                                             xoff)
+                encoding, bbx, bitmap = None, None, None
+            elif bitmap is not None and key:
+                bitmap.append(line.strip())
+
+    def _place(self, bbx, bitmap, xoff):
+        """
+        Place the glyph bitmap into the character cell.
+
+        :param bbx: Glyph bounding box (width, height, x and y offsets).
+        :param bitmap: List of hex strings, one per row.
+        :param xoff: X offset of the font bounding box.
+        :return: Glyph.
+        """
+        gwidth, gheight, gx, gy = bbx
+        rows = [0] * self.height
+        top = self.baseline - gy - gheight
+        shift = self.width - (gx - xoff)
+        for i, hexrow in enumerate(bitmap[:gheight]):
+            y = top + i
+            if not 0 <= y < self.height or not hexrow:
+                continue
+            bits = len(hexrow) * 4
+            value = int(hexrow, 16)
+            if shift >= bits:
+                value <<= shift - bits
+            else:
+                value >>= bits - shift
+            rows[y] = value & ((1 << self.width) - 1)
+        return tuple(rows)
+
+
+class TrueTypeFont(BitmapFont):
+    """
+    Scalable TrueType font, rasterized into monochrome glyphs.
+    """
+    # Samples per pixel (in each direction) for coverage estimation.
+    OVERSAMPLE = 4
+    # Fraction of pixel area a glyph should cover to set the pixel.
+    THRESHOLD = 0.35
+
+    def __init__(self, data, size=16, index=0):
+        """
+        Parse the font.
+
+        :param data: Font file contents.
+        :param size: Pixel size of the font (em height).
+        :param index: Font number in TrueType collection.
+        """
+        base = 0
+        if data[:4] == b'ttcf':
+            base = struct.unpack('>I', data[12 + 4 * index:16 + 4 * index])[0]
+        self.data = data
+        self.tables = {}
+        numtables = struct.unpack('>H', data[base + 4:base + 6])[0]
+        for i in range(numtables):
+            pos = base + 12 + 16 * i
+            tag, _, offset, length = struct.unpack('>4sIII',
+                                                   data[pos:pos + 16])
+            self.tables[tag.decode('latin-1')] = (offset, length)
+        for tag in ('head', 'hhea', 'hmtx', 'maxp', 'cmap', 'loca', 'glyf'):
+            if tag not in self.tables:
+                raise ValueError("TrueType font lacks '{0}' table "
+                                 "(only glyf outlines are supported)"
+                                 .format(tag))
+        head = self.tables['head'][0]
+        units = struct.unpack('>H', data[head + 18:head + 20])[0]
+        self.longloca = struct.unpack('>h', data[head + 50:head + 52])[0]
+        hhea = self.tables['hhea'][0]
+        ascender, descender = struct.unpack('>hh', data[hhea + 4:hhea + 8])
+        self.nummetrics = struct.unpack('>H', data[hhea + 34:hhea + 36])[0]
+        maxp = self.tables['maxp'][0]
+        self.numglyphs = struct.unpack('>H', data[maxp + 4:maxp + 6])[0]
+        self.scale = size / units
+        self.ascent = round(ascender * self.scale)
+        height = self.ascent + round(-descender * self.scale)
+        self.cmap = self._parse_cmap()
+        advance = self._advance(self.cmap.get(ord('M'), 0))
+        super().__init__(max(1, round(advance * self.scale)), max(1, height),
+                         self.ascent)
+
+    def _parse_cmap(self):
+        """
+        Read the Unicode character to glyph mapping.
+
+        :return: Dict of code points to glyph indices.
+        """
+        data = self.data
+        cmap = self.tables['cmap'][0]
+        count = struct.unpack('>H', data[cmap + 2:cmap + 4])[0]
+        subtables = {}
+        for i in range(count):
+            pos = cmap + 4 + 8 * i
+            platform, encoding, offset = struct.unpack('>HHI',
+                                                       data[pos:pos + 8])
+            fmt = struct.unpack('>H', data[cmap + offset:cmap + offset + 2])[0]
+            subtables[(platform, encoding, fmt)] = cmap + offset
+        for key in ((3, 10, 12), (0, 4, 12), (0, 6, 12)):
+            if key in subtables:
+                return self._parse_cmap12(subtables[key])
+        for key, pos in subtables.items():
+            if key[2] == 4 and key[:2] in ((3, 1), (0, 3), (0, 1), (0, 0)):
+                return self._parse_cmap4(pos)
+        raise ValueError("TrueType font has no Unicode character map")
+
+    def _parse_cmap4(self, pos):
+        """
+        Parse format 4 (segment mapping to delta values) subtable.
+
+        :param pos: Offset of the subtable.
+        :return: Dict of code points to glyph indices.
+        """
+        data = self.data
+        segcount = struct.unpack('>H', data[pos + 6:pos + 8])[0] // 2
+        ends = struct.unpack('>{0}H'.format(segcount),
+                             data[pos + 14:pos + 14 + 2 * segcount])
+        starts_at = pos + 16 + 2 * segcount
+        starts = struct.unpack('>{0}H'.format(segcount),
+                               data[starts_at:starts_at + 2 * segcount])
+        deltas_at = starts_at + 2 * segcount
+        deltas = struct.unpack('>{0}h'.format(segcount),
+                               data[deltas_at:deltas_at + 2 * segcount])
+        ranges_at = deltas_at + 2 * segcount
+        ranges = struct.unpack('>{0}H'.format(segcount),
+                               data[ranges_at:ranges_at + 2 * segcount])
+        mapping = {}
+        for i in range(segcount):
+            if starts[i] == 0xFFFF:
+                continue
+            for code in range(starts[i], ends[i] + 1):
+                if ranges[i] == 0:
+                    glyph = (code + deltas[i]) & 0xFFFF
+                else:
+                    at = ranges_at + 2 * i + ranges[i] + 2 * (code - starts[i])
+                    glyph = struct.unpack('>H', data[at:at + 2])[0]
+                    if glyph:
+                        glyph = (glyph + deltas[i]) & 0xFFFF
+                if glyph:
+                    mapping[code] = glyph
+        return mapping
+
+    def _parse_cmap12(self, pos):
+        """
+        Parse format 12 (segmented coverage) subtable.
+
+        :param pos: Offset of the subtable.
+        :return: Dict of code points to glyph indices.
+        """
+        data = self.data
+        groups = struct.unpack('>I', data[pos + 12:pos + 16])[0]
+        mapping = {}
+        for i in range(groups):
+            at = pos + 16 + 12 * i
+            start, end, glyph = struct.unpack('>III', data[at:at + 12])
+            for code in range(start, min(end, 0x10FFFF) + 1):
+                mapping[code] = glyph + code - start
+        return mapping
+
+    def _advance(self, glyph):
+        """
+        Get the advance width of the glyph.
+
+        :param glyph: Glyph index.
+        :return: Advance width in font units.
+        """
+        hmtx = self.tables['hmtx'][0]
+        pos = hmtx + 4 * min(glyph, self.nummetrics - 1)
+        return struct.unpack('>H', self.data[pos:pos + 2])[0]
+
+    def _outline(self, glyph, depth=0):
+        """
+        Read the glyph outline.
+
+        :param glyph: Glyph index.
+        :param depth: Nesting level of composite glyphs.
+        :return: List of contours, each is a list of (x, y, on_curve) points.
+        """
+        data = self.data
+        if glyph >= self.numglyphs or depth > 8:
+            return []
+        loca = self.tables['loca'][0]
+        if self.longloca:
+            start, end = struct.unpack('>II', data[loca + 4 * glyph:
+                                                   loca + 4 * glyph + 8])
+        else:
+            start, end = (2 * v for v in struct.unpack(
+                '>HH', data[loca + 2 * glyph:loca + 2 * glyph + 4]))
+        if start >= end:
+            return []
+        pos = self.tables['glyf'][0] + start
+        ncontours = struct.unpack('>h', data[pos:pos + 2])[0]
+        pos += 10
+        if ncontours < 0:
+            return self._composite(pos, depth)
+        endpts = struct.unpack('>{0}H'.format(ncontours),
+                               data[pos:pos + 2 * ncontours])
+        pos += 2 * ncontours
+        npoints = endpts[-1] + 1 if endpts else 0
+        pos += 2 + struct.unpack('>H', data[pos:pos + 2])[0]  # Instructions
+        flags = []
+        while len(flags) < npoints:
+            flag = data[pos]
+            pos += 1
+            repeat = 1
+            if flag & 8:
+                repeat += data[pos]
+                pos += 1
+            flags.extend([flag] * repeat)
+        coords = []
+        for short, same in ((2, 16), (4, 32)):
+            value, values = 0, []
+            for flag in flags[:npoints]:
+                if flag & short:
+                    delta = data[pos]
+                    pos += 1
+                    value += delta if flag & same else -delta
+                elif not flag & same:
+                    value += struct.unpack('>h', data[pos:pos + 2])[0]
+                    pos += 2
+                values.append(value)
+            coords.append(values)
+        contours, first = [], 0
+        for last in endpts:
+            contours.append([(coords[0][i], coords[1][i], flags[i] & 1)
+                             for i in range(first, last + 1)])
+            first = last + 1
+        return contours
+
+    def _composite(self, pos, depth):
+        """
+        Read the outline of composite glyph.
+
+        :param pos: Offset of the first component.
+        :param depth: Nesting level of composite glyphs.
+        :return: List of contours.
+        """
+        data = self.data
+        contours = []
+        while True:
+            flags, glyph = struct.unpack('>HH', data[pos:pos + 4])
+            pos += 4
+            if flags & 1:
+                dx, dy = struct.unpack('>hh', data[pos:pos + 4])
+                pos += 4
+            else:
+                dx, dy = struct.unpack('>bb', data[pos:pos + 2])
+                pos += 2
+            if not flags & 2:
+                dx = dy = 0  # Point matching isn't supported
+            xx, xy, yx, yy = 1.0, 0.0, 0.0, 1.0
+            if flags & 8:
+                xx = yy = struct.unpack('>h', data[pos:pos + 2])[0] / 16384
+                pos += 2
+            elif flags & 0x40:
+                xx, yy = (v / 16384 for v in
+                          struct.unpack('>hh', data[pos:pos + 4]))
+                pos += 4
+            elif flags & 0x80:
+                xx, xy, yx, yy = (v / 16384 for v in
+                                  struct.unpack('>hhhh', data[pos:pos + 8]))
+                pos += 8
+            for contour in self._outline(glyph, depth + 1):
+                contours.append([(x * xx + y * yx + dx, x * xy + y * yy + dy,
+                                  on) for x, y, on in contour])
+            if not flags & 0x20:
+                return contours
+
+    def _edges(self, contours):
+        """
+        Flatten the contours into line segments in pixel coordinates.
+
+        :param contours: List of contours from the glyph outline.
+        :return: List of (x0, y0, x1, y1) edges.
+        """
+        edges = []
+        scale, ascent = self.scale, self.ascent
+        for contour in contours:
+            if len(contour) < 2:
+                continue
+            # Convert to pixel space and insert implied on-curve points.
+            points = [(x * scale, ascent - y * scale, on)
+                      for x, y, on in contour]
+            full = []
+            for i, (x, y, on) in enumerate(points):
+                px, py, pon = points[i - 1]
+                if not on and not pon:
+                    full.append(((x + px) / 2, (y + py) / 2, 1))
+                full.append((x, y, on))
+            start = next((i for i, p in enumerate(full) if p[2]), None)
+            if start is None:
+                continue
+            full = full[start:] + full[:start]
+            cx, cy = full[0][0], full[0][1]
+            i = 1
+            while i <= len(full):
+                x, y, on = full[i % len(full)]
+                if on:
+                    edges.append((cx, cy, x, y))
+                    cx, cy = x, y
+                    i += 1
+                    continue
+                ex, ey, _ = full[(i + 1) % len(full)]
+                steps = max(2, int(math.hypot(ex - cx, ey - cy)))
+                for s in range(1, steps + 1):
+                    t = s / steps
+                    nx = (1 - t) ** 2 * cx + 2 * (1 - t) * t * x + t * t * ex
+                    ny = (1 - t) ** 2 * cy + 2 * (1 - t) * t * y + t * t * ey
+                    edges.append((cx, cy, nx, ny))
+                    cx, cy = nx, ny
+                i += 2
+        return edges
+
+    def _load_glyph(self, char, cells=1):
+        """
+        Rasterize the glyph of a character.
+
+        :param char: Character to render.
+        :param cells: Number of cells the character takes.
+        :return: Glyph or None, if there's no such glyph in the font.
+        """
+        glyph = self.cmap.get(ord(char))
+        if glyph is None:
+            return None
+        edges = self._edges(self._outline(glyph))
+        samples = self.OVERSAMPLE
+        width, height = self.width * cells, self.height
+        rows = []
+        for row in range(height):
+            coverage = [0.0] * width
+            for sub in range(samples):
+                y = row + (sub + 0.5) / samples
+                crossings = []
+                for x0, y0, x1, y1 in edges:
+                    if (y0 <= y < y1) or (y1 <= y < y0):
+                        x = x0 + (y - y0) * (x1 - x0) / (y1 - y0)
+                        crossings.append((x, 1 if y1 > y0 else -1))
+                crossings.sort()
+                winding = 0
+                for i, (x, direction) in enumerate(crossings[:-1]):
+                    winding += direction
+                    if not winding:
+                        continue
+                    left = max(0.0, x)
+                    right = min(float(width), crossings[i + 1][0])
+                    px = int(left)
+                    while px < right:
+                        coverage[px] += min(px + 1, right) - max(px, left)
+                        px += 1
+            bits = 0
+            for value in coverage:
+                bits = (bits << 1) | (value >= samples * self.THRESHOLD)
+            rows.append(bits)
+        return tuple(rows)
@@ -14,24 +14,32 @@
 #      along with pyttygif.  If not, see <https://www.gnu.org/licenses/>.
 
 import subprocess
+import threading
 
+from pyttygif import encoders, gifencode
 
-class GifBuilder(object):
+
+class GifBuilder(encoders.Encoder):
     """
     Wrapper around gifsicle CLI utility.
     """
+    name = 'GIF'
+
     def __init__(self, path, delays, loop=1, optimize=3, conserve_memory=True,
                  lossy=None):
         """
         Spawn a new gifsicle process.
 
-        :param path: Path of GIF to create.
-        :param delays: A list of delays for each frame.
+        :param path: Path of GIF to create (- = stdout) or writable binary
+                     file object.
+        :param delays: A list of delays for each frame (None - stream frames
+                       with delays given to add_image).
         :param loop: Number of repeats for GIF (0 - infinity).
         :param optimize: Optimization level of GIF (0-3).
         :param conserve_memory: Whether to save RAM at cost of processing time.
         :param lossy: Gifsicle lossy compression level (None - disable).
         """
+        super().__init__(path, delays)
         cmd = ['gifsicle', '--nextfile', '--no-comments',
                '--{0}conserve-memory'.format('' if conserve_memory else 'no-')]
         if lossy is not None:
@@ -45,25 +53,22 @@ class GifBuilder(object):
         if optimize:
             cmd.append('-O{0}'.format(str(optimize)))
             cmd.append('-Okeep-empty')
-        for delay in delays:
-            cmd.append('-d{0}'.format(str(GifBuilder.gifdelay(delay))))
+        if delays is None:
+            # Read all the frames from a single stream, keeping their delays.
+            cmd.append('--multifile')
             cmd.append('-')
+        else:
+            for delay in delays:
+                cmd.append('-d{0}'.format(str(GifBuilder.gifdelay(delay))))
+                cmd.append('-')
         cmd.append('-o')
-        cmd.append(path)
+        cmd.append('-' if self.stream is not None else path)
         cmd.append('--done')
         self.cmd = cmd
+        self.streaming = delays is None
         self.gifsicle = None
-        self.closed = False
-
-    @staticmethod
-    def gifdelay(s):
-        """
-        Convert float seconds into integer hundredths of seconds.
-
-        :param s: Float, representing the delay.
-        :return: Integer, representing the delay in GIF format.
-        """
-        return round(s * 100)
+        self.drain = None  # Thread, that copies GIF to the output stream
+        self.error = None  # Exception, that stopped the copying
 
     def start(self):
         """
@@ -78,18 +83,46 @@ class GifBuilder(object):
                                              bufsize=-1)
         except FileNotFoundError:
             raise ChildProcessError("Gifsicle doesn't seem to be installed")
+        if self.stream is not None:
+            # GIF is copied as gifsicle writes it, so that it's never
+            # written to the disk.
+            self.drain = threading.Thread(target=self._drain, daemon=True)
+            self.drain.start()
 
-    def add_image(self, image):
+    def _drain(self):
+        """
+        Copy GIF from gifsicle stdout to the output stream.
+
+        :return: None.
+        """
+        out = self.gifsicle.stdout
+        try:
+            while True:
+                chunk = out.read1(encoders.CHUNK_SIZE)
+                if not chunk:
+                    break
+                self.stream.write(chunk)
+                self.stream.flush()
+        except (OSError, ValueError) as e:
+            self.error = e
+            # Let gifsicle fail on the closed pipe instead of blocking.
+            out.close()
+
+    def add_image(self, image, delay=None):
         """
         Add a still GIF image to the resulting animated GIF.
 
         :param image: Bytes, representing the GIF image frame.
+        :param delay: Float delay of the frame in seconds (only used when
+                      delays weren't given in advance).
         :return: None.
         """
         if self.closed:
             raise ChildProcessError("Write to closed GifBuilder")
         if self.gifsicle is None:
             raise ChildProcessError("Gifsicle process is not started yet")
+        if self.streaming and delay is not None:
+            image = gifencode.set_delay(image, GifBuilder.gifdelay(delay))
         try:
             self.gifsicle.stdin.write(image)
         except BrokenPipeError as e:
@@ -114,7 +147,7 @@ class GifBuilder(object):
 
     def close(self):
         """
-        Close the stdin and write GIF to the disk.
+        Close the stdin and write GIF to the disk (or output stream).
 
         :return: None.
         """
@@ -122,26 +155,12 @@ class GifBuilder(object):
             return
         self.gifsicle.stdin.close()
         self.closed = True
+        if self.drain is not None:
+            self.drain.join()
         ret = self.gifsicle.wait()
+        if self.error is not None:
+            raise ChildProcessError("Failed to write GIF: {0}"
+                                    .format(self.error))
         if ret:
             raise ChildProcessError("Failed to build GIF: {0}"
                                     .format(ret))
-
-    def __enter__(self):
-        """
-        Allows to use GIF builder with context management.
-
-        :return: Self
-        """
-        return self
-
-    def __exit__(self, exc_type, exc_val, exc_tb):
-        """
-        Allows to use ttyrec player with context management.
-
-        :param exc_type: Exception type (if any).
-        :param exc_val: Exception object (if any).
-        :param exc_tb: Exception backtrace (if any).
-        :return: None
-        """
-        self.close()
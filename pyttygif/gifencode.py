@@ -0,0 +1,250 @@
+#      This file is part of pyttygif.
+#
+#      pyttygif is free software: you can redistribute it and/or modify
+#      it under the terms of the GNU General Public License as published by
+#      the Free Software Foundation, either version 3 of the License, or
+#      (at your option) any later version.
+#
+#      pyttygif is distributed in the hope that it will be useful,
+#      but WITHOUT ANY WARRANTY; without even the implied warranty of
+#      MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#      GNU General Public License for more details.
+#
+#      You should have received a copy of the GNU General Public License
+#      along with pyttygif.  If not, see <https://www.gnu.org/licenses/>.
+
+import re
+import struct
+
+# Largest LZW code allowed by GIF specification.
+MAX_CODE = 4095
+# Largest frame delay that fits into Graphic Control Extension.
+MAX_DELAY = 0xFFFF
+# Runs of repeated pixels.
+RUNS = re.compile(rb'(.)\1*', re.DOTALL)
+
+
+def lzw_compress(pixels, min_code_size):
+    """
+    Compress pixel indices with GIF flavour of LZW.
+
+    Terminal frames are mostly long runs of background, so pixels are taken
+    run by run. Strings of a repeated pixel enter the table in order of
+    length, so the longest one, that matches the run, is found at once
+    instead of extending the match pixel by pixel.
+
+    :param pixels: Bytes of palette indices.
+    :param min_code_size: Initial LZW code size (2-8).
+    :return: Bytes of packed variable-length LZW codes.
+    """
+    clear = 1 << min_code_size
+    eoi = clear + 1
+    out = bytearray()
+    bitbuf = clear
+    nbits = min_code_size + 1
+    codesize = min_code_size + 1
+    nextcode = eoi + 1
+    limit = 1 << codesize
+    table = {}
+    # Codes of strings of repeated pixel by pixel value: element i is the
+    # code of the pixel repeated i + 2 times.
+    repeats = {}
+    if not pixels:
+        bitbuf |= eoi << nbits
+        nbits += codesize
+        return bytes(out) + bitbuf.to_bytes((nbits + 7) // 8, 'little')
+    prefix = pixels[0]
+    run = 1  # Length of the prefix, if it's a repeated pixel, else 0
+    runpixel = prefix
+    first = True
+    for m in RUNS.finditer(pixels):
+        start, end = m.span()
+        pixel = pixels[start]
+        count = end - start
+        if first:
+            count -= 1
+            first = False
+        while count:
+            if run and runpixel == pixel:
+                codes = repeats.get(pixel)
+                longest = len(codes) + 1 if codes else 1
+                if run < longest:
+                    # Extend the match to the longest string in the table.
+                    take = min(count, longest - run)
+                    run += take
+                    count -= take
+                    prefix = codes[run - 2]
+                    continue
+            key = (prefix << 8) | pixel
+            code = table.get(key)
+            count -= 1
+            if code is not None:
+                prefix = code
+                if run and runpixel == pixel:
+                    run += 1
+                else:
+                    run = 0
+                continue
+            bitbuf |= prefix << nbits
+            nbits += codesize
+            if nextcode == limit and codesize < 12:
+                codesize += 1
+                limit <<= 1
+            if nextcode > MAX_CODE:
+                bitbuf |= clear << nbits
+                nbits += codesize
+                table.clear()
+                repeats.clear()
+                codesize = min_code_size + 1
+                limit = 1 << codesize
+                nextcode = eoi + 1
+            else:
+                table[key] = nextcode
+                if run and runpixel == pixel:
+                    repeats.setdefault(pixel, []).append(nextcode)
+                nextcode += 1
+            if nbits >= 64:
+                out += (bitbuf & 0xFFFFFFFFFFFFFFFF).to_bytes(8, 'little')
+                bitbuf >>= 64
+                nbits -= 64
+            prefix = pixel
+            run = 1
+            runpixel = pixel
+    bitbuf |= prefix << nbits
+    nbits += codesize
+    if nextcode == limit and codesize < 12:
+        codesize += 1
+    bitbuf |= eoi << nbits
+    nbits += codesize
+    out += bitbuf.to_bytes((nbits + 7) // 8, 'little')
+    return bytes(out)
+
+
+def _subblocks(data):
+    """
+    Split the data into GIF data sub-blocks.
+
+    :param data: Bytes to split.
+    :return: Bytes of sub-blocks, including block terminator.
+    """
+    out = bytearray()
+    for i in range(0, len(data), 255):
+        chunk = data[i:i + 255]
+        out.append(len(chunk))
+        out += chunk
+    out.append(0)
+    return bytes(out)
+
+
+def _color_table(palette):
+    """
+    Pack the palette into GIF color table, padded to the power of two.
+
+    :param palette: List of (r, g, b) tuples.
+    :return: Tuple of table size field and packed color table bytes.
+    """
+    size = 0
+    while (2 << size) < len(palette):
+        size += 1
+    table = bytearray()
+    for r, g, b in palette:
+        table += bytes((r, g, b))
+    table += bytes(3 * ((2 << size) - len(palette)))
+    return size, bytes(table)
+
+
+def encode(image, delay=None):
+    """
+    Encode an indexed image into a still GIF.
+
+    :param image: IndexedImage to encode.
+    :param delay: Frame delay in hundredths of seconds (None - omit the
+                  Graphic Control Extension).
+    :return: Bytes of GIF file.
+    """
+    if not 0 < len(image.palette) <= 256:
+        raise ValueError("GIF palette should have 1 to 256 colors")
+    size, table = _color_table(image.palette)
+    out = bytearray(b'GIF89a')
+    out += struct.pack('<HHBBB', image.screen[0], image.screen[1],
+                       0xF0 | size, 0, 0)
+    out += table
+    if delay is not None:
+        out += struct.pack('<BBBBHBB', 0x21, 0xF9, 4, 0, delay, 0, 0)
+    out += struct.pack('<BHHHHB', 0x2C, image.left, image.top,
+                       image.width, image.height, 0)
+    min_code_size = max(2, size + 1)
+    out.append(min_code_size)
+    out += _subblocks(lzw_compress(image.pixels, min_code_size))
+    out.append(0x3B)
+    return bytes(out)
+
+
+def _skip_subblocks(data, pos):
+    """
+    Skip over a chain of GIF data sub-blocks.
+
+    :param data: Bytes of GIF file.
+    :param pos: Offset of the first sub-block.
+    :return: Offset past the block terminator.
+    """
+    while True:
+        if pos >= len(data):
+            raise ValueError("GIF data sub-blocks are truncated")
+        size = data[pos]
+        pos += size + 1
+        if not size:
+            return pos
+
+
+def set_delay(gif, delay):
+    """
+    Set the delay of the first frame of GIF, adding a Graphic Control
+    Extension if the frame has none.
+
+    :param gif: Bytes of GIF file.
+    :param delay: Frame delay in hundredths of seconds.
+    :return: Bytes of GIF file.
+    """
+    delay = min(delay, MAX_DELAY)
+    if len(gif) < 13 or gif[:3] != b'GIF':
+        raise ValueError("Not a GIF image")
+    pos = 13
+    if gif[10] & 0x80:
+        pos += 3 * (2 << (gif[10] & 7))
+    gce = None
+    while pos < len(gif):
+        block = gif[pos]
+        if block == 0x2C:
+            out = bytearray(gif)
+            if gce is not None:
+                struct.pack_into('<H', out, gce + 4, delay)
+            else:
+                out[pos:pos] = struct.pack('<BBBBHBB', 0x21, 0xF9, 4, 0,
+                                           delay, 0, 0)
+            return bytes(out)
+        elif block == 0x21:
+            if gif[pos + 1] == 0xF9:
+                gce = pos
+            pos = _skip_subblocks(gif, pos + 2)
+        else:
+            break
+    raise ValueError("GIF has no image")
+
+
+def convertimage(image, region=None, palette=None):
+    """
+    Convert an indexed image into a still GIF frame.
+
+    :param image: IndexedImage to convert.
+    :param region: Tuple of (left, top, width, height) to crop the frame to
+                   (None - whole image).
+    :param palette: Palette to map the frame onto (None - keep the image
+                    palette).
+    :return: Compressed GIF image.
+    """
+    if region is not None:
+        image = image.crop(*region)
+    if palette is not None:
+        image = palette.remap(image)
+    return encode(image)
@@ -0,0 +1,79 @@
+#      This file is part of pyttygif.
+#
+#      pyttygif is free software: you can redistribute it and/or modify
+#      it under the terms of the GNU General Public License as published by
+#      the Free Software Foundation, either version 3 of the License, or
+#      (at your option) any later version.
+#
+#      pyttygif is distributed in the hope that it will be useful,
+#      but WITHOUT ANY WARRANTY; without even the implied warranty of
+#      MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#      GNU General Public License for more details.
+#
+#      You should have received a copy of the GNU General Public License
+#      along with pyttygif.  If not, see <https://www.gnu.org/licenses/>.
+
+from pyttygif import font, raster, terminal
+
+
+class HeadlessTerminal(object):
+    """
+    Terminal emulator that draws into memory instead of X window.
+    """
+    def __init__(self, columns=80, rows=24, fontpath=None, fontsize=16,
+                 encoding='utf-8'):
+        """
+        Create a new headless terminal.
+
+        :param columns: Width of the terminal in character cells.
+        :param rows: Height of the terminal in character cells.
+        :param fontpath: Path to the font (None - look up a system font).
+        :param fontsize: Pixel size for scalable fonts.
+        :param encoding: Encoding of the ttyrec payloads.
+        """
+        if fontpath is None:
+            fontpath = font.find_default_font()
+            if fontpath is None:
+                raise ValueError("Couldn't find a monospace font, please "
+                                 "specify one explicitly")
+        self.encoding = encoding
+        self.screen = terminal.Screen(columns, rows, encoding)
+        self.rasterizer = raster.Rasterizer(font.load_font(fontpath,
+                                                           fontsize))
+
+    @property
+    def image_size(self):
+        """
+        Size of the captured image in bytes.
+
+        :return: Integer number of pixels on the screen.
+        """
+        font = self.rasterizer.font
+        return self.screen.columns * font.width * self.screen.rows * \
+            font.height
+
+    def reset(self):
+        """
+        Clear the terminal before playing another ttyrec.
+
+        :return: None.
+        """
+        self.screen = terminal.Screen(self.screen.columns, self.screen.rows,
+                                      self.encoding)
+
+    def display(self, payload):
+        """
+        Feed the ttyrec frame payload to the terminal.
+
+        :param payload: Bytes of terminal output.
+        :return: None.
+        """
+        self.screen.feed(payload)
+
+    def capture(self):
+        """
+        Take a picture of the terminal.
+
+        :return: IndexedImage of the terminal.
+        """
+        return self.rasterizer.render(self.screen)
@@ -0,0 +1,63 @@
+#      This file is part of pyttygif.
+#
+#      pyttygif is free software: you can redistribute it and/or modify
+#      it under the terms of the GNU General Public License as published by
+#      the Free Software Foundation, either version 3 of the License, or
+#      (at your option) any later version.
+#
+#      pyttygif is distributed in the hope that it will be useful,
+#      but WITHOUT ANY WARRANTY; without even the implied warranty of
+#      MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#      GNU General Public License for more details.
+#
+#      You should have received a copy of the GNU General Public License
+#      along with pyttygif.  If not, see <https://www.gnu.org/licenses/>.
+
+
+class IndexedImage(object):
+    """
+    A paletted image, positioned on a (possibly larger) logical screen.
+    """
+    def __init__(self, width, height, pixels, palette, left=0, top=0,
+                 screen=None):
+        """
+        Create a new indexed image.
+
+        :param width: Width of the image in pixels.
+        :param height: Height of the image in pixels.
+        :param pixels: Bytes of palette indices, one per pixel, row by row.
+        :param palette: List of (r, g, b) tuples.
+        :param left: Horizontal offset of the image on the logical screen.
+        :param top: Vertical offset of the image on the logical screen.
+        :param screen: Tuple of logical screen width and height (None - same
+                       as the image size).
+        """
+        if len(pixels) != width * height:
+            raise ValueError("Pixel data doesn't match the image size")
+        self.width = width
+        self.height = height
+        self.pixels = pixels
+        self.palette = palette
+        self.left = left
+        self.top = top
+        self.screen = screen if screen is not None else (width, height)
+
+    def crop(self, left, top, width, height):
+        """
+        Cut out a rectangle, keeping its position on the logical screen.
+
+        :param left: Horizontal offset of the rectangle.
+        :param top: Vertical offset of the rectangle.
+        :param width: Width of the rectangle.
+        :param height: Height of the rectangle.
+        :return: IndexedImage.
+        """
+        if left < 0 or top < 0 or left + width > self.width or \
+                top + height > self.height:
+            raise ValueError("Crop rectangle is outside of the image")
+        view = memoryview(self.pixels)
+        pixels = b''.join(view[y * self.width + left:
+                               y * self.width + left + width]
+                          for y in range(top, top + height))
+        return IndexedImage(width, height, pixels, self.palette,
+                            self.left + left, self.top + top, self.screen)
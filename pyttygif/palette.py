@@ -0,0 +1,102 @@
+#      This file is part of pyttygif.
+#
+#      pyttygif is free software: you can redistribute it and/or modify
+#      it under the terms of the GNU General Public License as published by
+#      the Free Software Foundation, either version 3 of the License, or
+#      (at your option) any later version.
+#
+#      pyttygif is distributed in the hope that it will be useful,
+#      but WITHOUT ANY WARRANTY; without even the implied warranty of
+#      MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#      GNU General Public License for more details.
+#
+#      You should have received a copy of the GNU General Public License
+#      along with pyttygif.  If not, see <https://www.gnu.org/licenses/>.
+
+from pyttygif import image, raster
+
+# Color schemes, that could be referred to by name.
+SCHEMES = {
+    'xterm': raster.XTERM_PALETTE,
+    'ansi': raster.XTERM_PALETTE[:16],
+}
+
+
+def load_scheme(name):
+    """
+    Load the color scheme. Scheme file lists colors as #rrggbb, one per
+    line; empty lines and lines starting with ; are skipped.
+
+    :param name: Name of built-in scheme or path to scheme file.
+    :return: List of (r, g, b) tuples.
+    """
+    if name in SCHEMES:
+        return list(SCHEMES[name])
+    colors = []
+    with open(name) as f:
+        for lineno, line in enumerate(f, 1):
+            line = line.strip()
+            if not line or line.startswith(';'):
+                continue
+            try:
+                if len(line) != 7 or line[0] != '#':
+                    raise ValueError
+                color = bytes.fromhex(line[1:])
+            except ValueError:
+                raise ValueError("{0}:{1}: color should look like #rrggbb"
+                                 .format(name, lineno))
+            colors.append(tuple(color))
+    if not 0 < len(colors) <= 256:
+        raise ValueError("Color scheme should have 1 to 256 colors")
+    return colors
+
+
+class Palette(object):
+    """
+    Fixed palette, that all frames are mapped onto, so that they share the
+    same color table and don't have to be quantized one by one.
+    """
+    def __init__(self, colors):
+        """
+        Create a new palette.
+
+        :param colors: List of (r, g, b) tuples.
+        """
+        self.colors = colors
+        self.index = {}  # Cache of colors mapped to palette indices
+        for i, rgb in enumerate(colors):
+            self.index.setdefault(rgb, i)
+        self.tables = {}  # Cache of translation tables of source palettes
+
+    def nearest(self, rgb):
+        """
+        Find the palette color, closest to the given one.
+
+        :param rgb: Tuple of (r, g, b).
+        :return: Palette index.
+        """
+        i = self.index.get(rgb)
+        if i is None:
+            r, g, b = rgb
+            i = min(range(len(self.colors)), key=lambda k: (
+                (self.colors[k][0] - r) ** 2 + (self.colors[k][1] - g) ** 2 +
+                (self.colors[k][2] - b) ** 2))
+            self.index[rgb] = i
+        return i
+
+    def remap(self, img):
+        """
+        Map the indexed image onto the palette.
+
+        :param img: IndexedImage.
+        :return: IndexedImage with this palette.
+        """
+        key = tuple(img.palette)
+        table = self.tables.get(key)
+        if table is None:
+            table = bytes(self.nearest(rgb) for rgb in key)
+            table += bytes(256 - len(table))
+            self.tables[key] = table
+        return image.IndexedImage(img.width, img.height,
+                                  bytes(img.pixels).translate(table),
+                                  self.colors, img.left, img.top, img.screen)
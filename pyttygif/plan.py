@@ -0,0 +1,201 @@
+#      This file is part of pyttygif.
+#
+#      pyttygif is free software: you can redistribute it and/or modify
+#      it under the terms of the GNU General Public License as published by
+#      the Free Software Foundation, either version 3 of the License, or
+#      (at your option) any later version.
+#
+#      pyttygif is distributed in the hope that it will be useful,
+#      but WITHOUT ANY WARRANTY; without even the implied warranty of
+#      MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#      GNU General Public License for more details.
+#
+#      You should have received a copy of the GNU General Public License
+#      along with pyttygif.  If not, see <https://www.gnu.org/licenses/>.
+
+import datetime
+import json
+import multiprocessing
+import time
+
+from pyttygif import dirtyrect, gifencode, ttyplay
+
+# Number of GIF frames to render when measuring headless rendering cost.
+SAMPLE_FRAMES = 50
+# Typical time to capture the window with xwd, on top of the settle delay.
+# It isn't measured, so X11 plans list it among their assumptions.
+X11_CAPTURE_COST = 0.03
+# Typical size of converted X11 frame, cropped to the changed region.
+X11_FRAME_SIZE = 4096
+
+
+def measure_headless(tp, term, delays, crop=True, samples=SAMPLE_FRAMES,
+                     converter=gifencode.convertimage, first=0):
+    """
+    Render first frames of ttyrec with headless terminal to measure the
+    per-frame cost. Consumes the ttyrec player.
+
+    :param tp: TtyPlay at the beginning of ttyrec.
+    :param term: HeadlessTerminal to render with.
+    :param delays: List of ttyrec frame delays (including the last frame).
+    :param crop: Whether frames are cropped to the changed region.
+    :param samples: Number of GIF frames to render.
+    :param converter: Function to convert frames with.
+    :param first: Number of the ttyrec frame, that delays start with (frames
+                  before it are only drawn).
+    :return: Tuple of average render time, encode time and frame size.
+    """
+    render = encode = 0.0
+    size = frames = 0
+    vislength = 0.0
+    previmage = None
+    while tp.frameno < first and tp.read_frame():
+        term.display(tp.frame)
+    while frames < samples and tp.frameno - first < len(delays) and \
+            tp.read_frame():
+        start = time.perf_counter()
+        term.display(tp.frame)
+        vislength += delays[tp.frameno - 1 - first]
+        if vislength <= ttyplay.MIN_GIF_DELAY:
+            render += time.perf_counter() - start
+            continue
+        vislength = 0.0
+        image = term.capture()
+        render += time.perf_counter() - start
+        start = time.perf_counter()
+        region = None
+        if crop:
+            region = dirtyrect.changed_region(previmage, image)
+            previmage = image
+        size += len(converter(image, region))
+        encode += time.perf_counter() - start
+        frames += 1
+    if not frames:
+        return 0.0, 0.0, 0
+    return render / frames, encode / frames, size // frames
+
+
+def estimate(delays, gifdelays, frame_cost, frame_size, speed=1.0,
+             logbase=None, duplicates=0, assumptions=None):
+    """
+    Estimate the cost of rendering.
+
+    :param delays: List of ttyrec frame delays (including the last frame).
+    :param gifdelays: List of GIF frame delays.
+    :param frame_cost: Wall-clock time to render a single GIF frame.
+    :param frame_size: Average size of GIF frame in bytes (None - unknown).
+    :param speed: Speed multiplier.
+    :param logbase: Base of logarithmic time compression (None - disabled).
+    :param duplicates: Number of captures, merged as identical.
+    :param assumptions: Dict of values, that were assumed instead of
+                        measured (None - nothing was assumed).
+    :return: Dict with the render plan.
+    """
+    plan = {
+        'input_frames': len(delays),
+        'output_frames': len(gifdelays),
+        'dropped_frames': len(delays) - len(gifdelays) - duplicates,
+        'duplicate_frames': duplicates,
+        'ttyrec_duration': ttyplay.recorded_duration(delays[:-1], speed,
+                                                     logbase),
+        'gif_duration': sum(d for d in gifdelays if round(d * 100)),
+        'frame_cost': frame_cost,
+        'render_time': frame_cost * len(gifdelays),
+        'output_size': None,
+        'assumptions': dict(assumptions or {}),
+    }
+    if frame_size is not None:
+        plan['output_size'] = frame_size * len(gifdelays)
+    return plan
+
+
+def plan_headless(tp, term, delays, gifdelays, crop=True,
+                  converter=gifencode.convertimage, first=0, duplicates=0):
+    """
+    Estimate the cost of rendering with headless terminal.
+
+    :param tp: TtyPlay at the beginning of ttyrec.
+    :param term: HeadlessTerminal to render with.
+    :param delays: List of ttyrec frame delays (including the last frame).
+    :param gifdelays: List of GIF frame delays.
+    :param crop: Whether frames are cropped to the changed region.
+    :param converter: Function to convert frames with.
+    :param first: Number of the ttyrec frame, that delays start with.
+    :param duplicates: Number of captures, merged as identical.
+    :return: Dict with the render plan.
+    """
+    render, encode, size = measure_headless(tp, term, delays, crop,
+                                            converter=converter, first=first)
+    # Frames are encoded by a pool of workers while the main loop renders.
+    cost = max(render, encode / multiprocessing.cpu_count())
+    return estimate(delays, gifdelays, cost, size, tp.speed, tp.logbase,
+                    duplicates)
+
+
+def plan_x11(tp, delays, points, lengths, settler, duplicates=0):
+    """
+    Estimate the cost of rendering by capturing X11 terminal window. Capture
+    time and frame size aren't measured, typical ones are assumed.
+
+    :param tp: TtyPlay of ttyrec.
+    :param delays: List of ttyrec frame delays (including the last frame).
+    :param points: List in the format of ttyplay.capture_delays.
+    :param lengths: List of ttyrec frame payload lengths.
+    :param settler: settle.Settler, that waits for the terminal.
+    :param duplicates: Number of captures, merged as identical.
+    :return: Dict with the render plan.
+    """
+    # Settle delay depends on the output drawn since the previous capture.
+    gifdelays = []
+    total = 0.0
+    drawn = 0
+    for length, point in zip(lengths, points):
+        drawn += length
+        if point is not None:
+            gifdelays.append(point)
+            total += settler.cost(drawn, X11_CAPTURE_COST)
+            drawn = 0
+    cost = total / len(gifdelays) if gifdelays else 0.0
+    return estimate(delays, gifdelays, cost, X11_FRAME_SIZE, tp.speed,
+                    tp.logbase, duplicates,
+                    {'capture_cost': X11_CAPTURE_COST,
+                     'frame_size': X11_FRAME_SIZE})
+
+
+def format_plan(plan):
+    """
+    Format the render plan for humans.
+
+    :param plan: Dict with the render plan.
+    :return: List of lines.
+    """
+    size = plan['output_size']
+    lines = [
+        "Input frames from ttyrec: {0}".format(plan['input_frames']),
+        "Output frames in GIF: {0}".format(plan['output_frames']),
+        "Dropped frames: {0}".format(plan['dropped_frames']),
+        "Identical frames merged: {0}".format(plan['duplicate_frames']),
+        "ttyrec duration (original speed): {0}".format(
+            str(datetime.timedelta(seconds=plan['ttyrec_duration']))),
+        "GIF duration: {0}".format(
+            str(datetime.timedelta(seconds=plan['gif_duration']))),
+        "Estimated render time: {0}".format(
+            str(datetime.timedelta(seconds=plan['render_time']))),
+        "Estimated GIF size (before optimization): {0}".format(
+            "unknown" if size is None else "{0:.1f} MiB".format(size / 2**20)),
+    ]
+    assumed = plan['assumptions']
+    if assumed:
+        lines.append("Assumed, not measured: {0}".format(", ".join(
+            "{0} = {1}".format(k, assumed[k]) for k in sorted(assumed))))
+    return lines
+
+
+def dump_plan(plan):
+    """
+    Format the render plan as JSON.
+
+    :param plan: Dict with the render plan.
+    :return: JSON string.
+    """
+    return json.dumps(plan, indent=2, sort_keys=True)
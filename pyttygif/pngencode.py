@@ -0,0 +1,158 @@
+#      This file is part of pyttygif.
+#
+#      pyttygif is free software: you can redistribute it and/or modify
+#      it under the terms of the GNU General Public License as published by
+#      the Free Software Foundation, either version 3 of the License, or
+#      (at your option) any later version.
+#
+#      pyttygif is distributed in the hope that it will be useful,
+#      but WITHOUT ANY WARRANTY; without even the implied warranty of
+#      MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#      GNU General Public License for more details.
+#
+#      You should have received a copy of the GNU General Public License
+#      along with pyttygif.  If not, see <https://www.gnu.org/licenses/>.
+
+import struct
+import zlib
+
+PNG_SIGNATURE = b'\x89PNG\r\n\x1a\n'
+# Header of encoded frame: logical screen size, position and size of the
+# frame. Compressed scanlines follow.
+FRAME_HEADER = struct.Struct('>HHHHHH')
+# zlib level of frames. Frames are compressed in parallel by converters.
+COMPRESSION_LEVEL = 9
+# Color type of paletted PNG images.
+INDEXED_COLOR = 3
+
+
+def chunk(kind, data):
+    """
+    Pack the PNG chunk.
+
+    :param kind: 4-byte chunk type.
+    :param data: Bytes of chunk data.
+    :return: Bytes of chunk with its length and CRC.
+    """
+    crc = zlib.crc32(data, zlib.crc32(kind))
+    return struct.pack('>I', len(data)) + kind + data + struct.pack('>I', crc)
+
+
+def header(width, height):
+    """
+    Pack IHDR chunk of 8-bit paletted image.
+
+    :param width: Width of the image in pixels.
+    :param height: Height of the image in pixels.
+    :return: Bytes of IHDR chunk.
+    """
+    return chunk(b'IHDR', struct.pack('>IIBBBBB', width, height, 8,
+                                      INDEXED_COLOR, 0, 0, 0))
+
+
+def color_table(colors):
+    """
+    Pack PLTE chunk.
+
+    :param colors: List of (r, g, b) tuples.
+    :return: Bytes of PLTE chunk.
+    """
+    if not 0 < len(colors) <= 256:
+        raise ValueError("PNG palette should have 1 to 256 colors")
+    return chunk(b'PLTE', b''.join(bytes(rgb) for rgb in colors))
+
+
+def scanlines(pixels, width, height):
+    """
+    Prefix each row of pixels with PNG filter type. Paletted images are
+    best left unfiltered.
+
+    :param pixels: Bytes of palette indices, row by row.
+    :param width: Width of the image in pixels.
+    :param height: Height of the image in pixels.
+    :return: Bytes of scanlines.
+    """
+    view = memoryview(pixels)
+    return b''.join(part for y in range(height)
+                    for part in (b'\x00', view[y * width:(y + 1) * width]))
+
+
+def unfilter(data, width, height):
+    """
+    Strip filter types from unfiltered scanlines.
+
+    :param data: Bytes of scanlines.
+    :param width: Width of the image in pixels.
+    :param height: Height of the image in pixels.
+    :return: Bytes of palette indices, row by row.
+    """
+    if len(data) != (width + 1) * height:
+        raise ValueError("PNG frame data doesn't match the frame size")
+    view = memoryview(data)
+    return b''.join(view[y * (width + 1) + 1:(y + 1) * (width + 1)]
+                    for y in range(height))
+
+
+def encode(image):
+    """
+    Encode an indexed image into a frame, that is assembled into the
+    animation by encoder. Palette is not kept with the frame, so it should
+    be the one of the animation.
+
+    :param image: IndexedImage to encode.
+    :return: Bytes of frame header and compressed scanlines.
+    """
+    return FRAME_HEADER.pack(image.screen[0], image.screen[1], image.left,
+                             image.top, image.width, image.height) + \
+        zlib.compress(scanlines(image.pixels, image.width, image.height),
+                      COMPRESSION_LEVEL)
+
+
+def decode_header(frame):
+    """
+    Unpack the header of encoded frame.
+
+    :param frame: Bytes of the frame.
+    :return: Tuple of screen width, screen height, left, top, width and
+             height.
+    """
+    if len(frame) < FRAME_HEADER.size:
+        raise ValueError("PNG frame is truncated")
+    return FRAME_HEADER.unpack_from(frame)
+
+
+def convertimage(image, region=None, palette=None):
+    """
+    Convert an indexed image into a PNG frame.
+
+    :param image: IndexedImage to convert.
+    :param region: Tuple of (left, top, width, height) to crop the frame to
+                   (None - whole image).
+    :param palette: Palette of the animation to map the frame onto.
+    :return: Encoded frame.
+    """
+    if region is not None:
+        image = image.crop(*region)
+    if palette is not None:
+        image = palette.remap(image)
+    return encode(image)
+
+
+def write_png(f, width, height, colors, pixels, level=COMPRESSION_LEVEL):
+    """
+    Write a still paletted PNG image.
+
+    :param f: File object to write to.
+    :param width: Width of the image in pixels.
+    :param height: Height of the image in pixels.
+    :param colors: List of (r, g, b) tuples.
+    :param pixels: Bytes of palette indices, row by row.
+    :param level: zlib compression level.
+    :return: None.
+    """
+    f.write(PNG_SIGNATURE)
+    f.write(header(width, height))
+    f.write(color_table(colors))
+    f.write(chunk(b'IDAT', zlib.compress(scanlines(pixels, width, height),
+                                         level)))
+    f.write(chunk(b'IEND', b''))
@@ -0,0 +1,154 @@
+#      This file is part of pyttygif.
+#
+#      pyttygif is free software: you can redistribute it and/or modify
+#      it under the terms of the GNU General Public License as published by
+#      the Free Software Foundation, either version 3 of the License, or
+#      (at your option) any later version.
+#
+#      pyttygif is distributed in the hope that it will be useful,
+#      but WITHOUT ANY WARRANTY; without even the implied warranty of
+#      MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#      GNU General Public License for more details.
+#
+#      You should have received a copy of the GNU General Public License
+#      along with pyttygif.  If not, see <https://www.gnu.org/licenses/>.
+
+from pyttygif import image, terminal
+
+
+def _xterm_palette():
+    """
+    Build the xterm 256-color palette.
+
+    :return: List of (r, g, b) tuples.
+    """
+    palette = [(0x00, 0x00, 0x00), (0xcd, 0x00, 0x00), (0x00, 0xcd, 0x00),
+               (0xcd, 0xcd, 0x00), (0x00, 0x00, 0xee), (0xcd, 0x00, 0xcd),
+               (0x00, 0xcd, 0xcd), (0xe5, 0xe5, 0xe5), (0x7f, 0x7f, 0x7f),
+               (0xff, 0x00, 0x00), (0x00, 0xff, 0x00), (0xff, 0xff, 0x00),
+               (0x5c, 0x5c, 0xff), (0xff, 0x00, 0xff), (0x00, 0xff, 0xff),
+               (0xff, 0xff, 0xff)]
+    levels = terminal.CUBE_LEVELS
+    for r in levels:
+        for g in levels:
+            for b in levels:
+                palette.append((r, g, b))
+    for i in range(24):
+        palette.append((8 + i * 10,) * 3)
+    return palette
+
+
+XTERM_PALETTE = _xterm_palette()
+
+# Upper bound of cached rendered lines.
+LINE_CACHE_SIZE = 4096
+
+
+class Rasterizer(object):
+    """
+    Renders the screen model into indexed pixels.
+    """
+    def __init__(self, font, palette=XTERM_PALETTE):
+        """
+        Create a new rasterizer.
+
+        :param font: Font object to draw characters with.
+        :param palette: List of (r, g, b) tuples, indexed by terminal colors.
+        """
+        self.font = font
+        self.palette = palette
+        self.cells = {}  # Rendered cells (tuples of pixel rows)
+        self.lines = {}  # Rendered lines (bytes of pixels)
+
+    def _cell(self, char, fg, bg, flags, cursor, cells=1):
+        """
+        Render a single character cell.
+
+        :param char: Character, optionally followed by combining characters
+                     (empty for the second half of a wide character).
+        :param fg: Foreground color index.
+        :param bg: Background color index.
+        :param flags: Attribute flags.
+        :param cursor: Whether the cursor is over this cell.
+        :param cells: Number of cells the character takes.
+        :return: Tuple of pixel rows (bytes).
+        """
+        key = (char, fg, bg, flags, cursor, cells)
+        cell = self.cells.get(key)
+        if cell is not None:
+            return cell
+        font = self.font
+        if flags & terminal.BOLD and fg < 8:
+            fg += 8
+        if bool(flags & terminal.REVERSE) != cursor:
+            fg, bg = bg, fg
+        if flags & terminal.HIDDEN:
+            fg = bg
+        glyph = list(font.glyph(char[:1], cells) if char else font.blank)
+        for mark in char[1:]:
+            # Combining characters are drawn over the base one, if the font
+            # has them.
+            overlay = font.glyph(mark, cells, fallback=False)
+            if overlay is not None:
+                glyph = [row | extra for row, extra in zip(glyph, overlay)]
+        width = font.width * cells
+        full = (1 << width) - 1
+        if flags & terminal.BOLD:
+            glyph = [row | (row >> 1) for row in glyph]
+        if flags & terminal.UNDERLINE:
+            glyph[min(font.baseline + 1, font.height - 1)] = full
+        if flags & terminal.STRIKE:
+            glyph[font.baseline - font.height // 4] = full
+        rows = []
+        for row in glyph:
+            rows.append(bytes(fg if (row >> (width - 1 - i)) & 1 else bg
+                              for i in range(width)))
+        cell = tuple(rows)
+        self.cells[key] = cell
+        return cell
+
+    def _line(self, line, cursor):
+        """
+        Render a line of cells. Wide character is drawn over its own cell
+        and the empty cell after it.
+
+        :param line: List of cells.
+        :param cursor: Column of the cursor on this line (-1 if none).
+        :return: Bytes of pixels.
+        """
+        cells = []
+        x = 0
+        while x < len(line):
+            char, fg, bg, flags = line[x]
+            if char and x + 1 < len(line) and not line[x + 1][0]:
+                cells.append(self._cell(char, fg, bg, flags,
+                                        cursor in (x, x + 1), 2))
+                x += 2
+            else:
+                cells.append(self._cell(char, fg, bg, flags, x == cursor))
+                x += 1
+        return b''.join(b''.join(rows) for rows in zip(*cells))
+
+    def render(self, screen):
+        """
+        Render the whole screen.
+
+        :param screen: Screen to render.
+        :return: IndexedImage of the screen.
+        """
+        blocks = []
+        for y, line in enumerate(screen.lines):
+            cursor = -1
+            if screen.cursor_visible and y == screen.cursor_y:
+                cursor = screen.cursor_x
+            key = (tuple(line), cursor)
+            block = self.lines.get(key)
+            if block is None:
+                if len(self.lines) >= LINE_CACHE_SIZE:
+                    self.lines.clear()
+                block = self._line(line, cursor)
+                self.lines[key] = block
+            blocks.append(block)
+        return image.IndexedImage(screen.columns * self.font.width,
+                                  screen.rows * self.font.height,
+                                  b''.join(blocks), self.palette)
@@ -0,0 +1,1377 @@
+#      This file is part of pyttygif.
+#
+#      pyttygif is free software: you can redistribute it and/or modify
+#      it under the terms of the GNU General Public License as published by
+#      the Free Software Foundation, either version 3 of the License, or
+#      (at your option) any later version.
+#
+#      pyttygif is distributed in the hope that it will be useful,
+#      but WITHOUT ANY WARRANTY; without even the implied warranty of
+#      MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#      GNU General Public License for more details.
+#
+#      You should have received a copy of the GNU General Public License
+#      along with pyttygif.  If not, see <https://www.gnu.org/licenses/>.
+
+import array
+import asyncio
+import atexit
+import concurrent.futures
+import functools
+import os
+import sys
+import time
+import shutil
+import subprocess
+import multiprocessing
+import queue
+import threading
+
+from pyttygif import ttyplay, capture, gifbuilder, gifencode, headless, xwd
+from pyttygif import dirtyrect, ttyindex, plan, shmring, timing, settle
+from pyttygif import segment, archive, budget, palette, encoders, pngencode
+from pyttygif import spill, checkpoint, ximage, terminal
+
+# CLI tools that encode each output format
+DEPENDS_ON = {
+    'gif': ['gifsicle'],
+    'apng': [],
+    'webp': ['img2webp'],
+}
+# CLI tools that are needed to play ttyrec in the X11 terminal window
+X11_DEPENDS_ON = ['clear', 'stty', 'reset']
+# CLI tools that are needed to capture the window without Xlib
+XWD_DEPENDS_ON = ['xwd']
+# CLI tools that are needed to convert XWD screenshots with ImageMagick
+IMAGEMAGICK_DEPENDS_ON = ['convert']
+
+
+class RenderError(Exception):
+    """
+    Rendering can't be started or has failed.
+    """
+    pass
+
+
+def default_options(**overrides):
+    """
+    Get the rendering options with CLI defaults.
+
+    :param overrides: Options to change (named as long CLI options, with
+                      underscores instead of dashes).
+    :return: Namespace with options.
+    """
+    from pyttygif import cli
+    options = cli.make_parser().parse_args([])
+    for name, value in overrides.items():
+        if not hasattr(options, name):
+            raise TypeError("Unknown rendering option: {0}".format(name))
+        setattr(options, name, value)
+    return options
+
+
+def toggle_screensaver(win_id, enable=False):
+    """
+    Set the desired screensaver state.
+
+    :param win_id: Window ID to request from.
+    :param enable: Enable screensaver if True, else disable.
+    :return: None.
+    """
+    cmd = ['xdg-screensaver', 'resume' if enable else 'suspend', win_id]
+    subprocess.check_call(cmd)
+
+
+def clear_screen():
+    """
+    Clear and reset screen and set sane settings.
+
+    :return: None.
+    """
+    cmds = (('clear',), ('reset',), ('stty', 'sane'))
+    for cmd in cmds:
+        subprocess.check_call(cmd)
+
+
+def gif_frames_worker(taskqueue, resultqueue, nextqueue,
+                      converter=capture.convertimage, ring=None, memory=None,
+                      closefds=(), barrier=None):
+    """
+    Worker for converting GIF frames. Stage timings are passed to GIF
+    builder along with the frames. At the end of render, each worker gets
+    (None, None, None, None) task to pass the rest of timings to builder.
+
+    :return: None.
+    """
+    # Workers outlive the render, so they shouldn't keep its output stream
+    # open.
+    for fd in closefds:
+        try:
+            os.close(fd)
+        except OSError:
+            pass
+    timer = timing.StageTimer()
+    while True:
+        with timer.measure('convert queue wait'):
+            task = taskqueue.get()
+        if task is None:
+            sys.exit(0)
+        frmno, img, region, delay = task
+        if frmno is None:
+            totals, timer.totals = timer.totals, {}
+            nextqueue.put((None, None, None, totals))
+            # Wait for the other workers, so that each one takes a single
+            # flush task.
+            if barrier is not None:
+                barrier.wait()
+            continue
+        try:
+            data = img
+            if memory is not None:
+                with timer.measure('spill read'):
+                    data = memory.load(img)
+            with timer.measure('convert'):
+                if ring is not None:
+                    frame = converter(ring.get(data), region)
+                    ring.release(data)
+                else:
+                    frame = converter(data, region)
+            if memory is not None:
+                if not isinstance(img, shmring.SlotHandle):
+                    memory.release(img)
+                with timer.measure('spill write'):
+                    frame = memory.store(frame)
+        except (ChildProcessError, ValueError, OSError) as exc:
+            resultqueue.put(exc)
+            sys.exit(1)
+        # Push prepared frame to build final GIF. Time of the put is only
+        # known after it, so it goes with the next frame (or the flush).
+        totals, timer.totals = timer.totals, {}
+        with timer.measure('build queue put'):
+            nextqueue.put((frmno, frame, delay, totals))
+
+
+def gif_build_worker(taskqueue, resultqueue, gifbldr, statsqueue=None,
+                     frames=None, memory=None, saved=None):
+    """
+    Worker for building final GIF. It stops after the frame, that was
+    announced as the last one with (None, last frame number, number of
+    flushes, None), and the timings, flushed by converter workers with
+    (None, None, None, timings).
+    Frames are also saved to FrameArchive, if it's given. With Checkpoint,
+    frames saved by the interrupted render are built first, and new frames
+    are saved to it.
+
+    :return: None.
+    """
+    timer = timing.StageTimer()
+    curfrm = 1
+    lastfrm = None
+    flushes = flushed = 0
+    pending = {}
+    try:
+        gifbldr.start()
+        if frames is not None:
+            frames.start()
+        if saved is not None:
+            with timer.measure('checkpoint read'):
+                for data, delay in saved.saved_frames():
+                    gifbldr.add_image(data, delay)
+                    if frames is not None:
+                        frames.add_frame(data)
+            curfrm = saved.lastframe + 1
+            saved.start()
+    except (ChildProcessError, ValueError, OSError) as exc:
+        resultqueue.put(exc)
+        sys.exit(1)
+    while lastfrm is None or curfrm <= lastfrm or flushed < flushes:
+        with timer.measure('build queue wait'):
+            task = taskqueue.get()
+        try:
+            frmno, frame, delay, totals = task
+            if totals:
+                timer.merge(totals)
+            if frmno is None:
+                if frame is None:
+                    flushed += 1
+                else:
+                    lastfrm, flushes = frame, delay
+                continue
+            pending[frmno] = (frame, delay)
+            while curfrm in pending:
+                frame, delay = pending.pop(curfrm)
+                data = frame
+                if memory is not None:
+                    with timer.measure('spill read'):
+                        data = memory.load(frame)
+                if saved is not None:
+                    with timer.measure('checkpoint write'):
+                        saved.add_frame(curfrm, data, delay)
+                with timer.measure('gifsicle write'):
+                    gifbldr.add_image(data, delay)
+                if frames is not None:
+                    with timer.measure('archive write'):
+                        frames.add_frame(data)
+                if memory is not None:
+                    memory.release(frame)
+                curfrm += 1
+        except (ChildProcessError, ValueError, OSError) as exc:
+            resultqueue.put(exc)
+            sys.exit(1)
+    try:
+        with timer.measure('gifsicle finish'):
+            gifbldr.close()
+        if frames is not None:
+            frames.close()
+        if saved is not None:
+            saved.close()
+    except (ChildProcessError, ValueError, OSError) as exc:
+        resultqueue.put(exc)
+        sys.exit(1)
+    if statsqueue is not None:
+        statsqueue.put(timer.totals)
+    sys.exit(0)
+
+
+def _piped(input):
+    """
+    Check if ttyrec could only be read once, i.e. it comes from stdin or
+    a pipe (e.g. <(...) of the shell) rather than a regular file.
+
+    :param input: Path to the ttyrec file (- = stdin).
+    :return: True if ttyrec isn't a regular file.
+    """
+    return input == '-' or (os.path.exists(input) and
+                            not os.path.isfile(input))
+
+
+def _raise_worker_error(errorqueue):
+    """
+    Raise an exception, reported by a worker (if any).
+
+    :param errorqueue: Queue that workers report exceptions to.
+    :return: None.
+    """
+    if not errorqueue.empty():
+        exception = errorqueue.get()
+        raise RenderError("Worker has encountered an error:\n{0}: {1}".format(
+            type(exception).__name__, exception))
+
+
+class WorkerPool(object):
+    """
+    Converter processes, that are kept running between renders.
+    """
+    def __init__(self, converter, size=None, backlog=0, ring=None,
+                 memory=None):
+        """
+        Create a new pool. Workers are started with start().
+
+        :param converter: Function to convert captured images to GIF.
+        :param size: Number of workers (None - number of CPUs).
+        :param backlog: Max number of queued frames (0 = infinite).
+        :param ring: FrameRing to pass images through (None - pickle them).
+        :param memory: MemoryBudget of frames in flight (None - unlimited).
+        """
+        self.converter = converter
+        self.size = size or multiprocessing.cpu_count()
+        self.ring = ring
+        self.memory = memory
+        self.workers = []
+        # Captured frames to convert.
+        self.framequeue = multiprocessing.Queue(backlog)
+        # This queue is used to report exceptions from workers.
+        self.errorqueue = multiprocessing.Queue()
+        # This queue is used to pass converted frames to GIF builder.
+        self.gifqueue = multiprocessing.Queue(backlog)
+        # Workers meet here, when they flush the timings.
+        self.barrier = multiprocessing.Barrier(self.size)
+        # Thread to wait for the full queues in.
+        self.executor = concurrent.futures.ThreadPoolExecutor(1)
+        self.closed = threading.Event()
+
+    @property
+    def alive(self):
+        """
+        Check that no worker has died.
+
+        :return: True if pool can take frames.
+        """
+        return all(w.is_alive() for w in self.workers)
+
+    def start(self, closefds=()):
+        """
+        Start the worker processes if they aren't running yet.
+
+        :param closefds: File descriptors, that workers shouldn't inherit.
+        :return: None.
+        """
+        if self.workers:
+            return
+        for i in range(self.size):
+            p = multiprocessing.Process(target=gif_frames_worker,
+                                        args=(self.framequeue,
+                                              self.errorqueue, self.gifqueue,
+                                              self.converter, self.ring,
+                                              self.memory, closefds,
+                                              self.barrier))
+            p.daemon = True
+            p.start()
+            self.workers.append(p)
+
+    async def put(self, frmno, image, region, delay):
+        """
+        Queue the captured frame for GIF convert.
+
+        :param frmno: GIF frame number (to reorder frames back).
+        :param image: Captured image.
+        :param region: Region of image to convert (None - whole image).
+        :param delay: Delay of the GIF frame.
+        :return: None.
+        """
+        handle = image if self.ring is None else self.ring.put(image)
+        if self.memory is not None and \
+                not isinstance(handle, shmring.SlotHandle):
+            handle = self.memory.store(handle)
+        await self._put(self.framequeue, (frmno, handle, region, delay))
+
+    async def end_build(self, lastframe):
+        """
+        Let GIF builder know the number of the last frame and make workers
+        pass the rest of their timings to it.
+
+        :param lastframe: Number of the last GIF frame.
+        :return: None.
+        """
+        for _ in self.workers:
+            await self._put(self.framequeue, (None, None, None, None))
+        await self._put(self.gifqueue, (None, lastframe, len(self.workers),
+                                        None))
+
+    async def _put(self, taskqueue, task):
+        """
+        Put the task to the queue. When the queue is full, wait for it in a
+        thread, so that the event loop keeps running.
+
+        :param taskqueue: Queue to put to.
+        :param task: Task to put.
+        :return: None.
+        """
+        try:
+            taskqueue.put_nowait(task)
+        except queue.Full:
+            await asyncio.get_running_loop().run_in_executor(
+                self.executor, self._put_blocking, taskqueue, task)
+
+    def _put_blocking(self, taskqueue, task):
+        """
+        Put the task to the queue, unless the pool is closed meanwhile.
+
+        :param taskqueue: Queue to put to.
+        :param task: Task to put.
+        :return: None.
+        """
+        while not self.closed.is_set():
+            try:
+                taskqueue.put(task, True, 1)
+                return
+            except queue.Full:
+                pass
+
+    def close(self, wait=True):
+        """
+        Stop the workers and free the shared memory.
+
+        :param wait: Let workers finish queued frames, else kill them.
+        :return: None.
+        """
+        self.closed.set()
+        self.executor.shutdown(wait=False)
+        if wait:
+            for w in self.workers:
+                try:
+                    self.framequeue.put(None, True, 1)
+                except queue.Full:
+                    break
+            for w in self.workers:
+                w.join(1)
+        else:
+            # Queued frames will never be read, don't wait to flush them.
+            self.framequeue.cancel_join_thread()
+            self.gifqueue.cancel_join_thread()
+        for w in self.workers:
+            if w.is_alive():
+                w.terminate()
+        self.workers = []
+        if self.ring is not None:
+            self.ring.close()
+        if self.memory is not None:
+            self.memory.close()
+
+
+class Renderer(object):
+    """
+    Converts ttyrecs to GIF animations. Converter processes are kept
+    running between renders, so rendering many ttyrecs with the same
+    renderer saves process startup.
+    """
+    def __init__(self, options=None, log=None):
+        """
+        Set up the capture backend and check the dependencies.
+
+        :param options: Namespace with options (see default_options).
+        :param log: Function to print status messages with (None - quiet).
+        """
+        self.options = options if options is not None else default_options()
+        self.log = log if log is not None else (lambda *args: None)
+        self.headless = self.options.backend == 'headless'
+        self.windowid = None
+        self.grabber = None  # In-process window capture (None - use xwd)
+        self.term = None
+        self.pool = None
+        self.processes = []  # Builder and segment workers of the render
+        self.converter = capture.convertimage
+        options = self.options
+        self.format = options.format or 'gif'
+        if self.format not in DEPENDS_ON:
+            raise RenderError("Unknown output format: {0}".format(
+                self.format))
+        if self.format != 'gif' and options.save_frames:
+            raise RenderError("Frame archive could only be saved with GIF "
+                              "output")
+        # Frames could be mapped onto a fixed palette instead of being
+        # quantized one by one.
+        self.palette = None
+        if options.palette:
+            try:
+                self.palette = palette.Palette(
+                    palette.load_scheme(options.palette))
+            except (OSError, ValueError) as e:
+                raise RenderError("Couldn't load color scheme: {0}"
+                                  .format(e))
+        # Only the range of ttyrec between --start and --end is rendered.
+        self.range = None
+        if options.start or options.end:
+            try:
+                self.range = tuple(
+                    ttyplay.parse_position(position) if position else None
+                    for position in (options.start, options.end))
+            except ValueError as e:
+                raise RenderError(e)
+        if self.format != 'gif' and self.palette is None:
+            # Other formats keep a single palette for all the frames.
+            self.palette = palette.Palette(palette.load_scheme('xterm'))
+        if self.headless:
+            try:
+                columns, rows = map(int, options.geometry.lower().split('x'))
+            except ValueError:
+                raise RenderError("Terminal geometry should look like "
+                                  "COLSxROWS")
+            try:
+                self.term = headless.HeadlessTerminal(
+                    columns, rows, options.font, options.font_size,
+                    options.encoding.split(':')[1] if options.encoding
+                    else 'utf-8')
+            except (OSError, ValueError) as e:
+                raise RenderError("Couldn't set up headless terminal: "
+                                  "{0}".format(e))
+            self.converter = gifencode.convertimage
+            if self.format != 'gif':
+                self.converter = functools.partial(pngencode.convertimage,
+                                                   palette=self.palette)
+            elif self.palette is not None:
+                self.converter = functools.partial(gifencode.convertimage,
+                                                   palette=self.palette)
+        elif not options.dry_run:
+            # Get WINDOWID for taking screenshots of terminal
+            self.windowid = os.getenv('WINDOWID')
+            if not self.windowid:
+                raise RenderError("Couldn't get WINDOWID environment "
+                                  "variable")
+            try:
+                int(self.windowid)
+            except ValueError:
+                raise RenderError("WINDOWID environment variable should be "
+                                  "an integer")
+            if self.format != 'gif':
+                self.converter = functools.partial(xwd.convertimage,
+                                                   palette=self.palette,
+                                                   encode=pngencode.encode)
+            elif self.palette is not None:
+                # ImageMagick quantizes each frame on its own, so frames
+                # are mapped with built-in decoder.
+                self.converter = functools.partial(xwd.convertimage,
+                                                   palette=self.palette)
+            elif options.converter == 'builtin' or options.capture == 'xlib':
+                # Raw pixels of in-process capture are not XWD images, so
+                # ImageMagick can't read them.
+                self.converter = xwd.convertimage
+            if options.capture == 'xlib':
+                try:
+                    self.grabber = ximage.WindowCapture(int(self.windowid))
+                except (OSError, ValueError) as e:
+                    raise RenderError("Couldn't set up window capture: "
+                                      "{0}".format(e))
+        if not options.dry_run:
+            self._check_depends()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        self.close()
+
+    def _check_depends(self):
+        """
+        Check that all required CLI tools are present.
+
+        :return: None.
+        """
+        depends = list(DEPENDS_ON[self.format])
+        if not self.headless:
+            depends.extend(X11_DEPENDS_ON)
+            if self.grabber is None:
+                depends.extend(XWD_DEPENDS_ON)
+            if self.options.converter == 'imagemagick' and \
+                    self.palette is None and self.grabber is None:
+                depends.extend(IMAGEMAGICK_DEPENDS_ON)
+            if not self.options.no_disable_screensaver:
+                depends.append("xdg-screensaver")
+        for util in depends:
+            if not shutil.which(util):
+                raise RenderError("Required utility missing: {0}".format(util))
+
+    def _close_pool(self, wait=True):
+        """
+        Stop the converter processes.
+
+        :param wait: Let workers finish queued frames, else kill them.
+        :return: None.
+        """
+        if self.pool is not None:
+            self.pool.close(wait)
+            self.pool = None
+
+    def close(self, wait=True):
+        """
+        Stop the converter processes and disconnect from X server.
+
+        :param wait: Let workers finish queued frames, else kill them.
+        :return: None.
+        """
+        self._close_pool(wait)
+        if self.grabber is not None:
+            self.grabber.close()
+            self.grabber = None
+
+    def plan(self, input):
+        """
+        Estimate the cost of rendering without touching X11 and gifsicle.
+
+        :param input: Path to the ttyrec file.
+        :return: Dict with the estimate (see plan module).
+        """
+        options = self.options
+        if _piped(input):
+            raise RenderError("Dry run needs a ttyrec file to be read twice, "
+                              "not a pipe")
+        with ttyplay.TtyPlay(input, options.speed, options.encoding,
+                             options.logarithmic) as tp:
+            if self.range is not None:
+                tp.rawdelays = array.array('d')
+            delays = tp.compute_framedelays()
+            rawdelays, tp.rawdelays = tp.rawdelays, None
+            first, stop = self._frame_range(delays, rawdelays)
+            if self.range is not None:
+                delays = delays[first:stop - 1]
+            delays.append(options.lastframe)
+            points = self._capture_points(tp, input, delays, first)
+            if points is None:
+                points = ttyplay.capture_delays(delays, options.delaycap)
+            points, merged = self._merge_identical(input, points, first)
+            if self.headless:
+                gifdelays = [p for p in points if p is not None]
+                self.term.reset()
+                return plan.plan_headless(tp, self.term, delays, gifdelays,
+                                          not options.no_crop,
+                                          self.converter, first, merged)
+            lengths = tp.compute_framelengths()[first:first + len(delays)]
+            return plan.plan_x11(tp, delays, points, lengths,
+                                 settle.Settler(options.fps, options.settle),
+                                 merged)
+
+    def _frame_range(self, delays, rawdelays):
+        """
+        Find the ttyrec frames to render (--start and --end).
+
+        :param delays: Array of ttyrec frame delays (without the last frame).
+        :param rawdelays: Array of recorded frame delays (None if there's no
+                          range).
+        :return: Tuple of the first frame and the frame after the last one
+                 (zero-based).
+        """
+        total = len(delays) + 1
+        if self.range is None:
+            return 0, total
+        first, stop = ttyplay.frame_range(rawdelays, total, *self.range)
+        if first >= stop:
+            raise RenderError("There are no ttyrec frames in the range")
+        return first, stop
+
+    def _fast_forward(self, tp, first):
+        """
+        Draw the frames before the range in a single write, without delays
+        and captures.
+
+        :param tp: TtyPlay at the beginning of ttyrec.
+        :param first: Number of the first frame of the range.
+        :return: None.
+        """
+        payloads = []
+        while tp.frameno < first and tp.read_frame():
+            payloads.append(bytes(tp.frame))
+        if self.headless:
+            self.term.display(b''.join(payloads))
+        else:
+            tp.display_frame(b''.join(payloads))
+
+    def _capture_points(self, tp, input, delays, first=0):
+        """
+        Choose the ttyrec frames to capture, so that GIF fits into the frame
+        budget (--max-frames and --target-size).
+
+        :param tp: TtyPlay of ttyrec (rewound afterwards).
+        :param input: Path to the ttyrec file.
+        :param delays: List of ttyrec frame delays (including the last frame).
+        :param first: Number of the ttyrec frame, that delays start with.
+        :return: List in the format of ttyplay.capture_delays or None, if
+                 there's no budget or GIF fits into it anyway.
+        """
+        options = self.options
+        if options.max_frames is None and options.target_size is None:
+            return None
+        target_size = frame_size = None
+        if options.target_size is not None:
+            target_size = options.target_size * 1024
+            if self.headless:
+                # Measure a few frames of this ttyrec with its own player,
+                # so that the main one stays where it is.
+                with ttyplay.TtyPlay(input, options.speed, options.encoding,
+                                     options.logarithmic) as sample:
+                    self.term.reset()
+                    frame_size = plan.measure_headless(
+                        sample, self.term, delays, not options.no_crop,
+                        converter=self.converter, first=first)[2]
+                    self.term.reset()
+            else:
+                frame_size = plan.X11_FRAME_SIZE
+        limit = budget.frame_limit(options.max_frames, target_size,
+                                   frame_size)
+        if limit is None:
+            return None
+        self.log("Choosing up to {0} frames to capture...\n".format(limit))
+        lengths = tp.compute_framelengths()[first:first + len(delays)]
+        return budget.decimate(delays, lengths, limit, options.delaycap)
+
+    def _merge_identical(self, input, points, first=0):
+        """
+        Join the captures of identical screens (unless --no-dedupe), playing
+        the ttyrec on the terminal model with its own player. Only done with
+        headless backend, where the model is what is rendered. A real
+        terminal draws more than the model knows of (e.g. screen flash), so
+        X11 captures are compared as they are taken instead.
+
+        :param input: Path to the ttyrec file.
+        :param points: List in the format of ttyplay.capture_delays.
+        :param first: Number of the ttyrec frame, that points start with.
+        :return: Tuple of list in the format of ttyplay.capture_delays and
+                 number of merged captures.
+        """
+        options = self.options
+        if options.no_dedupe or not self.headless:
+            return points, 0
+        screen = terminal.Screen(self.term.screen.columns,
+                                 self.term.screen.rows,
+                                 options.encoding.split(':')[1]
+                                 if options.encoding else 'utf-8')
+        self.log("Looking for identical frames...\n")
+        with ttyplay.TtyPlay(input, options.speed, options.encoding,
+                             options.logarithmic) as sample:
+            return budget.merge_identical(sample, screen, points, first)
+
+    def _make_encoder(self, output, delays):
+        """
+        Make the encoder of the output format.
+
+        :param output: Path to save the resulting animation or file object.
+        :param delays: A list of delays for each frame (None - frames carry
+                       their own delays).
+        :return: Encoder.
+        """
+        options = self.options
+        if self.format == 'apng':
+            return encoders.ApngEncoder(output, delays, options.loop,
+                                        self.palette.colors)
+        if self.format == 'webp':
+            return encoders.WebpEncoder(output, delays, options.loop,
+                                        self.palette.colors)
+        return gifbuilder.GifBuilder(output, delays, options.loop,
+                                     options.optimize_level,
+                                     not options.no_conserve_memory,
+                                     options.lossy)
+
+    def _capture_window(self):
+        """
+        Capture the terminal window with X11 backend.
+
+        :return: Raw XWD image bytes or Pixmap.
+        """
+        if self.grabber is not None:
+            return self.grabber.capture()
+        return capture.capturewithretry(self.windowid)
+
+    async def _capture_window_async(self, timer):
+        """
+        Same as _capture_window, but doesn't block the event loop while xwd
+        runs. In-process capture is fast, so it's taken right away.
+
+        :param timer: StageTimer to account failed captures to.
+        :return: Raw XWD image bytes or Pixmap.
+        """
+        if self.grabber is None:
+            return await capture.capturewithretry_async(self.windowid,
+                                                        timer=timer)
+        try:
+            return self.grabber.capture()
+        except (OSError, ValueError) as e:
+            raise RenderError("Couldn't capture the window: {0}".format(e))
+
+    def _get_pool(self):
+        """
+        Get the converter pool, start a new one if there's none or the
+        previous one has failed.
+
+        :return: WorkerPool.
+        """
+        if self.pool is not None and self.pool.alive:
+            return self.pool
+        self._close_pool(False)
+        options = self.options
+        # Captured frames could be passed to converters through shared memory
+        # instead of pickling them through the queue.
+        ring = None
+        if options.shared_memory:
+            # Frames that don't fit (e.g. if backlog is unlimited) are queued
+            # as is.
+            cpus = multiprocessing.cpu_count()
+            slots = options.max_backlog or cpus
+            try:
+                if self.headless:
+                    slotsize = self.term.image_size
+                else:
+                    # Window size is not known in advance, so take a probe
+                    # capture.
+                    slotsize = spill.frame_size(self._capture_window())
+                ring = shmring.FrameRing(slots + cpus, slotsize)
+            except (OSError, ValueError, ChildProcessError) as e:
+                raise RenderError("Couldn't set up shared memory: "
+                                  "{0}".format(e))
+            atexit.register(ring.close)
+        # Memory budget replaces the limit of queued frames, frames over it
+        # are spilled to the disk.
+        memory = None
+        backlog = options.max_backlog
+        if options.backlog_memory:
+            memory = spill.MemoryBudget(options.backlog_memory * 2**20)
+            atexit.register(memory.close)
+            backlog = 0
+        self.pool = WorkerPool(self.converter, backlog=backlog, ring=ring,
+                               memory=memory)
+        return self.pool
+
+    def render(self, input, output):
+        """
+        Render ttyrec to GIF.
+
+        :param input: Path to the ttyrec file (- = stdin).
+        :param output: Path to save the resulting GIF (- = stdout) or
+                       writable binary file object.
+        :return: Dict with rendering stats.
+        """
+        options = self.options
+        if not input:
+            raise RenderError("Input ttyrec file omitted, nothing to do.")
+        if not output:
+            raise RenderError("Output file not specified, nothing to do.")
+        if not isinstance(output, str):
+            # Animation is written by builder process, so the stream is
+            # only shared with it through file descriptor.
+            try:
+                output.fileno()
+            except (AttributeError, OSError, ValueError):
+                raise RenderError("Output stream should have a file "
+                                  "descriptor")
+        if not self.headless and (output == '-' or
+                                  output is sys.stdout.buffer):
+            raise RenderError("X11 backend plays ttyrec to stdout, so GIF "
+                              "could only be written there with headless "
+                              "backend")
+        # stdin and pipes could only be read once, and compressed ttyrecs
+        # are decompressed only once as well, unless frame budget needs
+        # delays in advance.
+        piped = _piped(input)
+        compressed = os.path.isfile(input) and \
+            ttyplay.detect_compression(input) is not None
+        budgeted = options.max_frames is not None or \
+            options.target_size is not None
+        ranged = self.range is not None
+        if piped and budgeted:
+            raise RenderError("Frame budget needs a ttyrec file to be read "
+                              "twice, not a pipe")
+        if piped and ranged:
+            raise RenderError("Time range needs a ttyrec file to be read "
+                              "twice, not a pipe")
+        stream = options.stream or piped or \
+            (compressed and not budgeted and not ranged)
+        if stream and budgeted:
+            raise RenderError("Frame budget needs a ttyrec file to be read "
+                              "twice")
+        if stream and ranged:
+            raise RenderError("Time range needs a ttyrec file to be read "
+                              "twice")
+        segmented = options.segments > 1
+        if segmented and (not self.headless or stream or
+                          not os.path.isfile(input)):
+            raise RenderError("Segmented rendering needs headless backend "
+                              "and an uncompressed ttyrec file")
+        if options.checkpoint_dir and piped:
+            raise RenderError("Resumable render needs a ttyrec file, not a "
+                              "pipe")
+        if options.checkpoint_dir and segmented:
+            raise RenderError("Resumable render can't be split into "
+                              "segments")
+        pool = self._get_pool()
+        # Converted frames are kept in checkpoint directory until the render
+        # completes, so that the same render could resume from them.
+        saved = None
+        if options.checkpoint_dir:
+            try:
+                saved = checkpoint.Checkpoint(
+                    options.checkpoint_dir,
+                    checkpoint.render_key(input, output, options))
+                if saved.load():
+                    self.log("Resuming after {0} saved frames...\n".format(
+                        len(saved.gifdelays)))
+            except OSError as e:
+                raise RenderError("Couldn't load checkpoint: {0}".format(e))
+        # Create a tty player. Regular files are mapped into memory and
+        # indexed, so that frame delays are computed without reading the
+        # payloads.
+        if input == '-':
+            tp = ttyplay.TtyPlay(sys.stdin.buffer, options.speed,
+                                 options.encoding, options.logarithmic)
+        elif os.path.isfile(input) and not stream and not compressed:
+            tp = ttyindex.IndexedTtyPlay(input, options.speed,
+                                         options.encoding,
+                                         options.logarithmic,
+                                         options.save_index)
+        else:
+            tp = ttyplay.TtyPlay(input, options.speed, options.encoding,
+                                 options.logarithmic)
+        if self.headless:
+            self.term.reset()
+        self.processes = []
+        try:
+            return self._render(tp, input, output, pool, stream, segmented,
+                                saved)
+        except BaseException:
+            # Workers could be in the middle of this render, so don't let
+            # them mix its frames into the next one.
+            for w in self.processes:
+                if w.is_alive():
+                    w.terminate()
+            self._close_pool(False)
+            raise
+        finally:
+            tp.close()
+            if saved is not None:
+                saved.close()
+
+    def _render(self, tp, input, output, pool, stream, segmented,
+                saved=None):
+        """
+        Play the ttyrec and build the GIF.
+
+        :return: Dict with rendering stats.
+        """
+        options = self.options
+        time_start = time.time()
+        if options.save_frames or self.range is not None:
+            # Recorded delays are saved with frames and give the time range.
+            tp.rawdelays = array.array('d')
+        first = 0  # Number of the first rendered ttyrec frame
+        if stream:
+            # In streaming mode ttyrec is read only once and each GIF frame
+            # carries its own delay. Delays are collected as we go for the
+            # stats.
+            delays = array.array('d')
+            points = None
+            merged = 0  # Identical frames are merged as they are captured
+
+            def ttyrec_frames():
+                for payload, delay in tp.stream_frames(options.lastframe):
+                    delays.append(delay)
+                    yield payload, delay
+
+            frames = ttyrec_frames()
+        else:
+            # Here we do a two-pass run over ttyrec. On 1st pass we get frame
+            # lengths from ttyrec and calculate delays for GIF frames.
+            delays = tp.compute_framedelays()
+            rawdelays, tp.rawdelays = tp.rawdelays, None
+            # Only the range is rendered, it ends with the last frame delay
+            # as the whole ttyrec does.
+            first, stop = self._frame_range(delays, rawdelays)
+            if self.range is not None:
+                delays = delays[first:stop - 1]
+                rawdelays = rawdelays[first:stop - 1]
+            delays.append(options.lastframe)  # To allow last iteration to pass
+
+            # Next is a little optimization. Ttyrec frames are in microsecond
+            # resolution and could be very small. So, we join several very
+            # short frames into a single GIF frame with reasonable timing.
+            # With frame budget, the least changing frames are joined, too,
+            # and so are the frames, that show the same screen.
+            points = self._capture_points(tp, input, delays, first)
+            if points is None:
+                points = ttyplay.capture_delays(delays, options.delaycap)
+            points, merged = self._merge_identical(input, points, first)
+            gifdelays = [p for p in points if p is not None]
+
+            def ttyrec_frames():
+                while tp.frameno < stop and tp.read_frame():
+                    yield tp.frame, delays[tp.frameno - 1 - first]
+
+            frames = ttyrec_frames()
+
+        if segmented:
+            # Segments are played by their own workers, so main loop has
+            # nothing to do. Segments start at frames, that redraw the whole
+            # screen, where possible.
+            allsafe = segment.find_safe_frames(tp)
+            safe = [f - first for f in allsafe if first <= f < stop]
+            segments = segment.split(points, safe, options.segments)
+            # Segments play the ttyrec file on their own, so the range is
+            # shifted to where it is in the file.
+            if first:
+                segments = [(start + first, end + first, gifframe)
+                            for start, end, gifframe in segments]
+                points = [None] * first + points
+            frames = iter(())
+
+        # Make a GIF builder with pre-computed frame delays (if we know
+        # them). X11 captures, that turn out to be identical, are merged as
+        # they come, so the frames carry their delays then.
+        known = not stream and (self.headless or options.no_dedupe)
+        gif = self._make_encoder(output, gifdelays if known else None)
+
+        # Clear screen before playback. The idea is to clear pyttygif
+        # invocation.
+        if not options.dirty and not self.headless:
+            clear_screen()
+
+        # This queue is used to collect stage timings from workers.
+        statsqueue = multiprocessing.Queue()
+        timer = timing.StageTimer()
+        if first and not segmented:
+            with timer.measure('replay'):
+                self._fast_forward(tp, first)
+        # This queue is used to collect delays of rendered segments.
+        resultqueue = multiprocessing.Queue()
+        workers = []
+        if segmented:
+            for seg in segments:
+                p = multiprocessing.Process(target=segment.render_segment,
+                                            args=(input, seg, allsafe,
+                                                  points, self.term, options,
+                                                  pool.gifqueue,
+                                                  pool.errorqueue, statsqueue,
+                                                  resultqueue,
+                                                  self.converter,
+                                                  pool.memory))
+                p.daemon = True
+                p.start()
+                workers.append(p)
+            lastframe = sum(1 for p in points if p is not None)
+        else:
+            closefds = ()
+            if not isinstance(output, str) and output.fileno() > 2:
+                closefds = (output.fileno(),)
+            pool.start(closefds)
+            lastframe = None  # Known when the whole ttyrec is played
+
+        # Converted frames could be saved to rebuild GIF with other timings.
+        frames_archive = None
+        if options.save_frames:
+            frames_archive = archive.FrameArchive(options.save_frames)
+        builder = multiprocessing.Process(target=gif_build_worker,
+                                          args=(pool.gifqueue,
+                                                pool.errorqueue, gif,
+                                                statsqueue, frames_archive,
+                                                pool.memory, saved))
+        builder.daemon = True
+        builder.start()
+        self.processes = workers + [builder]
+
+        if not options.no_disable_screensaver and not self.headless:
+            toggle_screensaver(self.windowid)  # Inhibit screen lock
+
+        # Stages are driven by event loop, so that failed workers are noticed
+        # as soon as they exit, and previous capture is processed while
+        # terminal draws the next one.
+        settler = settle.Settler(options.fps, options.settle, timer)
+        recorder = asyncio.run(self._pipeline(
+            tp, frames, pool, builder, workers, timer, settler,
+            None if stream else len(delays), lastframe,
+            None if segmented else points, saved, gif.name))
+        gifdelays = recorder.gifdelays
+        duplicates = recorder.duplicates + merged
+        ends = recorder.ends
+
+        # Collect stage timings, reported by builder and segments.
+        for _ in range(len(workers) + 1):
+            try:
+                timer.merge(statsqueue.get(True, 1))
+            except queue.Empty:
+                break
+        if segmented:
+            results = sorted(resultqueue.get(True, 1) for _ in segments)
+            for _, segdelays, segends in results:
+                gifdelays.extend(segdelays)
+                ends.extend(end - first for end in segends)
+            for w in workers:
+                w.join()
+        if frames_archive is not None:
+            if stream:
+                rawdelays = tp.rawdelays
+            frames_archive.write_timings(rawdelays, ends)
+
+        if not options.no_disable_screensaver and not self.headless:
+            toggle_screensaver(self.windowid, True)  # Reenable screen lock
+        if saved is not None:
+            saved.finish()
+
+        time_end = time.time()
+        in_frames = len(delays)
+        out_frames = len(gifdelays)
+        return {
+            'format': gif.name,
+            'render_time': time_end - time_start,
+            'ttyrec_duration': ttyplay.recorded_duration(
+                delays[:-1], options.speed, options.logarithmic),
+            'played_duration': sum(delays[:-1]),
+            'gif_duration': sum(filter(lambda x: round(x * 100) / 100,
+                                       gifdelays)),
+            'input_frames': in_frames,
+            'output_frames': out_frames,
+            'dropped_frames': in_frames - out_frames - duplicates,
+            'duplicate_frames': duplicates,
+            'settle_saved': 0.0 if self.headless else settler.saved,
+            'stages': timer.as_dict(),
+        }
+
+    async def _pipeline(self, tp, frames, pool, builder, workers, timer,
+                        settler, total, lastframe, points=None,
+                        saved=None, name='GIF'):
+        """
+        Play the ttyrec, capture it and wait for the GIF to be built. Failure
+        of any worker process is raised as soon as it exits.
+
+        :param tp: TtyPlay to display the frames with.
+        :param frames: Iterable of (payload, delay) tuples to play.
+        :param pool: WorkerPool to convert the frames with.
+        :param builder: GIF builder process.
+        :param workers: Segment worker processes.
+        :param timer: StageTimer to account stages to.
+        :param settler: Settler to wait for terminal with.
+        :param total: Number of ttyrec frames (None - unknown).
+        :param lastframe: Number of the last GIF frame (None - count them).
+        :param points: GIF delays of captured ttyrec frames (None - capture
+                       frames as they come).
+        :param saved: Checkpoint to save the frames to and to resume from
+                      (None - don't save them).
+        :param name: Name of the output format (as Encoder.name).
+        :return: _Recorder with delays of the sent frames.
+        """
+        options = self.options
+        watch = _ProcessWatch(asyncio.get_running_loop(),
+                              pool.workers + workers + [builder],
+                              pool.errorqueue)
+        # Headless captures, chosen in advance, are already known to differ,
+        # else identical ones are found as they are captured.
+        recorder = _Recorder(options, pool, watch, timer, saved,
+                             not options.no_dedupe and
+                             (points is None or not self.headless))
+        # Frames, that are shown by saved frames, are only replayed to
+        # restore the terminal state.
+        skip = saved.end + 1 if saved is not None else 0
+
+        # Progress line is drawn on stderr, so with X11 backend it's only
+        # shown when stderr is redirected from the terminal being captured.
+        progress = None
+        if options.progress and (self.headless or not sys.stderr.isatty()):
+            progress = timing.Progress(sys.stderr, total)
+        played = 0  # Number of ttyrec frames played so far.
+        drawn = 0  # Bytes written to terminal since the last capture.
+        vislength = 0.0
+        post = None  # Task, that processes the previous capture.
+
+        async def grab():
+            nonlocal drawn
+            if self.headless:
+                # Built-in terminal is drawn synchronously, no need to wait.
+                with timer.measure('render'):
+                    return self.term.capture()
+            # Let the terminal emulator draw the frame. Without this it's
+            # possible to capture partial draws. It's not a strict guarantee,
+            # but seems to work reasonably well. Then capture the image of
+            # terminal and queue it for GIF convert.
+            image = await settler.capture(
+                drawn, lambda: self._capture_window_async(timer))
+            drawn = 0
+            return image
+
+        # Main recording loop.
+        try:
+            for payload, delay in frames:
+                with timer.measure('replay' if played < skip else 'display'):
+                    if self.headless:
+                        self.term.display(payload)
+                    else:
+                        tp.display_frame(payload)
+                played += 1
+                drawn += len(payload)
+                if progress is not None:
+                    progress.update(played, recorder.gifframe - 1)
+                if played <= skip:
+                    if played == skip:
+                        # The restored screen is what the last saved frame
+                        # shows, so crop and merge the next ones against it.
+                        recorder.resume(await grab())
+                    continue
+                if points is not None:
+                    gifdelay = points[played - 1]
+                    if gifdelay is None:
+                        continue  # Frame is joined with the following one.
+                else:
+                    vislength += delay
+                    if vislength <= ttyplay.MIN_GIF_DELAY:
+                        continue  # We discard frames that are too short.
+                    gifdelay = min(options.delaycap, vislength)
+                    vislength = 0.0
+                image = await grab()
+                if post is not None:
+                    await post
+                post = asyncio.ensure_future(recorder.add(image, gifdelay,
+                                                          played - 1))
+            if post is not None:
+                await post
+                post = None
+            await recorder.finish()
+            if progress is not None:
+                progress.update(played, recorder.gifframe - 1, True)
+                progress.finish()
+
+            # Let GIF builder know when to stop and wait for it.
+            self.log("Building the resulting {0}...\n".format(name))
+            if lastframe is None:
+                lastframe = recorder.gifframe - 1
+            await watch.until(pool.end_build(lastframe))
+            await watch.until(watch.exited[builder])
+        except ChildProcessError as e:
+            raise RenderError("Main processing loop failed:\n{0}: {1}".format(
+                type(e).__name__, e))
+        finally:
+            if post is not None:
+                post.cancel()
+            watch.close()
+            if not self.headless:
+                clear_screen()
+        return recorder
+
+
+class _ProcessWatch(object):
+    """
+    Completes futures when processes exit, without polling them.
+    """
+    def __init__(self, loop, processes, errorqueue):
+        """
+        Start watching the processes.
+
+        :param loop: Event loop to watch in.
+        :param processes: List of processes to watch.
+        :param errorqueue: Queue that processes report exceptions to.
+        """
+        self.loop = loop
+        self.errorqueue = errorqueue
+        # Completed with the first process that has exited with error.
+        self.failed = loop.create_future()
+        # Completed with exit codes of processes.
+        self.exited = {}
+        for p in processes:
+            self.exited[p] = loop.create_future()
+            loop.add_reader(p.sentinel, self._exited, p)
+
+    def _exited(self, process):
+        """
+        Handle exit of the process.
+
+        :param process: Process that has exited.
+        :return: None.
+        """
+        self.loop.remove_reader(process.sentinel)
+        process.join()
+        self.exited[process].set_result(process.exitcode)
+        if process.exitcode and not self.failed.done():
+            self.failed.set_result(process)
+
+    async def until(self, awaitable):
+        """
+        Wait for the awaitable, unless some process fails first.
+
+        :param awaitable: Coroutine or future to wait for.
+        :return: Result of the awaitable.
+        """
+        future = asyncio.ensure_future(awaitable)
+        if not self.failed.done():
+            await asyncio.wait((future, self.failed),
+                               return_when=asyncio.FIRST_COMPLETED)
+        if self.failed.done():
+            future.cancel()
+            _raise_worker_error(self.errorqueue)
+            raise RenderError("Worker {0} has died".format(
+                self.failed.result().name))
+        return future.result()
+
+    def close(self):
+        """
+        Stop watching the processes, that are still running.
+
+        :return: None.
+        """
+        for p, exited in self.exited.items():
+            if not exited.done():
+                self.loop.remove_reader(p.sentinel)
+
+
+class _Recorder(object):
+    """
+    Merges identical captures, crops them to the changed region and queues
+    them for GIF convert.
+    """
+    def __init__(self, options, pool, watch, timer, saved=None,
+                 dedupe=True):
+        """
+        Create a new recorder.
+
+        :param options: Namespace with options.
+        :param pool: WorkerPool to convert the frames with.
+        :param watch: _ProcessWatch of the render.
+        :param timer: StageTimer to account queueing to.
+        :param saved: Checkpoint to save ends of the frames to and to
+                      continue after (None - start from scratch).
+        :param dedupe: Whether identical captures are merged.
+        """
+        self.options = options
+        self.dedupe = dedupe
+        self.pool = pool
+        self.watch = watch
+        self.timer = timer
+        self.saved = saved
+        self.gifframe = 1  # GIF frame counter is used to reorder frames back.
+        self.previmage = None  # Previous capture to find the changed region.
+        self.prevdigest = None  # Content hash of the previous capture.
+        self.pending = None  # Last capture, waiting for its delay to be final.
+        self.duplicates = 0  # Number of captures, merged into the previous.
+        self.gifdelays = []  # Delays of the frames, actually sent to builder.
+        self.ends = []  # Last ttyrec frame, shown by each sent frame.
+        if saved is not None:
+            self.gifframe = saved.lastframe + 1
+            self.duplicates = saved.duplicates
+            self.gifdelays = list(saved.gifdelays)
+            self.ends = list(saved.ends)
+
+    def resume(self, image):
+        """
+        Take the screen, shown by the last saved frame, as the previous
+        capture.
+
+        :param image: Captured image.
+        :return: None.
+        """
+        if self.dedupe:
+            self.prevdigest = dirtyrect.digest(image)
+        if not self.options.no_crop:
+            self.previmage = image
+
+    async def add(self, image, gifdelay, frameno):
+        """
+        Take the next capture.
+
+        :param image: Captured image.
+        :param gifdelay: Delay of the GIF frame.
+        :param frameno: Number of the captured ttyrec frame (zero-based).
+        :return: None.
+        """
+        options = self.options
+        if self.dedupe:
+            # If nothing has changed on the screen, just show the previous
+            # frame for longer instead of converting the same image again.
+            # Delays are capped per capture, so merged time isn't lost.
+            imgdigest = dirtyrect.digest(image)
+            if imgdigest == self.prevdigest and self.pending is not None:
+                self.pending[2] += gifdelay
+                self.pending[3] = frameno
+                self.duplicates += 1
+                return
+            self.prevdigest = imgdigest
+        region = None
+        if not options.no_crop:
+            # Only encode the part of the screen that was changed since the
+            # previous frame, the rest of it will show through.
+            region = dirtyrect.changed_region(self.previmage, image)
+            self.previmage = image
+        if self.pending is not None:
+            await self._send(*self.pending)
+        self.pending = [image, region, gifdelay, frameno]
+
+    async def finish(self):
+        """
+        Queue the last capture.
+
+        :return: None.
+        """
+        if self.pending is not None:
+            await self._send(*self.pending)
+            self.pending = None
+
+    async def _send(self, image, region, delay, frameno):
+        """
+        Queue the frame for GIF convert.
+
+        :param image: Captured image.
+        :param region: Region of image to convert (None - whole image).
+        :param delay: Delay of the GIF frame.
+        :param frameno: Number of the last ttyrec frame, shown by the frame.
+        :return: None.
+        """
+        if self.saved is not None:
+            # End is saved before the frame, so that every frame in the
+            # checkpoint has its end.
+            self.saved.add_end(self.gifframe, frameno, self.duplicates)
+        with self.timer.measure('frame queue put'):
+            await self.watch.until(self.pool.put(self.gifframe, image,
+                                                 region, delay))
+        self.gifframe += 1
+        self.gifdelays.append(delay)
+        self.ends.append(frameno)
@@ -0,0 +1,190 @@
+#      This file is part of pyttygif.
+#
+#      pyttygif is free software: you can redistribute it and/or modify
+#      it under the terms of the GNU General Public License as published by
+#      the Free Software Foundation, either version 3 of the License, or
+#      (at your option) any later version.
+#
+#      pyttygif is distributed in the hope that it will be useful,
+#      but WITHOUT ANY WARRANTY; without even the implied warranty of
+#      MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#      GNU General Public License for more details.
+#
+#      You should have received a copy of the GNU General Public License
+#      along with pyttygif.  If not, see <https://www.gnu.org/licenses/>.
+
+import bisect
+import re
+import sys
+
+from pyttygif import dirtyrect, gifencode, ttyindex, timing
+
+# Sequences, after which the screen doesn't depend on what was drawn before
+# (full reset and erase display), and switches between main and alternate
+# screens. Erasing the alternate screen isn't enough, as the main screen is
+# restored from before it when the program exits.
+SCREEN_SEQUENCES = re.compile(rb'\x1bc|\x1b\[2J|\x1b\[H\x1b\[J|'
+                              rb'\x1b\[\?(?:1049|1047|47)[hl]')
+
+
+def find_safe_frames(tp):
+    """
+    Find ttyrec frames, that redraw the whole main screen, so that it could
+    be replayed from them on a reset terminal. Modes and colors, set before
+    the screen is erased, are expected to be set again by the program, that
+    redraws it.
+
+    :param tp: TtyPlay at the beginning of ttyrec (rewound afterwards).
+    :return: List of 0-based frame numbers.
+    """
+    safe = []
+    alternate = False
+    while tp.read_frame(loop=True):
+        issafe = False
+        for match in SCREEN_SEQUENCES.finditer(tp.frame):
+            seq = match.group()
+            if seq == b'\x1bc':
+                alternate = False
+                issafe = True
+            elif seq.endswith(b'h'):
+                alternate = True
+            elif seq.endswith(b'l'):
+                alternate = False
+            elif not alternate:
+                issafe = True
+        if issafe:
+            safe.append(tp.frameno - 1)
+    return safe
+
+
+def replay_start(safe, start):
+    """
+    Find the frame to replay the ttyrec from to restore the terminal state
+    before the segment.
+
+    :param safe: Sorted list of safe frame numbers.
+    :param start: First frame of the segment.
+    :return: Nearest safe frame up to start (0 if there's none).
+    """
+    i = bisect.bisect_right(safe, start)
+    return safe[i - 1] if i else 0
+
+
+def split(points, safe, count):
+    """
+    Split ttyrec into segments of similar length, preferably at safe frames.
+    Segments only start right after a captured frame, so that GIF frames
+    don't span two segments.
+
+    :param points: List of GIF delays for captured ttyrec frames (None for
+                   frames, that aren't captured).
+    :param safe: Sorted list of safe frame numbers.
+    :param count: Desired number of segments.
+    :return: List of (start, end, first GIF frame number) tuples.
+    """
+    total = len(points)
+    valid = [f for f in range(1, total) if points[f - 1] is not None]
+    validset = set(valid)
+    safe = [f for f in safe if f in validset]
+    window = total // (2 * count)
+    starts = [0]
+    for k in range(1, count):
+        target = total * k // count
+        start = _nearest(safe, target, window)
+        if start is None:
+            start = _nearest(valid, target, total)
+        if start is not None and start > starts[-1]:
+            starts.append(start)
+    segments = []
+    first = 1
+    ends = starts[1:] + [total]
+    for start, end in zip(starts, ends):
+        segments.append((start, end, first))
+        first += sum(1 for p in points[start:end] if p is not None)
+    return segments
+
+
+def _nearest(values, target, window):
+    """
+    Find the value, closest to target within the window.
+
+    :param values: Sorted list of integers.
+    :param target: Target value.
+    :param window: Maximum distance from target.
+    :return: Closest value or None.
+    """
+    i = bisect.bisect_left(values, target)
+    candidates = values[max(0, i - 1):i + 1]
+    candidates = [v for v in candidates if abs(v - target) <= window]
+    if not candidates:
+        return None
+    return min(candidates, key=lambda v: abs(v - target))
+
+
+def render_segment(path, segment, safe, points, term, options, gifqueue,
+                   errorqueue, statsqueue, resultqueue,
+                   converter=gifencode.convertimage, memory=None):
+    """
+    Worker, that renders a segment of ttyrec with headless terminal and
+    sends converted frames to GIF builder. Frames from the nearest safe one
+    before the segment are only fed to the terminal to restore its state.
+
+    :param path: Path to the ttyrec file.
+    :param segment: Tuple of (start, end, first GIF frame number).
+    :param safe: Sorted list of safe frame numbers.
+    :param points: List of GIF delays for captured ttyrec frames.
+    :param term: HeadlessTerminal to render with.
+    :param options: Parsed CLI arguments.
+    :param gifqueue: Queue of GIF builder.
+    :param errorqueue: Queue to report exceptions to.
+    :param statsqueue: Queue to report stage timings to.
+    :param resultqueue: Queue to report delays and last ttyrec frames of GIF
+                        frames to.
+    :param converter: Function to convert frames with.
+    :param memory: MemoryBudget of frames in flight (None - unlimited).
+    :return: None.
+    """
+    start, end, gifframe = segment
+    timer = timing.StageTimer()
+    gifdelays = []
+    ends = []  # Last ttyrec frame, shown by each sent frame
+    previmage = None
+
+    def send(frmno, image, region, delay, end):
+        with timer.measure('convert'):
+            frame = converter(image, region)
+        if memory is not None:
+            with timer.measure('spill write'):
+                frame = memory.store(frame)
+        with timer.measure('build queue put'):
+            gifqueue.put((frmno, frame, delay, None))
+        gifdelays.append(delay)
+        ends.append(end)
+
+    try:
+        tp = ttyindex.IndexedTtyPlay(path, options.speed, options.encoding,
+                                     options.logarithmic)
+        # Frames are read by index, so replay could start from any of them.
+        tp.frameno = replay_start(safe, start)
+        while tp.frameno < end and tp.read_frame():
+            frameno = tp.frameno - 1
+            with timer.measure('display' if frameno >= start else 'replay'):
+                term.display(tp.frame)
+            if frameno < start or points[frameno] is None:
+                continue
+            gifdelay = points[frameno]
+            with timer.measure('render'):
+                image = term.capture()
+            region = None
+            if not options.no_crop:
+                region = dirtyrect.changed_region(previmage, image)
+                previmage = image
+            send(gifframe, image, region, gifdelay, frameno)
+            gifframe += 1
+        tp.close()
+    except (ChildProcessError, ValueError, OSError) as exc:
+        errorqueue.put(exc)
+        sys.exit(1)
+    statsqueue.put(timer.totals)
+    resultqueue.put((start, gifdelays, ends))
+    sys.exit(0)
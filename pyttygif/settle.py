@@ -0,0 +1,149 @@
+#      This file is part of pyttygif.
+#
+#      pyttygif is free software: you can redistribute it and/or modify
+#      it under the terms of the GNU General Public License as published by
+#      the Free Software Foundation, either version 3 of the License, or
+#      (at your option) any later version.
+#
+#      pyttygif is distributed in the hope that it will be useful,
+#      but WITHOUT ANY WARRANTY; without even the implied warranty of
+#      MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#      GNU General Public License for more details.
+#
+#      You should have received a copy of the GNU General Public License
+#      along with pyttygif.  If not, see <https://www.gnu.org/licenses/>.
+
+import asyncio
+import time
+
+# Payloads up to this size are drawn by terminal almost instantly.
+TINY_PAYLOAD = 64
+# Payload of this size (roughly a screenful) gets the full settle delay.
+FULL_PAYLOAD = 4096
+# Interval between captures, while waiting for the screen to stop changing,
+# as a fraction of the full settle delay.
+QUIESCE_STEP = 0.25
+# Give up waiting for the screen to stop changing after this many full
+# settle delays.
+QUIESCE_LIMIT = 4
+
+
+class Settler(object):
+    """
+    Waits for the terminal emulator to draw the frame before capturing it.
+    """
+    def __init__(self, fps, mode='fixed', timer=None):
+        """
+        Create a new settler.
+
+        :param fps: Number of frames to capture per second (full delay is
+                    one frame long).
+        :param mode: 'fixed' to always wait the full delay, 'adaptive' to
+                     scale it by size of terminal output, 'quiesce' to also
+                     recapture until the screen stops changing (unless the
+                     output is tiny).
+        :param timer: StageTimer to account waits and captures to.
+        """
+        if mode not in ('fixed', 'adaptive', 'quiesce'):
+            raise ValueError("Unknown settle mode: {0}".format(mode))
+        self.full = 1.0 / fps
+        self.mode = mode
+        # Time actually spent waiting (and recapturing to see, that screen
+        # has settled).
+        self.waited = 0.0
+        self.budget = 0.0  # Time that would be spent with fixed delay
+        self.timer = timer
+
+    def delay(self, nbytes):
+        """
+        Compute how long to wait for the output to be drawn.
+
+        :param nbytes: Number of bytes written to terminal since last capture.
+        :return: Float delay in seconds.
+        """
+        if self.mode == 'fixed':
+            return self.full
+        if nbytes <= TINY_PAYLOAD:
+            return 0.0
+        return self.full * min(1.0, nbytes / FULL_PAYLOAD)
+
+    def cost(self, nbytes, capture_cost):
+        """
+        Estimate how long it takes to settle and capture a frame, without
+        waiting for anything (quiesce mode is assumed to settle at once).
+
+        :param nbytes: Number of bytes written to terminal since last capture.
+        :param capture_cost: Time to capture the terminal once.
+        :return: Float seconds.
+        """
+        cost = self.delay(nbytes) + capture_cost
+        if self.mode == 'quiesce' and nbytes > TINY_PAYLOAD:
+            # The second capture confirms, that the screen has settled.
+            cost += self.full * QUIESCE_STEP + capture_cost
+        return cost
+
+    async def capture(self, nbytes, capturefn):
+        """
+        Wait for the terminal and capture it. Other tasks of the event loop
+        run while we wait.
+
+        :param nbytes: Number of bytes written to terminal since last capture.
+        :param capturefn: Coroutine function, that returns the captured image.
+        :return: Captured image.
+        """
+        self.budget += self.full
+        await self._sleep(self.delay(nbytes))
+        image = await self._capture(capturefn)
+        if self.mode != 'quiesce' or nbytes <= TINY_PAYLOAD:
+            return image
+        # Screen is considered drawn when two consecutive captures match.
+        # Tiny output is drawn at once, so it isn't confirmed.
+        step = self.full * QUIESCE_STEP
+        waited = 0.0
+        while waited < self.full * QUIESCE_LIMIT:
+            await self._sleep(step)
+            waited += step
+            start = time.perf_counter()
+            again = await self._capture(capturefn)
+            # Fixed delay doesn't recapture, so this time isn't saved.
+            self.waited += time.perf_counter() - start
+            if again == image:
+                break
+            image = again
+        return image
+
+    async def _sleep(self, delay):
+        """
+        Wait for the terminal.
+
+        :param delay: Float delay in seconds.
+        :return: None.
+        """
+        if not delay:
+            return
+        start = time.perf_counter()
+        await asyncio.sleep(delay)
+        self.waited += delay
+        if self.timer is not None:
+            self.timer.add('settle', time.perf_counter() - start)
+
+    async def _capture(self, capturefn):
+        """
+        Capture the terminal.
+
+        :param capturefn: Coroutine function, that returns the captured image.
+        :return: Captured image.
+        """
+        if self.timer is None:
+            return await capturefn()
+        with self.timer.measure('capture'):
+            return await capturefn()
+
+    @property
+    def saved(self):
+        """
+        Time saved compared to the fixed delay (negative if lost).
+
+        :return: Float seconds.
+        """
+        return self.budget - self.waited
@@ -0,0 +1,137 @@
+#      This file is part of pyttygif.
+#
+#      pyttygif is free software: you can redistribute it and/or modify
+#      it under the terms of the GNU General Public License as published by
+#      the Free Software Foundation, either version 3 of the License, or
+#      (at your option) any later version.
+#
+#      pyttygif is distributed in the hope that it will be useful,
+#      but WITHOUT ANY WARRANTY; without even the implied warranty of
+#      MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#      GNU General Public License for more details.
+#
+#      You should have received a copy of the GNU General Public License
+#      along with pyttygif.  If not, see <https://www.gnu.org/licenses/>.
+
+import multiprocessing
+import os
+import queue
+
+try:
+    from multiprocessing import shared_memory
+except ImportError:  # Python < 3.8
+    shared_memory = None
+
+from pyttygif import image, xwd
+
+# How long to wait for a slot to be freed before queuing frame as is.
+FREE_SLOT_TIMEOUT = 0.01
+
+
+class SlotHandle(object):
+    """
+    Reference to a frame stored in the shared memory ring.
+    """
+    def __init__(self, slot, length, meta=None):
+        """
+        Create a new slot handle.
+
+        :param slot: Index of the slot.
+        :param length: Length of the frame data in bytes.
+        :param meta: Tuple of IndexedImage attributes, except for pixels,
+                     or PixmapFormat of Pixmap (None - frame is raw bytes).
+        """
+        self.slot = slot
+        self.length = length
+        self.meta = meta
+
+
+class FrameRing(object):
+    """
+    Ring of preallocated shared memory slots to pass frames to workers
+    without pickling them.
+    """
+    def __init__(self, slots, slotsize):
+        """
+        Allocate the shared memory for the ring.
+
+        :param slots: Number of slots.
+        :param slotsize: Size of a single slot in bytes.
+        """
+        if shared_memory is None:
+            raise ValueError("Shared memory needs Python 3.8 or newer")
+        self.slotsize = slotsize
+        self.shm = shared_memory.SharedMemory(create=True,
+                                              size=slots * slotsize)
+        self.free = multiprocessing.Queue()  # Indices of unused slots
+        for slot in range(slots):
+            self.free.put(slot)
+        self.owner = os.getpid()
+
+    def put(self, frame):
+        """
+        Store the frame in a free slot.
+
+        :param frame: Raw image bytes, Pixmap or IndexedImage.
+        :return: SlotHandle or the frame itself, if it doesn't fit into a
+                 slot or all slots are busy.
+        """
+        meta = None
+        data = frame
+        if isinstance(frame, image.IndexedImage):
+            meta = (frame.width, frame.height, frame.palette, frame.left,
+                    frame.top, frame.screen)
+            data = frame.pixels
+        elif isinstance(frame, xwd.Pixmap):
+            meta = frame.layout
+            data = frame.pixels
+        if len(data) > self.slotsize:
+            return frame
+        try:
+            slot = self.free.get(True, FREE_SLOT_TIMEOUT)
+        except queue.Empty:
+            return frame
+        start = slot * self.slotsize
+        self.shm.buf[start:start + len(data)] = data
+        return SlotHandle(slot, len(data), meta)
+
+    def get(self, handle):
+        """
+        Get the frame, referenced by the handle, without copying it.
+
+        :param handle: SlotHandle or frame passed as is.
+        :return: Raw image bytes (memoryview), Pixmap or IndexedImage.
+        """
+        if not isinstance(handle, SlotHandle):
+            return handle
+        start = handle.slot * self.slotsize
+        data = self.shm.buf[start:start + handle.length]
+        if handle.meta is None:
+            return data
+        if isinstance(handle.meta, xwd.PixmapFormat):
+            return xwd.Pixmap(handle.meta, data)
+        width, height, palette, left, top, screen = handle.meta
+        return image.IndexedImage(width, height, data, palette, left, top,
+                                  screen)
+
+    def release(self, handle):
+        """
+        Return the slot, referenced by the handle, to the ring.
+
+        :param handle: SlotHandle or frame passed as is.
+        :return: None.
+        """
+        if isinstance(handle, SlotHandle):
+            self.free.put(handle.slot)
+
+    def close(self):
+        """
+        Free the shared memory (only done by process that allocated it).
+
+        :return: None.
+        """
+        if os.getpid() != self.owner or self.shm is None:
+            return
+        self.shm.close()
+        self.shm.unlink()
+        self.shm = None
@@ -0,0 +1,119 @@
+#      This file is part of pyttygif.
+#
+#      pyttygif is free software: you can redistribute it and/or modify
+#      it under the terms of the GNU General Public License as published by
+#      the Free Software Foundation, either version 3 of the License, or
+#      (at your option) any later version.
+#
+#      pyttygif is distributed in the hope that it will be useful,
+#      but WITHOUT ANY WARRANTY; without even the implied warranty of
+#      MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#      GNU General Public License for more details.
+#
+#      You should have received a copy of the GNU General Public License
+#      along with pyttygif.  If not, see <https://www.gnu.org/licenses/>.
+
+import multiprocessing
+import os
+import pickle
+import shutil
+import tempfile
+
+from pyttygif import image, xwd
+
+
+def frame_size(frame):
+    """
+    Get the size of frame data.
+
+    :param frame: Raw image bytes, Pixmap or IndexedImage.
+    :return: Size in bytes.
+    """
+    if isinstance(frame, (image.IndexedImage, xwd.Pixmap)):
+        return len(frame.pixels)
+    return len(frame)
+
+
+class SpilledFrame(object):
+    """
+    Reference to a frame, that was written to the disk instead of being
+    kept in memory.
+    """
+    def __init__(self, path):
+        """
+        Create a new reference.
+
+        :param path: Path to the file with pickled frame.
+        """
+        self.path = path
+
+
+class MemoryBudget(object):
+    """
+    Limit of memory, taken by frames in flight between processes (queued
+    and waiting to be reordered). Frames, that don't fit, are spilled to a
+    temporary directory and are read back when their turn comes.
+    """
+    def __init__(self, limit):
+        """
+        Create a new budget.
+
+        :param limit: Number of bytes, that frames could take.
+        """
+        self.limit = limit
+        self.used = multiprocessing.Value('q', 0)  # Bytes taken by frames
+        self.directory = tempfile.mkdtemp(prefix='pyttygif-spill-')
+        self.owner = os.getpid()
+
+    def store(self, frame):
+        """
+        Take the memory for the frame or spill it to the disk.
+
+        :param frame: Raw image bytes or IndexedImage.
+        :return: Frame itself or SpilledFrame.
+        """
+        size = frame_size(frame)
+        with self.used.get_lock():
+            if self.used.value + size <= self.limit:
+                self.used.value += size
+                return frame
+        fd, path = tempfile.mkstemp(dir=self.directory)
+        with os.fdopen(fd, 'wb') as f:
+            pickle.dump(frame, f, pickle.HIGHEST_PROTOCOL)
+        return SpilledFrame(path)
+
+    def load(self, frame):
+        """
+        Get the frame, reading it back from the disk if it was spilled.
+
+        :param frame: Frame or SpilledFrame, returned by store.
+        :return: Raw image bytes or IndexedImage.
+        """
+        if not isinstance(frame, SpilledFrame):
+            return frame
+        with open(frame.path, 'rb') as f:
+            data = pickle.load(f)
+        os.unlink(frame.path)
+        return data
+
+    def release(self, frame):
+        """
+        Give back the memory of the frame, that is no longer needed.
+
+        :param frame: Frame or SpilledFrame, returned by store.
+        :return: None.
+        """
+        if isinstance(frame, SpilledFrame):
+            return
+        size = frame_size(frame)
+        with self.used.get_lock():
+            self.used.value -= size
+
+    def close(self):
+        """
+        Remove the spilled frames.
+
+        :return: None.
+        """
+        if os.getpid() == self.owner:
+            shutil.rmtree(self.directory, ignore_errors=True)
@@ -0,0 +1,866 @@
+#      This file is part of pyttygif.
+#
+#      pyttygif is free software: you can redistribute it and/or modify
+#      it under the terms of the GNU General Public License as published by
+#      the Free Software Foundation, either version 3 of the License, or
+#      (at your option) any later version.
+#
+#      pyttygif is distributed in the hope that it will be useful,
+#      but WITHOUT ANY WARRANTY; without even the implied warranty of
+#      MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#      GNU General Public License for more details.
+#
+#      You should have received a copy of the GNU General Public License
+#      along with pyttygif.  If not, see <https://www.gnu.org/licenses/>.
+
+import codecs
+import functools
+import re
+import unicodedata
+
+# Indices of default colors in the xterm palette.
+DEFAULT_FG = 7
+DEFAULT_BG = 0
+
+# Cell attribute flags.
+BOLD = 1
+DIM = 2
+ITALIC = 4
+UNDERLINE = 8
+BLINK = 16
+REVERSE = 32
+HIDDEN = 64
+STRIKE = 128
+
+# DEC Special Graphics character set (used for line drawing).
+DEC_GRAPHICS = str.maketrans(
+    '`abcdefghijklmnopqrstuvwxyz{|}~',
+    '◆▒␉␌␍␊°±␤␋┘'
+    '┐┌└┼⎺⎻─⎼⎽├┤'
+    '┴┬│≤≥π≠£·'
+)
+
+# Escape sequences and runs of printable text.
+TOKEN = re.compile(
+    r'(?P<text>[^\x00-\x1f\x7f-\x9f]+)'
+    r'|\x1b\[(?P<cprivate>[<=>?]?)(?P<cparams>[0-9;:]*)(?P<cinter>[ -/]*)'
+    r'(?P<cfinal>[@-~])'
+    r'|\x1b\](?P<osc>[^\x07\x1b]*)(?:\x07|\x1b\\)'
+    r'|\x1b[P^_X][^\x1b]*\x1b\\'
+    r'|\x1b(?P<einter>[ -/]*)(?P<efinal>[0-~])'
+    r'|(?P<ctrl>[\x00-\x1a\x1c-\x1f\x7f-\x9f])'
+)
+
+# Escape sequences, cut short by the end of payload.
+INCOMPLETE = re.compile(
+    r'\x1b(?:\[[<=>?]?[0-9;:]*[ -/]*|\][^\x07\x1b]*\x1b?'
+    r'|[P^_X][^\x1b]*\x1b?|[ -/]*)\Z'
+)
+
+# Don't buffer unterminated escape sequences beyond this length.
+MAX_PENDING = 4096
+
+# Unicode categories of characters, that don't take a cell of their own.
+ZERO_WIDTH_CATEGORIES = ('Mn', 'Me', 'Cf')
+# East Asian widths of characters, that take two cells.
+WIDE_WIDTHS = ('W', 'F')
+
+# Levels of the xterm 6x6x6 color cube.
+CUBE_LEVELS = (0, 95, 135, 175, 215, 255)
+
+
+def rgb_to_xterm(r, g, b):
+    """
+    Find the closest color of the xterm 256-color palette.
+
+    :param r: Red component (0-255).
+    :param g: Green component (0-255).
+    :param b: Blue component (0-255).
+    :return: Integer palette index (16-255).
+    """
+    def level(v):
+        return 0 if v < 48 else (1 if v < 115 else (v - 35) // 40)
+
+    cube = tuple(level(v) for v in (r, g, b))
+    cubergb = tuple(CUBE_LEVELS[v] for v in cube)
+    gray = min(23, max(0, ((r + g + b) // 3 - 3) // 10))
+    grayrgb = (8 + gray * 10,) * 3
+
+    def dist(c):
+        return (c[0] - r) ** 2 + (c[1] - g) ** 2 + (c[2] - b) ** 2
+
+    if dist(grayrgb) < dist(cubergb):
+        return 232 + gray
+    return 16 + cube[0] * 36 + cube[1] * 6 + cube[2]
+
+
+@functools.lru_cache(maxsize=4096)
+def char_width(char):
+    """
+    Get the number of cells, that the character takes (as in wcwidth).
+
+    :param char: Printable character.
+    :return: 0 for combining characters, 2 for wide ones, 1 otherwise.
+    """
+    if unicodedata.combining(char) or \
+            unicodedata.category(char) in ZERO_WIDTH_CATEGORIES:
+        return 0
+    if unicodedata.east_asian_width(char) in WIDE_WIDTHS:
+        return 2
+    return 1
+
+
+class Screen(object):
+    """
+    An in-memory model of VT100/xterm screen.
+    """
+    def __init__(self, columns=80, rows=24, encoding='utf-8'):
+        """
+        Create a new screen.
+
+        :param columns: Width of the screen in character cells.
+        :param rows: Height of the screen in character cells.
+        :param encoding: Encoding of the data to be fed to the screen.
+        """
+        if columns < 1 or rows < 1:
+            raise ValueError("Screen should be at least 1x1 cells")
+        self.columns = columns
+        self.rows = rows
+        self.decoder = codecs.getincrementaldecoder(encoding)(errors='replace')
+        self.pending = ''  # Incomplete escape sequence from previous feed
+        self.reset()
+
+    def reset(self):
+        """
+        Reset the screen to the initial state (RIS).
+
+        :return: None.
+        """
+        self.fg = DEFAULT_FG
+        self.bg = DEFAULT_BG
+        self.flags = 0
+        self.cursor_x = 0
+        self.cursor_y = 0
+        self.cursor_visible = True
+        self.wrap_pending = False  # Cursor is past the last column
+        self.autowrap = True
+        self.insert = False
+        self.origin = False
+        self.newline = False  # LNM mode (LF also does CR)
+        self.scroll_top = 0
+        self.scroll_bottom = self.rows - 1
+        self.charsets = ['B', 'B']  # G0 and G1 character sets
+        self.charset = 0  # Active character set
+        self.saved = None  # Saved cursor (DECSC)
+        self.last_char = ' '  # Last printed character (for REP)
+        self.tabstops = set(range(0, self.columns, 8))
+        self.lines = [self._blank_line() for _ in range(self.rows)]
+        self.main_lines = None  # Saved main screen, while alternate is used
+
+    def _blank(self):
+        """
+        Make a blank cell with the current background.
+
+        :return: Cell tuple.
+        """
+        return (' ', DEFAULT_FG, self.bg, 0)
+
+    def _blank_line(self):
+        """
+        Make a line of blank cells.
+
+        :return: List of cells.
+        """
+        return [self._blank()] * self.columns
+
+    def _split_wide(self, line, start, end):
+        """
+        Blank the halves of wide characters, that are cut by the change of
+        the cells from start to end, so that no half is left without its
+        partner (as xterm does).
+
+        :param line: List of cells.
+        :param start: First column to be changed.
+        :param end: Column after the last one to be changed.
+        :return: None.
+        """
+        if 0 < start < self.columns and not line[start][0]:
+            line[start - 1] = (' ',) + line[start - 1][1:]
+            line[start] = (' ',) + line[start][1:]
+        if 0 < end < self.columns and not line[end][0]:
+            line[end - 1] = (' ',) + line[end - 1][1:]
+            line[end] = (' ',) + line[end][1:]
+
+    def _insert(self, line, x, cells):
+        """
+        Insert cells into the line, shifting the rest of it to the right.
+
+        :param line: List of cells.
+        :param x: Column to insert at.
+        :param cells: List of cells to be inserted.
+        :return: None.
+        """
+        cut = self.columns - len(cells)  # Cells from here are shifted out
+        self._split_wide(line, x, x)
+        self._split_wide(line, cut, cut)
+        line[x:x] = cells
+        del line[self.columns:]
+
+    def feed(self, data):
+        """
+        Interpret a chunk of terminal output.
+
+        :param data: Bytes to interpret.
+        :return: None.
+        """
+        text = self.pending + self.decoder.decode(bytes(data))
+        self.pending = ''
+        pos = 0
+        end = len(text)
+        while pos < end:
+            m = TOKEN.match(text, pos)
+            if m is None:
+                # Lone ESC: either a sequence split between payloads or junk.
+                if end - pos < MAX_PENDING and INCOMPLETE.match(text, pos):
+                    self.pending = text[pos:]
+                    return
+                pos += 1
+                continue
+            pos = m.end()
+            kind = m.lastgroup
+            if kind == 'text':
+                self._write(m.group('text'))
+            elif kind == 'cfinal':
+                self._csi(m.group('cprivate'), m.group('cparams'),
+                          m.group('cinter'), m.group('cfinal'))
+            elif kind == 'efinal':
+                self._esc(m.group('einter'), m.group('efinal'))
+            elif kind == 'ctrl':
+                self._control(m.group('ctrl'))
+
+    def digest(self):
+        """
+        Hash what the screen shows, so that identical screens could be found
+        without drawing them.
+
+        :return: Integer hash.
+        """
+        cursor = None
+        if self.cursor_visible:
+            cursor = (self.cursor_x, self.cursor_y)
+        return hash((tuple(map(tuple, self.lines)), cursor))
+
+    def _write(self, text):
+        """
+        Print text at cursor position.
+
+        :param text: String of printable characters.
+        :return: None.
+        """
+        if self.charsets[self.charset] == '0':
+            text = text.translate(DEC_GRAPHICS)
+        attrs = (self.fg, self.bg, self.flags)
+        if text.isascii():
+            self._write_narrow(text, attrs)
+            self.last_char = text[-1]
+            return
+        start = 0  # Start of the current run of narrow characters
+        for i, char in enumerate(text):
+            width = char_width(char)
+            if width == 1:
+                continue
+            if start < i:
+                self._write_narrow(text[start:i], attrs)
+                self.last_char = text[i - 1]
+            start = i + 1
+            if width:
+                self._write_wide(char, attrs)
+                self.last_char = char
+            else:
+                self._combine(char)
+        if start < len(text):
+            self._write_narrow(text[start:], attrs)
+            self.last_char = text[-1]
+
+    def _wrap(self):
+        """
+        Move the cursor to the next line, if it's past the last column.
+
+        :return: None.
+        """
+        if self.wrap_pending:
+            self.wrap_pending = False
+            if self.autowrap:
+                self.cursor_x = 0
+                self._linefeed()
+
+    def _write_narrow(self, text, attrs):
+        """
+        Print characters, that take a single cell each.
+
+        :param text: String of printable characters.
+        :param attrs: Tuple of colors and flags of the cells.
+        :return: None.
+        """
+        i = 0
+        while i < len(text):
+            self._wrap()
+            line = self.lines[self.cursor_y]
+            x = self.cursor_x
+            chunk = text[i:i + self.columns - x]
+            if not self.autowrap and i + len(chunk) < len(text):
+                # Without autowrap, excess characters overwrite last column.
+                chunk = chunk[:-1] + text[-1]
+            cells = [(c,) + attrs for c in chunk]
+            if self.insert:
+                self._insert(line, x, cells)
+            else:
+                self._split_wide(line, x, x + len(cells))
+                line[x:x + len(cells)] = cells
+            i += len(chunk) if self.autowrap else len(text)
+            x += len(chunk)
+            if x >= self.columns:
+                x = self.columns - 1
+                self.wrap_pending = True
+            self.cursor_x = x
+
+    def _write_wide(self, char, attrs):
+        """
+        Print a character, that takes two cells. The second cell is left
+        empty (with no character), so that the line keeps its width.
+
+        :param char: Wide character.
+        :param attrs: Tuple of colors and flags of the cells.
+        :return: None.
+        """
+        if self.columns < 2:
+            self._write_narrow(char, attrs)
+            return
+        self._wrap()
+        x = self.cursor_x
+        if x + 2 > self.columns:
+            # Character doesn't fit into the last column, so it goes to the
+            # next line (or overwrites the last two columns).
+            if self.autowrap:
+                self.cursor_x = 0
+                self._linefeed()
+            x = 0 if self.autowrap else self.columns - 2
+        line = self.lines[self.cursor_y]
+        cells = [(char,) + attrs, ('',) + attrs]
+        if self.insert:
+            self._insert(line, x, cells)
+        else:
+            self._split_wide(line, x, x + 2)
+            line[x:x + 2] = cells
+        x += 2
+        if x >= self.columns:
+            x = self.columns - 1
+            self.wrap_pending = True
+        self.cursor_x = x
+
+    def _combine(self, char):
+        """
+        Attach a zero-width character (e.g. combining accent) to the
+        previously printed one.
+
+        :param char: Zero-width character.
+        :return: None.
+        """
+        x = self.cursor_x if self.wrap_pending else self.cursor_x - 1
+        line = self.lines[self.cursor_y]
+        if x > 0 and not line[x][0]:
+            x -= 1  # Second half of a wide character
+        if x < 0:
+            return
+        cell = line[x]
+        line[x] = (cell[0] + char,) + cell[1:]
+
+    def _control(self, char):
+        """
+        Execute a C0 control character.
+
+        :param char: Control character.
+        :return: None.
+        """
+        if char == '\r':
+            self.cursor_x = 0
+            self.wrap_pending = False
+        elif char in '\n\x0b\x0c':
+            if self.newline:
+                self.cursor_x = 0
+            self._linefeed()
+        elif char == '\b':
+            self.cursor_x = max(0, self.cursor_x - 1)
+            self.wrap_pending = False
+        elif char == '\t':
+            self._tab(1)
+        elif char == '\x0e':
+            self.charset = 1
+        elif char == '\x0f':
+            self.charset = 0
+
+    def _tab(self, count):
+        """
+        Move cursor to the next tab stop.
+
+        :param count: Number of tab stops to advance.
+        :return: None.
+        """
+        x = self.cursor_x
+        for _ in range(min(count, self.columns)):
+            x += 1
+            while x < self.columns - 1 and x not in self.tabstops:
+                x += 1
+        self.cursor_x = min(x, self.columns - 1)
+        self.wrap_pending = False
+
+    def _backtab(self, count):
+        """
+        Move cursor to the previous tab stop.
+
+        :param count: Number of tab stops to go back.
+        :return: None.
+        """
+        x = self.cursor_x
+        for _ in range(min(count, self.columns)):
+            x -= 1
+            while x > 0 and x not in self.tabstops:
+                x -= 1
+        self.cursor_x = max(x, 0)
+        self.wrap_pending = False
+
+    def _linefeed(self):
+        """
+        Move cursor one line down, scrolling if it's at the bottom margin.
+
+        :return: None.
+        """
+        self.wrap_pending = False
+        if self.cursor_y == self.scroll_bottom:
+            self.scroll_up(1)
+        elif self.cursor_y < self.rows - 1:
+            self.cursor_y += 1
+
+    def _reverse_index(self):
+        """
+        Move cursor one line up, scrolling if it's at the top margin.
+
+        :return: None.
+        """
+        self.wrap_pending = False
+        if self.cursor_y == self.scroll_top:
+            self.scroll_down(1)
+        elif self.cursor_y > 0:
+            self.cursor_y -= 1
+
+    def scroll_up(self, count, top=None):
+        """
+        Scroll the lines of scrolling region up.
+
+        :param count: Number of lines to scroll.
+        :param top: First line to scroll (None - top margin).
+        :return: None.
+        """
+        top = self.scroll_top if top is None else top
+        bottom = self.scroll_bottom
+        count = min(count, bottom - top + 1)
+        del self.lines[top:top + count]
+        self.lines[bottom - count + 1:bottom - count + 1] = [
+            self._blank_line() for _ in range(count)]
+
+    def scroll_down(self, count, top=None):
+        """
+        Scroll the lines of scrolling region down.
+
+        :param count: Number of lines to scroll.
+        :param top: First line to scroll (None - top margin).
+        :return: None.
+        """
+        top = self.scroll_top if top is None else top
+        bottom = self.scroll_bottom
+        count = min(count, bottom - top + 1)
+        del self.lines[bottom - count + 1:bottom + 1]
+        self.lines[top:top] = [self._blank_line() for _ in range(count)]
+
+    def _erase(self, y, start, end):
+        """
+        Erase a part of the line.
+
+        :param y: Line number.
+        :param start: First column to erase.
+        :param end: Column after the last one to erase.
+        :return: None.
+        """
+        start = max(0, start)
+        end = min(self.columns, end)
+        if start < end:
+            self._split_wide(self.lines[y], start, end)
+            self.lines[y][start:end] = [self._blank()] * (end - start)
+
+    def _move(self, x, y):
+        """
+        Move cursor to the position, clamped to the screen (or margins).
+
+        :param x: Column.
+        :param y: Line.
+        :return: None.
+        """
+        top, bottom = 0, self.rows - 1
+        if self.origin:
+            top, bottom = self.scroll_top, self.scroll_bottom
+        self.cursor_x = min(max(x, 0), self.columns - 1)
+        self.cursor_y = min(max(y, top), bottom)
+        self.wrap_pending = False
+
+    def save_cursor(self):
+        """
+        Save cursor position and attributes (DECSC).
+
+        :return: None.
+        """
+        self.saved = (self.cursor_x, self.cursor_y, self.fg, self.bg,
+                      self.flags, list(self.charsets), self.charset,
+                      self.origin, self.wrap_pending)
+
+    def restore_cursor(self):
+        """
+        Restore cursor position and attributes (DECRC).
+
+        :return: None.
+        """
+        if self.saved is None:
+            self.fg, self.bg, self.flags = DEFAULT_FG, DEFAULT_BG, 0
+            self.origin = False
+            self._move(0, 0)
+            return
+        (self.cursor_x, self.cursor_y, self.fg, self.bg, self.flags,
+         charsets, self.charset, self.origin, self.wrap_pending) = self.saved
+        self.charsets = list(charsets)
+        self.cursor_x = min(self.cursor_x, self.columns - 1)
+        self.cursor_y = min(self.cursor_y, self.rows - 1)
+
+    def _alternate(self, enable, clear=False):
+        """
+        Switch between main and alternate screen buffers.
+
+        :param enable: Switch to alternate buffer if True, else to main one.
+        :param clear: Clear alternate buffer when switching to it.
+        :return: None.
+        """
+        if enable and self.main_lines is None:
+            self.main_lines = self.lines
+            self.lines = [self._blank_line() for _ in range(self.rows)]
+        elif enable and clear:
+            self.lines = [self._blank_line() for _ in range(self.rows)]
+        elif not enable and self.main_lines is not None:
+            self.lines = self.main_lines
+            self.main_lines = None
+
+    def _esc(self, inter, final):
+        """
+        Execute an escape sequence.
+
+        :param inter: Intermediate characters.
+        :param final: Final character.
+        :return: None.
+        """
+        if inter in ('(', ')'):
+            self.charsets['()'.index(inter)] = final
+        elif inter == '#':
+            if final == '8':  # DECALN: fill screen with E's
+                self.lines = [[('E', DEFAULT_FG, DEFAULT_BG, 0)] *
+                              self.columns for _ in range(self.rows)]
+        elif inter:
+            return
+        elif final == 'D':
+            self._linefeed()
+        elif final == 'E':
+            self.cursor_x = 0
+            self._linefeed()
+        elif final == 'M':
+            self._reverse_index()
+        elif final == '7':
+            self.save_cursor()
+        elif final == '8':
+            self.restore_cursor()
+        elif final == 'H':
+            self.tabstops.add(self.cursor_x)
+        elif final == 'c':
+            self.reset()
+
+    def _csi(self, private, params, inter, final):
+        """
+        Execute a control sequence.
+
+        :param private: Private parameter prefix.
+        :param params: Parameter string.
+        :param inter: Intermediate characters.
+        :param final: Final character.
+        :return: None.
+        """
+        if inter:
+            return  # DECSCUSR, DECSTR and friends don't affect the image
+        if final == 'm':
+            if not private:
+                self._sgr(params)
+            return
+        args = [int(p.split(':')[0] or 0) for p in params.split(';')]
+        if private == '?':
+            if final in 'hl':
+                for mode in args:
+                    self._dec_mode(mode, final == 'h')
+            return
+        elif private:
+            return
+        n = max(1, args[0])
+        x, y = self.cursor_x, self.cursor_y
+        if final == 'A':
+            top = self.scroll_top if y >= self.scroll_top else 0
+            self.cursor_y = max(top, y - n)
+            self.wrap_pending = False
+        elif final in 'Be':
+            bottom = self.scroll_bottom if y <= self.scroll_bottom \
+                else self.rows - 1
+            self.cursor_y = min(bottom, y + n)
+            self.wrap_pending = False
+        elif final in 'Ca':
+            self._move(x + n, y)
+        elif final == 'D':
+            self._move(x - n, y)
+        elif final == 'E':
+            self._csi('', params, '', 'B')
+            self.cursor_x = 0
+        elif final == 'F':
+            self._csi('', params, '', 'A')
+            self.cursor_x = 0
+        elif final in 'G`':
+            self._move(n - 1, y)
+        elif final == 'd':
+            top = self.scroll_top if self.origin else 0
+            self._move(x, top + n - 1)
+        elif final in 'Hf':
+            row = n
+            col = max(1, args[1]) if len(args) > 1 else 1
+            top = self.scroll_top if self.origin else 0
+            self._move(col - 1, top + row - 1)
+        elif final == 'I':
+            self._tab(n)
+        elif final == 'Z':
+            self._backtab(n)
+        elif final == 'J':
+            self._erase_display(args[0])
+        elif final == 'K':
+            if args[0] == 0:
+                self._erase(y, x, self.columns)
+            elif args[0] == 1:
+                self._erase(y, 0, x + 1)
+            elif args[0] == 2:
+                self._erase(y, 0, self.columns)
+        elif final in 'LM':
+            if self.scroll_top <= y <= self.scroll_bottom:
+                if final == 'L':
+                    self.scroll_down(n, y)
+                else:
+                    self.scroll_up(n, y)
+                self.cursor_x = 0
+                self.wrap_pending = False
+        elif final == '@':
+            line = self.lines[y]
+            n = min(n, self.columns - x)
+            self._insert(line, x, [self._blank()] * n)
+            self.wrap_pending = False
+        elif final == 'P':
+            line = self.lines[y]
+            n = min(n, self.columns - x)
+            self._split_wide(line, x, x + n)
+            del line[x:x + n]
+            line.extend([self._blank()] * n)
+            self.wrap_pending = False
+        elif final == 'X':
+            self._erase(y, x, x + n)
+        elif final == 'S':
+            self.scroll_up(n)
+        elif final == 'T':
+            if len(args) <= 1:
+                self.scroll_down(n)
+        elif final == 'b':
+            self._write(self.last_char * min(n, self.columns * self.rows))
+        elif final == 'g':
+            if args[0] == 0:
+                self.tabstops.discard(x)
+            elif args[0] == 3:
+                self.tabstops.clear()
+        elif final in 'hl':
+            for mode in args:
+                if mode == 4:
+                    self.insert = final == 'h'
+                elif mode == 20:
+                    self.newline = final == 'h'
+        elif final == 'r':
+            top = max(1, args[0])
+            bottom = args[1] if len(args) > 1 and args[1] else self.rows
+            bottom = min(bottom, self.rows)
+            if top < bottom:
+                self.scroll_top = top - 1
+                self.scroll_bottom = bottom - 1
+                self._move(0, self.scroll_top if self.origin else 0)
+        elif final == 's':
+            self.save_cursor()
+        elif final == 'u':
+            self.restore_cursor()
+
+    def _erase_display(self, mode):
+        """
+        Erase a part of the screen (ED).
+
+        :param mode: 0 - below cursor, 1 - above cursor, 2 and 3 - all.
+        :return: None.
+        """
+        x, y = self.cursor_x, self.cursor_y
+        if mode == 0:
+            self._erase(y, x, self.columns)
+            lines = range(y + 1, self.rows)
+        elif mode == 1:
+            self._erase(y, 0, x + 1)
+            lines = range(0, y)
+        elif mode in (2, 3):
+            lines = range(0, self.rows)
+        else:
+            return
+        for i in lines:
+            self.lines[i] = self._blank_line()
+
+    def _dec_mode(self, mode, enable):
+        """
+        Set or reset DEC private mode.
+
+        :param mode: Mode number.
+        :param enable: True to set the mode, False to reset it.
+        :return: None.
+        """
+        if mode == 6:
+            self.origin = enable
+            self._move(0, self.scroll_top if enable else 0)
+        elif mode == 7:
+            self.autowrap = enable
+        elif mode == 25:
+            self.cursor_visible = enable
+        elif mode in (47, 1047):
+            if not enable and mode == 1047:
+                self.lines = [self._blank_line() for _ in range(self.rows)]
+            self._alternate(enable)
+        elif mode == 1048:
+            if enable:
+                self.save_cursor()
+            else:
+                self.restore_cursor()
+        elif mode == 1049:
+            if enable:
+                self.save_cursor()
+                self._alternate(True, clear=True)
+            else:
+                self._alternate(False)
+                self.restore_cursor()
+
+    def _sgr(self, params):
+        """
+        Set graphic rendition (colors and attributes).
+
+        :param params: SGR parameter string.
+        :return: None.
+        """
+        args = []
+        for p in params.split(';'):
+            sub = p.split(':')
+            args.append([int(v) if v else 0 for v in sub])
+        i = 0
+        while i < len(args):
+            arg = args[i]
+            code = arg[0]
+            i += 1
+            if code in (38, 48):
+                if len(arg) > 1:
+                    color = self._ext_color(arg[1:], True)
+                else:
+                    color, used = self._ext_color([a[0] for a in args[i:]])
+                    i += used
+                if color is not None:
+                    if code == 38:
+                        self.fg = color
+                    else:
+                        self.bg = color
+            elif code == 0:
+                self.fg, self.bg, self.flags = DEFAULT_FG, DEFAULT_BG, 0
+            elif code == 1:
+                self.flags |= BOLD
+            elif code == 2:
+                self.flags |= DIM
+            elif code == 3:
+                self.flags |= ITALIC
+            elif code == 4:
+                if len(arg) > 1 and arg[1] == 0:
+                    self.flags &= ~UNDERLINE
+                else:
+                    self.flags |= UNDERLINE
+            elif code in (5, 6):
+                self.flags |= BLINK
+            elif code == 7:
+                self.flags |= REVERSE
+            elif code == 8:
+                self.flags |= HIDDEN
+            elif code == 9:
+                self.flags |= STRIKE
+            elif code == 21:
+                self.flags |= UNDERLINE
+            elif code == 22:
+                self.flags &= ~(BOLD | DIM)
+            elif code == 23:
+                self.flags &= ~ITALIC
+            elif code == 24:
+                self.flags &= ~UNDERLINE
+            elif code == 25:
+                self.flags &= ~BLINK
+            elif code == 27:
+                self.flags &= ~REVERSE
+            elif code == 28:
+                self.flags &= ~HIDDEN
+            elif code == 29:
+                self.flags &= ~STRIKE
+            elif 30 <= code <= 37:
+                self.fg = code - 30
+            elif code == 39:
+                self.fg = DEFAULT_FG
+            elif 40 <= code <= 47:
+                self.bg = code - 40
+            elif code == 49:
+                self.bg = DEFAULT_BG
+            elif 90 <= code <= 97:
+                self.fg = code - 90 + 8
+            elif 100 <= code <= 107:
+                self.bg = code - 100 + 8
+
+    @staticmethod
+    def _ext_color(args, colon=False):
+        """
+        Parse extended (256-color or direct RGB) color of SGR 38/48.
+
+        :param args: Parameters following 38 or 48.
+        :param colon: Parameters are colon-separated (ITU T.416 form).
+        :return: Palette index (or None) if colon is True, else tuple of
+                 palette index (or None) and number of parameters used.
+        """
+        color, used = None, 0
+        if args and args[0] == 5 and len(args) > 1:
+            color, used = min(args[1], 255), 2
+        elif args and args[0] == 2:
+            rgb = args[1:4]
+            if colon and len(args) > 4:
+                rgb = args[2:5]  # Color space ID is present
+            if len(rgb) == 3:
+                color = rgb_to_xterm(*(min(v, 255) for v in rgb))
+            used = 4
+        elif args:
+            used = 1
+        if colon:
+            return color
+        return color, min(used, len(args))
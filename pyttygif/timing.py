@@ -0,0 +1,178 @@
+#      This file is part of pyttygif.
+#
+#      pyttygif is free software: you can redistribute it and/or modify
+#      it under the terms of the GNU General Public License as published by
+#      the Free Software Foundation, either version 3 of the License, or
+#      (at your option) any later version.
+#
+#      pyttygif is distributed in the hope that it will be useful,
+#      but WITHOUT ANY WARRANTY; without even the implied warranty of
+#      MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#      GNU General Public License for more details.
+#
+#      You should have received a copy of the GNU General Public License
+#      along with pyttygif.  If not, see <https://www.gnu.org/licenses/>.
+
+import datetime
+import json
+import time
+
+
+class StageTimer(object):
+    """
+    Accumulates time spent in each stage of the pipeline.
+    """
+    def __init__(self):
+        """
+        Create a new timer with no stages.
+        """
+        self.totals = {}  # Stage name to [count, seconds]
+
+    def add(self, stage, seconds, count=1):
+        """
+        Account time spent in the stage.
+
+        :param stage: Name of the stage.
+        :param seconds: Time spent.
+        :param count: Number of times the stage was run.
+        :return: None.
+        """
+        total = self.totals.setdefault(stage, [0, 0.0])
+        total[0] += count
+        total[1] += seconds
+
+    def measure(self, stage):
+        """
+        Measure the time spent in with block.
+
+        :param stage: Name of the stage.
+        :return: Context manager.
+        """
+        return _Measurement(self, stage)
+
+    def merge(self, totals):
+        """
+        Add totals collected by another timer (e.g. in a worker process).
+
+        :param totals: Dict of stage names to [count, seconds].
+        :return: None.
+        """
+        for stage, (count, seconds) in totals.items():
+            self.add(stage, seconds, count)
+
+    def report(self):
+        """
+        Format the stage timings for humans.
+
+        :return: List of lines.
+        """
+        return format_stages(self.as_dict())
+
+    def as_dict(self):
+        """
+        Get the stage timings in machine-readable form.
+
+        :return: Dict of stage names to dicts with count and seconds.
+        """
+        return {stage: {'count': count, 'seconds': seconds}
+                for stage, (count, seconds) in self.totals.items()}
+
+
+class _Measurement(object):
+    """
+    Context manager that accounts the time of its block to the stage.
+    """
+    def __init__(self, timer, stage):
+        self.timer = timer
+        self.stage = stage
+        self.start = None
+
+    def __enter__(self):
+        self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        self.timer.add(self.stage, time.perf_counter() - self.start)
+
+
+class Progress(object):
+    """
+    Live progress line with ETA.
+    """
+    def __init__(self, stream, total=None, interval=0.5):
+        """
+        Create a new progress line.
+
+        :param stream: File object to draw the line on.
+        :param total: Total number of ttyrec frames (None - unknown).
+        :param interval: Minimal time between redraws in seconds.
+        """
+        self.stream = stream
+        self.total = total
+        self.interval = interval
+        self.start = time.time()
+        self.drawn = 0.0
+
+    def update(self, frameno, gifframes, force=False):
+        """
+        Redraw the progress line, if it's time to.
+
+        :param frameno: Number of ttyrec frames played.
+        :param gifframes: Number of GIF frames captured.
+        :param force: Redraw regardless of interval.
+        :return: None.
+        """
+        now = time.time()
+        if not force and now - self.drawn < self.interval:
+            return
+        self.drawn = now
+        elapsed = now - self.start
+        line = "Frame {0}".format(frameno)
+        if self.total:
+            line = "Frame {0}/{1} ({2:.1f}%)".format(
+                frameno, self.total, 100.0 * frameno / self.total)
+        line += ", GIF frames: {0}, elapsed: {1}".format(
+            gifframes, str(datetime.timedelta(seconds=round(elapsed))))
+        if self.total and frameno:
+            eta = elapsed / frameno * (self.total - frameno)
+            line += ", ETA: {0}".format(
+                str(datetime.timedelta(seconds=round(eta))))
+        self.stream.write("\r\x1b[K" + line)
+        self.stream.flush()
+
+    def finish(self):
+        """
+        Move past the progress line.
+
+        :return: None.
+        """
+        self.stream.write("\n")
+        self.stream.flush()
+
+
+def format_stages(stages):
+    """
+    Format the stage timings for humans.
+
+    :param stages: Dict of stage names to dicts with count and seconds.
+    :return: List of lines.
+    """
+    lines = []
+    for stage, stat in sorted(stages.items()):
+        lines.append("{0}: {1} ({2} times)".format(
+            stage, str(datetime.timedelta(seconds=stat['seconds'])),
+            stat['count']))
+    return lines
+
+
+def write_stats(path, stats):
+    """
+    Save the stats as JSON.
+
+    :param path: Path of the file to write.
+    :param stats: Dict with stats.
+    :return: None.
+    """
+    with open(path, 'w') as f:
+        json.dump(stats, f, indent=2, sort_keys=True)
+        f.write('\n')
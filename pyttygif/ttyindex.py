@@ -0,0 +1,282 @@
+#      This file is part of pyttygif.
+#
+#      pyttygif is free software: you can redistribute it and/or modify
+#      it under the terms of the GNU General Public License as published by
+#      the Free Software Foundation, either version 3 of the License, or
+#      (at your option) any later version.
+#
+#      pyttygif is distributed in the hope that it will be useful,
+#      but WITHOUT ANY WARRANTY; without even the implied warranty of
+#      MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#      GNU General Public License for more details.
+#
+#      You should have received a copy of the GNU General Public License
+#      along with pyttygif.  If not, see <https://www.gnu.org/licenses/>.
+
+import array
+import mmap
+import os
+import struct
+import sys
+
+from pyttygif import ttyplay
+
+# Header of ttyrec frame: sec, usec and len fields.
+FRAME_HEADER = struct.Struct('<III')
+# Header of sidecar index: magic, ttyrec size, ttyrec mtime and frame count.
+INDEX_MAGIC = b'PYTTYIDX'
+INDEX_HEADER = struct.Struct('<8sQqQ')
+# Suffix of sidecar index file, appended to ttyrec path.
+INDEX_SUFFIX = '.idx'
+
+
+def _array(typecode, itemsize):
+    """
+    Create an empty array with items of exactly given size.
+
+    :param typecode: Preferred array typecode.
+    :param itemsize: Required item size in bytes.
+    :return: Empty array.
+    """
+    values = array.array(typecode)
+    if values.itemsize != itemsize:
+        values = array.array('L' if itemsize == 8 else 'I')
+    if values.itemsize != itemsize:
+        raise ValueError("No suitable array type for {0}-byte integers"
+                         .format(itemsize))
+    return values
+
+
+class FrameIndex(object):
+    """
+    Compact index of ttyrec frames: offset, length and timestamp of each one.
+    """
+    def __init__(self):
+        """
+        Create an empty frame index.
+        """
+        self.offsets = _array('Q', 8)  # Offsets of frame payloads
+        self.lengths = _array('I', 4)  # len fields of headers
+        self.seconds = _array('I', 4)  # sec fields of headers
+        self.useconds = _array('I', 4)  # usec fields of headers
+
+    def __len__(self):
+        return len(self.offsets)
+
+    def _arrays(self):
+        return self.offsets, self.lengths, self.seconds, self.useconds
+
+    @classmethod
+    def scan(cls, data):
+        """
+        Build the index by walking over the ttyrec headers.
+
+        :param data: Bytes-like ttyrec contents.
+        :return: FrameIndex.
+        """
+        index = cls()
+        offsets = index.offsets.append
+        lengths = index.lengths.append
+        seconds = index.seconds.append
+        useconds = index.useconds.append
+        unpack = FRAME_HEADER.unpack_from
+        size = len(data)
+        pos = 0
+        while pos < size:
+            if size - pos < FRAME_HEADER.size:
+                raise ValueError("Short read: Couldn't read a whole "
+                                 "ttyrec header!")
+            sec, usec, length = unpack(data, pos)
+            pos += FRAME_HEADER.size
+            if size - pos < length:
+                raise ValueError("Short read: Couldn't read a whole "
+                                 "ttyrec frame!")
+            offsets(pos)
+            lengths(length)
+            seconds(sec)
+            useconds(usec)
+            pos += length
+        return index
+
+    @classmethod
+    def load(cls, path, size, mtime):
+        """
+        Load the index from the sidecar file, if it matches the ttyrec.
+
+        :param path: Path to the index file.
+        :param size: Size of the ttyrec file in bytes.
+        :param mtime: Modification time of ttyrec file in nanoseconds.
+        :return: FrameIndex or None if index is missing or stale.
+        """
+        try:
+            with open(path, 'rb') as f:
+                header = f.read(INDEX_HEADER.size)
+                if len(header) < INDEX_HEADER.size:
+                    return None
+                magic, isize, imtime, count = INDEX_HEADER.unpack(header)
+                if magic != INDEX_MAGIC or (isize, imtime) != (size, mtime):
+                    return None
+                index = cls()
+                for values in index._arrays():
+                    values.fromfile(f, count)
+                    if sys.byteorder != 'little':
+                        values.byteswap()
+        except (OSError, EOFError):
+            return None
+        return index
+
+    def save(self, path, size, mtime):
+        """
+        Save the index to the sidecar file.
+
+        :param path: Path to the index file.
+        :param size: Size of the ttyrec file in bytes.
+        :param mtime: Modification time of ttyrec file in nanoseconds.
+        :return: None.
+        """
+        tmppath = path + '.tmp'
+        with open(tmppath, 'wb') as f:
+            f.write(INDEX_HEADER.pack(INDEX_MAGIC, size, mtime, len(self)))
+            for values in self._arrays():
+                if sys.byteorder != 'little':
+                    values = array.array(values.typecode, values)
+                    values.byteswap()
+                values.tofile(f)
+        os.replace(tmppath, path)
+
+
+class IndexedTtyPlay(ttyplay.TtyPlay):
+    """
+    ttyrec player that maps the file into memory and reads it by index.
+    """
+    def __init__(self, path, speed=1.0, encoding=None, logbase=None,
+                 save_index=False):
+        """
+        Create a new indexed ttyrec player.
+
+        :param path: Path to the ttyrec file.
+        :param speed: Speed multipier, used to divide delays.
+        :param encoding: Colon-separated source and target terminal encodings.
+        :param logbase: Perform a logarithmic time compression with base.
+        :param save_index: Keep the frame index in a sidecar file and reuse
+                           it on next runs.
+        """
+        super().__init__(path, speed, encoding, logbase)
+        if self.compression is not None:
+            self.file.close()
+            raise ValueError("Compressed ttyrec can't be mapped into memory")
+        stat = os.fstat(self.file.fileno())
+        if stat.st_size:
+            self.map = mmap.mmap(self.file.fileno(), 0,
+                                 access=mmap.ACCESS_READ)
+        else:
+            self.map = b''  # Empty files can't be mapped
+        self.view = memoryview(self.map)
+        index = None
+        indexpath = path + INDEX_SUFFIX
+        if save_index:
+            index = FrameIndex.load(indexpath, stat.st_size, stat.st_mtime_ns)
+        if index is None:
+            index = FrameIndex.scan(self.map)
+            if save_index:
+                index.save(indexpath, stat.st_size, stat.st_mtime_ns)
+        self.index = index
+
+    def compute_framedelays(self):
+        """
+        Calculate lengths of all frames from the index.
+
+        :return: Array, containing delays for each frame.
+        """
+        self.frameno = 0
+        durations = ttyplay.frame_durations(self.index.seconds,
+                                            self.index.useconds)
+        if self.rawdelays is not None:
+            self.rawdelays.extend(durations)
+        return ttyplay.scale_delays(durations, self.speed, self.logbase)
+
+    def compute_framelengths(self):
+        """
+        Get payload lengths of all frames from the index.
+
+        :return: Array, containing payload length of each frame.
+        """
+        return self.index.lengths
+
+    def _release_frame(self):
+        """
+        Release the view of the previous payload, so that file can be
+        unmapped.
+
+        :return: None.
+        """
+        if isinstance(self.frame, memoryview):
+            self.frame.release()
+
+    def _reencode_frame(self, frame):
+        """
+        Reencode frame to target terminal encoding (if requested).
+
+        :param frame: Frame content.
+        :return: Reencoded frame content.
+        """
+        return str(frame, self.encoding[0]).encode(self.encoding[1])
+
+    def read_frame(self, loop=False):
+        """
+        Read a ttyrec frame. Payload is a view into the mapped file, valid
+        until the next frame is read.
+
+        :param loop: If True, rewind ttyrec after reaching EOF (don't close).
+        :return: True, if there's more to read, False if reached EOF.
+        """
+        self._release_frame()
+        frameno = self.frameno
+        if frameno >= len(self.index):
+            self.frame = bytes()
+            if loop:
+                self.frameno = 0
+            else:
+                self.close()
+            return False
+        offset = self.index.offsets[frameno]
+        length = self.index.lengths[frameno]
+        self.frame = self.view[offset:offset + length]
+        if self.encoding is not None:
+            self.frame = self._reencode_frame(self.frame)
+        self.frameno += 1
+        seconds = self.index.seconds[frameno]
+        useconds = self.index.useconds[frameno]
+        if self.frameno > 1:
+            self.duration = self.compute_framelen(seconds, useconds)
+        self.seconds = seconds
+        self.useconds = useconds
+        self.length = length
+        return True
+
+    def close(self):
+        """
+        Unmap and close the ttyrec file.
+
+        :return: None
+        """
+        if self.view is None:
+            return
+        self._release_frame()
+        self.frame = None
+        self.view.release()
+        self.view = None
+        if isinstance(self.map, mmap.mmap):
+            self.map.close()
+        self.file.close()
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        """
+        Allows to use ttyrec player with context management.
+
+        :param exc_type: Exception type (if any).
+        :param exc_val: Exception object (if any).
+        :param exc_tb: Exception backtrace (if any).
+        :return: None
+        """
+        self.close()
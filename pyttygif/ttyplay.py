@@ -13,11 +13,336 @@
 #      You should have received a copy of the GNU General Public License
 #      along with pyttygif.  If not, see <https://www.gnu.org/licenses/>.
 
+import array
+import bisect
+import bz2
+import gzip
+import lzma
+import os
 import struct
 import io
+import itertools
 import sys
 import math
 
+try:
+    import numpy
+except ImportError:  # Delays are computed in pure Python then
+    numpy = None
+try:
+    import zstandard
+except ImportError:  # zstd-compressed ttyrecs are optional
+    zstandard = None
+
+# GIF counts delays in hundredths of seconds, so frames that are shown for
+# less than this are joined with the following ones.
+MIN_GIF_DELAY = 0.01
+# Number of frames, that are read at once in streaming mode, so that their
+# delays are computed together.
+STREAM_BATCH = 256
+# Size of blocks, that headers are looked for in, when payloads are skipped.
+SCAN_BLOCK = 1 << 20
+# Magic bytes of compressed ttyrecs.
+COMPRESSION_MAGIC = (
+    ('gzip', b'\x1f\x8b'),
+    ('xz', b'\xfd7zXZ\x00'),
+    ('bzip2', b'BZh'),
+    ('zstd', b'\x28\xb5\x2f\xfd'),
+)
+MAX_MAGIC = max(len(magic) for _, magic in COMPRESSION_MAGIC)
+
+
+def detect_compression(f):
+    """
+    Find out how ttyrec is compressed by its magic bytes.
+
+    :param f: Path to the ttyrec or binary file object, that supports peek.
+    :return: Name of compression or None for uncompressed ttyrec.
+    """
+    if isinstance(f, io.IOBase):
+        if not hasattr(f, 'peek'):
+            return None  # Can't look ahead without consuming the data
+        magic = f.peek(MAX_MAGIC)[:MAX_MAGIC]
+    else:
+        with open(f, 'rb') as raw:
+            magic = raw.read(MAX_MAGIC)
+    for name, signature in COMPRESSION_MAGIC:
+        if magic.startswith(signature):
+            return name
+    return None
+
+
+def _open_zstd(f, mode='rb'):
+    """
+    Open zstd-compressed file for streaming decompression.
+
+    :param f: Path or binary file object.
+    :param mode: Must be 'rb'.
+    :return: File object with decompressed data.
+    """
+    if zstandard is None:
+        raise ValueError("Reading zstd-compressed ttyrecs needs zstandard "
+                         "module")
+    if isinstance(f, io.IOBase):
+        return zstandard.ZstdDecompressor().stream_reader(
+            f, closefd=False, read_across_frames=True)
+    return zstandard.ZstdDecompressor().stream_reader(
+        open(f, mode), closefd=True, read_across_frames=True)
+
+
+# Functions to open compressed ttyrecs with.
+DECOMPRESSORS = {
+    'gzip': gzip.open,
+    'xz': lzma.open,
+    'bzip2': bz2.open,
+    'zstd': _open_zstd,
+}
+
+
+class _DecompressedFile(io.BufferedReader):
+    """
+    Decompressed ttyrec, that closes the compressed file along with it.
+    Decompressors leave file objects, that they haven't opened, open.
+    """
+    def __init__(self, stream, fileobj):
+        """
+        Wrap the decompressor.
+
+        :param stream: Decompressor file object.
+        :param fileobj: Compressed file object, that decompressor reads.
+        """
+        super().__init__(stream)
+        self.fileobj = fileobj
+
+    def close(self):
+        """
+        Close the decompressor and the compressed file.
+
+        :return: None.
+        """
+        try:
+            super().close()
+        finally:
+            self.fileobj.close()
+
+
+def open_ttyrec(f):
+    """
+    Open ttyrec for reading, decompressing it on the fly if needed. Path is
+    opened only once, so it could be a named pipe as well.
+
+    :param f: Path to the ttyrec or binary file object.
+    :return: Tuple of file object and name of compression (None if ttyrec
+             isn't compressed).
+    """
+    if isinstance(f, io.IOBase):
+        compression = detect_compression(f)
+        if compression is None:
+            return f, None
+        return DECOMPRESSORS[compression](f, 'rb'), compression
+    raw = open(f, 'rb')
+    try:
+        compression = detect_compression(raw)
+        if compression is None:
+            return raw, None
+        return (_DecompressedFile(DECOMPRESSORS[compression](raw, 'rb'), raw),
+                compression)
+    except BaseException:
+        raw.close()
+        raise
+
+
+def scale_delay(duration, speed=1.0, logbase=None):
+    """
+    Apply time compression and speed to the recorded frame duration.
+
+    :param duration: Float duration of frame in seconds, as recorded.
+    :param speed: Speed multipier, used to divide delays.
+    :param logbase: Perform a logarithmic time compression with base.
+    :return: Float delay of frame in seconds.
+    """
+    if logbase:
+        duration = math.log(1.0 + duration, logbase)
+    duration /= speed
+    if duration < 0:
+        raise ValueError("ttyrec frame is in past")
+    return duration
+
+
+def frame_durations(seconds, useconds):
+    """
+    Compute recorded durations of frames from their timestamps.
+
+    :param seconds: Array of sec fields of ttyrec headers.
+    :param useconds: Array of usec fields of ttyrec headers.
+    :return: Array of float durations in seconds (one less than frames).
+    """
+    if numpy is not None and len(seconds) > 1:
+        secs = numpy.asarray(seconds, dtype=numpy.int64)
+        usecs = numpy.asarray(useconds, dtype=numpy.float64) / 1000000.0
+        durations = numpy.diff(secs) + (usecs[1:] - usecs[:-1])
+        if (durations < 0).any():
+            raise ValueError("ttyrec frame is in past")
+        return array.array('d', durations.tobytes())
+    durations = array.array('d')
+    append = durations.append
+    frames = zip(seconds, useconds)
+    # First frame is only taken as the previous one for the rest of them.
+    for prevsec, prevusec in frames:
+        for sec, usec in frames:
+            duration = (sec - prevsec) + (usec / 1000000.0 -
+                                          prevusec / 1000000.0)
+            if duration < 0:
+                raise ValueError("ttyrec frame is in past")
+            append(duration)
+            prevsec, prevusec = sec, usec
+    return durations
+
+
+def scale_delays(durations, speed=1.0, logbase=None):
+    """
+    Apply time compression and speed to the recorded frame durations (same
+    as scale_delay, but for the whole array at once).
+
+    :param durations: Array of float durations of frames in seconds.
+    :param speed: Speed multipier, used to divide delays.
+    :param logbase: Perform a logarithmic time compression with base.
+    :return: Array of float delays of frames in seconds.
+    """
+    if numpy is not None and len(durations):
+        delays = numpy.asarray(durations, dtype=numpy.float64)
+        if logbase:
+            delays = numpy.log(1.0 + delays) / math.log(logbase)
+        return array.array('d', (delays / speed).tobytes())
+    if logbase:
+        log = math.log
+        base = log(logbase)
+        return array.array('d', [log(1.0 + duration) / base / speed
+                                 for duration in durations])
+    return array.array('d', [duration / speed for duration in durations])
+
+
+def recorded_duration(delays, speed=1.0, logbase=None):
+    """
+    Compute the total duration of frames at original speed.
+
+    :param delays: Array of float delays of frames in seconds.
+    :param speed: Speed multipier, that delays were divided with.
+    :param logbase: Base of logarithmic time compression (None - disabled).
+    :return: Float duration in seconds.
+    """
+    if numpy is not None and len(delays):
+        values = numpy.asarray(delays, dtype=numpy.float64)
+        if logbase:
+            values = numpy.power(logbase, values) - 1
+        return float(values.sum()) * speed
+    if logbase:
+        return sum([(logbase ** delay) - 1 for delay in delays]) * speed
+    return sum(delays) * speed
+
+
+def capture_delays(delays, delaycap=float('+inf')):
+    """
+    Find which ttyrec frames are captured as GIF frames.
+
+    :param delays: List of ttyrec frame delays.
+    :param delaycap: Maximum delay of a single GIF frame.
+    :return: List with GIF frame delay for each captured ttyrec frame and
+             None for frames, joined with the following ones.
+    """
+    points = []
+    vislength = 0.0
+    for delay in delays:
+        vislength += delay
+        if vislength <= MIN_GIF_DELAY:
+            points.append(None)
+            continue
+        points.append(min(delaycap, vislength))
+        vislength = 0.0
+    return points
+
+
+def coalesce_delays(delays, delaycap=float('+inf')):
+    """
+    Join the too short ttyrec frames into GIF frames with reasonable timing.
+
+    :param delays: List of ttyrec frame delays.
+    :param delaycap: Maximum delay of a single GIF frame.
+    :return: Array of GIF frame delays.
+    """
+    # Frame is captured depending on the time accumulated since the last
+    # capture, so this can't be done with array operations.
+    gifdelays = array.array('d')
+    append = gifdelays.append
+    vislength = 0.0
+    for delay in delays:
+        vislength += delay
+        if vislength > MIN_GIF_DELAY:
+            append(delaycap if delaycap < vislength else vislength)
+            vislength = 0.0
+    return gifdelays
+
+
+def parse_position(text):
+    """
+    Parse the position in ttyrec: recorded time as [[HH:]MM:]SS (seconds
+    could be fractional) or frame number with f suffix (counting from 1).
+
+    :param text: String with the position.
+    :return: Tuple of ('time', seconds) or ('frame', zero-based number).
+    """
+    text = text.strip()
+    try:
+        if text.endswith('f'):
+            number = int(text[:-1])
+            if number < 1:
+                raise ValueError
+            return 'frame', number - 1
+        parts = text.split(':')
+        if len(parts) > 3 or not all(part.isdigit() for part in parts[:-1]) \
+                or not parts[-1].replace('.', '', 1).isdigit():
+            raise ValueError
+        seconds = 0
+        for part in parts[:-1]:
+            seconds = seconds * 60 + int(part)
+        seconds = seconds * 60 + float(parts[-1])
+    except ValueError:
+        raise ValueError("Position in ttyrec should be time as [[HH:]MM:]SS "
+                         "or frame number as Nf, got: {0}".format(text))
+    return 'time', seconds
+
+
+def frame_range(durations, total, start=None, end=None):
+    """
+    Find ttyrec frames within the range. Time range takes frames, recorded
+    from its start (inclusive) to its end (exclusive), counting from the
+    first frame. Frame range includes both its start and end frames.
+
+    :param durations: Array of recorded frame durations (one less than
+                      frames).
+    :param total: Number of frames.
+    :param start: Position of the first frame (see parse_position, None -
+                  the first frame of ttyrec).
+    :param end: Position of the last frame (see parse_position, None - the
+                last frame of ttyrec).
+    :return: Tuple of the first frame and the frame after the last one
+             (zero-based).
+    """
+    times = None
+    if (start is not None and start[0] == 'time') or \
+            (end is not None and end[0] == 'time'):
+        times = list(itertools.accumulate(itertools.chain((0.0,),
+                                                          durations)))
+    first, stop = 0, total
+    if start is not None:
+        kind, value = start
+        first = value if kind == 'frame' else bisect.bisect_left(times, value)
+    if end is not None:
+        kind, value = end
+        stop = value + 1 if kind == 'frame' else \
+            bisect.bisect_left(times, value)
+    return min(first, total), min(stop, total)
+
 
 class TtyPlay(object):
     """
@@ -27,15 +352,14 @@ class TtyPlay(object):
         """
         Create a new ttyrec player.
 
-        :param f: An open file object or a path to file.
+        :param f: An open file object or a path to file (gzip, xz, bzip2
+                  and zstd compressed files are decompressed on the fly).
         :param speed: Speed multipier, used to divide delays.
         :param encoding: Colon-separated source and target terminal encodings.
         :param logbase: Perform a logarithmic time compression with base.
         """
-        if isinstance(f, io.IOBase):
-            self.file = f
-        else:
-            self.file = open(f, 'rb')
+        self.path = None if isinstance(f, io.IOBase) else f
+        self.file, self.compression = open_ttyrec(f)
         self.encoding = self._parse_encoding(encoding)
         self.speed = speed  # Multiplier of speed
         self.seconds = 0  # sec field of header
@@ -45,6 +369,7 @@ class TtyPlay(object):
         self.duration = 0.0  # Computed duration of previous frame
         self.frame = bytes()  # Payload of the frame
         self.logbase = logbase  # Base of logarithm for log time compression
+        self.rawdelays = None  # List to collect recorded delays to
 
     def _parse_encoding(self, encoding):
         """
@@ -75,12 +400,9 @@ class TtyPlay(object):
         secdiff = sec - self.seconds
         usecdiff = (usec / 1000000.0) - (self.useconds / 1000000.0)
         duration = (secdiff + usecdiff)
-        if self.logbase:
-            duration = math.log(1.0 + duration, self.logbase)
-        duration /= self.speed
-        if duration < 0:
-            raise ValueError("ttyrec frame is in past")
-        return duration
+        if self.rawdelays is not None:
+            self.rawdelays.append(duration)
+        return scale_delay(duration, self.speed, self.logbase)
 
     def compute_framedelays(self):
         """
@@ -88,12 +410,180 @@ class TtyPlay(object):
 
         :return: List, containing delays for each frame.
         """
-        self.file.seek(0)
-        delays = []
-        while self.read_frame(loop=True):
-            if self.frameno > 1:
-                delays.append(self.duration)
-        return delays
+        self._rewind()
+        self.frameno = 0
+        seconds, useconds, _ = self._scan_headers()
+        self._rewind()
+        self.frameno = 0
+        return self._scale_durations(seconds, useconds)
+
+    def compute_framelengths(self):
+        """
+        Walk through the ttyrec file and collect payload lengths of all
+        frames.
+
+        :return: Array, containing payload length of each frame.
+        """
+        self._rewind()
+        self.frameno = 0
+        lengths = self._scan_headers()[2]
+        self._rewind()
+        self.frameno = 0
+        return lengths
+
+    def stream_frames(self, lastframe):
+        """
+        Read the ttyrec in a single pass, yielding each frame together with
+        its delay. Delay of a frame is only known after the next frame is
+        read, so frames are yielded one frame behind. Frames are read in
+        batches to compute their delays at once.
+
+        :param lastframe: Delay of the last frame.
+        :return: Generator of (payload, delay) tuples.
+        """
+        previous = None
+        while True:
+            seconds, useconds, _, frames = self._read_frames(STREAM_BATCH)
+            if not frames:
+                break
+            if previous is not None:
+                # Last frame of the previous batch gets its delay now.
+                seconds.insert(0, self.seconds)
+                useconds.insert(0, self.useconds)
+                frames.insert(0, previous)
+            self.seconds = seconds[-1]
+            self.useconds = useconds[-1]
+            previous = frames[-1]
+            yield from zip(frames, self._scale_durations(seconds, useconds))
+        self.file.close()
+        if previous is not None:
+            yield previous, lastframe
+
+    def _scan_headers(self):
+        """
+        Read headers of all the remaining frames, skipping the payloads.
+        The file is read in large blocks, so that it isn't read frame by
+        frame, and payloads, that continue past the block, are seeked over
+        (or skipped as the next blocks come, if the file can't seek).
+
+        :return: Tuple of arrays of sec, usec and len fields of headers.
+        """
+        seconds = array.array('I')
+        useconds = array.array('I')
+        lengths = array.array('I')
+        unpack_from = struct.unpack_from
+        size = self._file_size()
+        tail = b''  # Incomplete header at the end of the previous block
+        skip = 0  # Bytes of the payload, that continues past the block
+        while True:
+            if skip and size is not None:
+                if self.file.tell() + skip > size:
+                    break
+                self.file.seek(skip, io.SEEK_CUR)
+                skip = 0
+            block = self.file.read(SCAN_BLOCK)
+            if not block:
+                break
+            if skip >= len(block):
+                skip -= len(block)
+                continue
+            data = tail + block if tail else block
+            pos = skip
+            end = len(data)
+            while pos + 12 <= end:
+                sec, usec, length = unpack_from('<III', data, pos)
+                seconds.append(sec)
+                useconds.append(usec)
+                lengths.append(length)
+                pos += 12 + length
+            skip = max(0, pos - end)
+            tail = data[pos:]
+        if skip:
+            raise ValueError("Short read: Couldn't read a whole ttyrec "
+                             "frame!")
+        if tail:
+            raise ValueError("Short read: Couldn't read a whole ttyrec "
+                             "header!")
+        self.frameno += len(lengths)
+        return seconds, useconds, lengths
+
+    def _file_size(self):
+        """
+        Get the size of ttyrec file, if it could be seeked over.
+
+        :return: Size in bytes (None for compressed ttyrecs and pipes).
+        """
+        if self.compression is not None or not self.file.seekable():
+            return None
+        try:
+            return os.fstat(self.file.fileno()).st_size
+        except (OSError, ValueError):
+            return None
+
+    def _read_frames(self, limit=None):
+        """
+        Read a run of frames, leaving their delays to be computed at once.
+
+        :param limit: Maximum number of frames to read (None - up to EOF).
+        :return: Tuple of arrays of sec, usec and len fields of headers and
+                 list of payloads.
+        """
+        seconds = array.array('I')
+        useconds = array.array('I')
+        lengths = array.array('I')
+        frames = []
+        read = self.file.read
+        unpack = struct.unpack
+        while limit is None or len(lengths) < limit:
+            header = read(12)
+            if len(header) == 0:
+                break
+            elif len(header) < 12:
+                raise ValueError("Short read: Couldn't read a whole ttyrec "
+                                 "header!")
+            sec, usec, length = unpack('<III', header)
+            frame = read(length)
+            if len(frame) < length:
+                raise ValueError("Short read: Couldn't read a whole ttyrec "
+                                 "frame!")
+            seconds.append(sec)
+            useconds.append(usec)
+            lengths.append(length)
+            if self.encoding is not None:
+                frame = self._reencode_frame(frame)
+            frames.append(frame)
+        self.frameno += len(lengths)
+        return seconds, useconds, lengths, frames
+
+    def _scale_durations(self, seconds, useconds):
+        """
+        Compute delays of frames from their timestamps, collecting the
+        recorded durations, if asked to.
+
+        :param seconds: Array of sec fields of ttyrec headers.
+        :param useconds: Array of usec fields of ttyrec headers.
+        :return: Array of float delays (one less than frames).
+        """
+        durations = frame_durations(seconds, useconds)
+        if self.rawdelays is not None:
+            self.rawdelays.extend(durations)
+        return scale_delays(durations, self.speed, self.logbase)
+
+    def _rewind(self):
+        """
+        Go back to the beginning of ttyrec. Compressed ttyrecs, that can't
+        seek back, are reopened.
+
+        :return: None.
+        """
+        if self.file.seekable():
+            self.file.seek(0)
+        elif self.path is not None:
+            self.file.close()
+            self.file, self.compression = open_ttyrec(self.path)
+        else:
+            raise ValueError("Couldn't rewind ttyrec, it can be read only "
+                             "once")
 
     def _reencode_frame(self, frame):
         """
@@ -114,7 +604,7 @@ class TtyPlay(object):
         header = self.file.read(12)
         if len(header) == 0:
             if loop:
-                self.file.seek(0)
+                self._rewind()
                 self.frameno = 0
             else:
                 self.file.close()
@@ -135,13 +625,16 @@ class TtyPlay(object):
         self.length = length
         return True
 
-    def display_frame(self):
+    def display_frame(self, frame=None):
         """
         Print the frame to stdout.
 
+        :param frame: Payload to print (None - current frame).
         :return: None
         """
-        sys.stdout.write(str(self.frame, errors='ignore'))
+        if frame is None:
+            frame = self.frame
+        sys.stdout.write(str(frame, errors='ignore'))
         sys.stdout.flush()
 
     def close(self):
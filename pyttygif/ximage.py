@@ -0,0 +1,470 @@
+#      This file is part of pyttygif.
+#
+#      pyttygif is free software: you can redistribute it and/or modify
+#      it under the terms of the GNU General Public License as published by
+#      the Free Software Foundation, either version 3 of the License, or
+#      (at your option) any later version.
+#
+#      pyttygif is distributed in the hope that it will be useful,
+#      but WITHOUT ANY WARRANTY; without even the implied warranty of
+#      MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#      GNU General Public License for more details.
+#
+#      You should have received a copy of the GNU General Public License
+#      along with pyttygif.  If not, see <https://www.gnu.org/licenses/>.
+
+import ctypes
+import ctypes.util
+import os
+
+from pyttygif import xwd
+
+# X protocol constants.
+Z_PIXMAP = 2
+ALL_PLANES = ctypes.c_ulong(-1).value
+IS_VIEWABLE = 2
+TRUE_COLOR = 4
+DIRECT_COLOR = 5
+BAD_MATCH = 8
+CONFIGURE_NOTIFY = 22
+STRUCTURE_NOTIFY_MASK = 1 << 17
+# System V shared memory constants.
+IPC_PRIVATE = 0
+IPC_CREAT = 0o1000
+IPC_RMID = 0
+
+
+class _XImage(ctypes.Structure):
+    _fields_ = [
+        ('width', ctypes.c_int), ('height', ctypes.c_int),
+        ('xoffset', ctypes.c_int), ('format', ctypes.c_int),
+        ('data', ctypes.c_void_p), ('byte_order', ctypes.c_int),
+        ('bitmap_unit', ctypes.c_int), ('bitmap_bit_order', ctypes.c_int),
+        ('bitmap_pad', ctypes.c_int), ('depth', ctypes.c_int),
+        ('bytes_per_line', ctypes.c_int), ('bits_per_pixel', ctypes.c_int),
+        ('red_mask', ctypes.c_ulong), ('green_mask', ctypes.c_ulong),
+        ('blue_mask', ctypes.c_ulong), ('obdata', ctypes.c_void_p),
+        ('f', ctypes.c_void_p * 6),
+    ]
+
+
+class _Visual(ctypes.Structure):
+    _fields_ = [
+        ('ext_data', ctypes.c_void_p), ('visualid', ctypes.c_ulong),
+        ('c_class', ctypes.c_int), ('red_mask', ctypes.c_ulong),
+        ('green_mask', ctypes.c_ulong), ('blue_mask', ctypes.c_ulong),
+        ('bits_per_rgb', ctypes.c_int), ('map_entries', ctypes.c_int),
+    ]
+
+
+class _XWindowAttributes(ctypes.Structure):
+    _fields_ = [
+        ('x', ctypes.c_int), ('y', ctypes.c_int),
+        ('width', ctypes.c_int), ('height', ctypes.c_int),
+        ('border_width', ctypes.c_int), ('depth', ctypes.c_int),
+        ('visual', ctypes.POINTER(_Visual)), ('root', ctypes.c_ulong),
+        ('c_class', ctypes.c_int), ('bit_gravity', ctypes.c_int),
+        ('win_gravity', ctypes.c_int), ('backing_store', ctypes.c_int),
+        ('backing_planes', ctypes.c_ulong), ('backing_pixel', ctypes.c_ulong),
+        ('save_under', ctypes.c_int), ('colormap', ctypes.c_ulong),
+        ('map_installed', ctypes.c_int), ('map_state', ctypes.c_int),
+        ('all_event_masks', ctypes.c_long),
+        ('your_event_mask', ctypes.c_long),
+        ('do_not_propagate_mask', ctypes.c_long),
+        ('override_redirect', ctypes.c_int), ('screen', ctypes.c_void_p),
+    ]
+
+
+class _XShmSegmentInfo(ctypes.Structure):
+    _fields_ = [
+        ('shmseg', ctypes.c_ulong), ('shmid', ctypes.c_int),
+        ('shmaddr', ctypes.c_void_p), ('readOnly', ctypes.c_int),
+    ]
+
+
+class _XConfigureEvent(ctypes.Structure):
+    _fields_ = [
+        ('type', ctypes.c_int), ('serial', ctypes.c_ulong),
+        ('send_event', ctypes.c_int), ('display', ctypes.c_void_p),
+        ('event', ctypes.c_ulong), ('window', ctypes.c_ulong),
+        ('x', ctypes.c_int), ('y', ctypes.c_int),
+        ('width', ctypes.c_int), ('height', ctypes.c_int),
+        ('border_width', ctypes.c_int), ('above', ctypes.c_ulong),
+        ('override_redirect', ctypes.c_int),
+    ]
+
+
+class _XEvent(ctypes.Union):
+    _fields_ = [
+        ('xconfigure', _XConfigureEvent), ('pad', ctypes.c_long * 24),
+    ]
+
+
+class _XErrorEvent(ctypes.Structure):
+    _fields_ = [
+        ('type', ctypes.c_int), ('display', ctypes.c_void_p),
+        ('resourceid', ctypes.c_ulong), ('serial', ctypes.c_ulong),
+        ('error_code', ctypes.c_ubyte), ('request_code', ctypes.c_ubyte),
+        ('minor_code', ctypes.c_ubyte),
+    ]
+
+
+_ERROR_HANDLER = ctypes.CFUNCTYPE(ctypes.c_int, ctypes.c_void_p,
+                                  ctypes.POINTER(_XErrorEvent))
+_libs = {}  # Loaded libraries by name
+_errors = []  # Codes of X errors, that weren't checked yet
+
+
+@_ERROR_HANDLER
+def _error_handler(display, event):
+    """
+    Record X error instead of exiting the process, as default handler does.
+
+    :param display: Display pointer.
+    :param event: Pointer to XErrorEvent.
+    :return: Ignored.
+    """
+    _errors.append(event.contents.error_code)
+    return 0
+
+
+def _load():
+    """
+    Load Xlib, MIT-SHM extension library and libc, and declare the
+    functions, that are used.
+
+    :return: Tuple of X11, Xext (None if missing) and C libraries.
+    """
+    if _libs:
+        return _libs['X11'], _libs['Xext'], _libs['c']
+    path = ctypes.util.find_library('X11')
+    if path is None:
+        raise OSError("In-process capture needs libX11")
+    x11 = ctypes.CDLL(path)
+    c = ctypes.CDLL(None, use_errno=True)
+    xext = None
+    path = ctypes.util.find_library('Xext')
+    if path is not None:
+        try:
+            xext = ctypes.CDLL(path)
+        except OSError:
+            pass  # Pixels are taken with XGetImage then
+    display = ctypes.c_void_p
+    image = ctypes.POINTER(_XImage)
+    segment = ctypes.POINTER(_XShmSegmentInfo)
+    x11.XOpenDisplay.restype = display
+    x11.XOpenDisplay.argtypes = [ctypes.c_char_p]
+    x11.XCloseDisplay.argtypes = [display]
+    x11.XSync.argtypes = [display, ctypes.c_int]
+    x11.XSetErrorHandler.restype = ctypes.c_void_p
+    x11.XSetErrorHandler.argtypes = [_ERROR_HANDLER]
+    x11.XGetErrorText.argtypes = [display, ctypes.c_int, ctypes.c_char_p,
+                                  ctypes.c_int]
+    x11.XGetWindowAttributes.argtypes = [
+        display, ctypes.c_ulong, ctypes.POINTER(_XWindowAttributes)]
+    x11.XSelectInput.argtypes = [display, ctypes.c_ulong, ctypes.c_long]
+    x11.XCheckTypedWindowEvent.argtypes = [display, ctypes.c_ulong,
+                                           ctypes.c_int,
+                                           ctypes.POINTER(_XEvent)]
+    x11.XGetImage.restype = image
+    x11.XGetImage.argtypes = [display, ctypes.c_ulong, ctypes.c_int,
+                              ctypes.c_int, ctypes.c_uint, ctypes.c_uint,
+                              ctypes.c_ulong, ctypes.c_int]
+    x11.XDestroyImage.argtypes = [image]
+    if xext is not None:
+        xext.XShmQueryExtension.argtypes = [display]
+        xext.XShmCreateImage.restype = image
+        xext.XShmCreateImage.argtypes = [
+            display, ctypes.POINTER(_Visual), ctypes.c_uint, ctypes.c_int,
+            ctypes.c_void_p, segment, ctypes.c_uint, ctypes.c_uint]
+        xext.XShmAttach.argtypes = [display, segment]
+        xext.XShmDetach.argtypes = [display, segment]
+        xext.XShmGetImage.argtypes = [display, ctypes.c_ulong, image,
+                                      ctypes.c_int, ctypes.c_int,
+                                      ctypes.c_ulong]
+    c.shmget.argtypes = [ctypes.c_int, ctypes.c_size_t, ctypes.c_int]
+    c.shmat.restype = ctypes.c_void_p
+    c.shmat.argtypes = [ctypes.c_int, ctypes.c_void_p, ctypes.c_int]
+    c.shmdt.argtypes = [ctypes.c_void_p]
+    c.shmctl.argtypes = [ctypes.c_int, ctypes.c_int, ctypes.c_void_p]
+    x11.XSetErrorHandler(_error_handler)
+    _libs.update({'X11': x11, 'Xext': xext, 'c': c})
+    return x11, xext, c
+
+
+class WindowCapture(object):
+    """
+    Captures the window through a persistent connection to X server, instead
+    of running xwd for each frame. Pixels are copied by X server into a
+    shared memory segment (MIT-SHM), that is reused while the window keeps
+    its size. If the extension is not available (e.g. X server is remote),
+    pixels are transferred with XGetImage. Window attributes are only
+    queried again, when the window is resized or capture fails with
+    BadMatch (e.g. it's unmapped).
+    """
+    def __init__(self, windowid, shm=True):
+        """
+        Connect to X server (from DISPLAY environment variable).
+
+        :param windowid: Window ID of the window to capture.
+        :param shm: Use MIT-SHM extension, if X server supports it.
+        """
+        self.x11, self.xext, self.libc = _load()
+        self.windowid = windowid
+        self.display = self.x11.XOpenDisplay(None)
+        if not self.display:
+            raise OSError("Couldn't connect to X display {0}".format(
+                os.getenv('DISPLAY', '')))
+        if not shm or self.xext is None or \
+                not self.xext.XShmQueryExtension(self.display):
+            self.xext = None
+        self.image = None  # XImage in shared memory
+        self.segment = None  # XShmSegmentInfo of the image
+        self.layout = None  # PixmapFormat of the last capture
+        self.event = _XEvent()  # Buffer for window events
+        self.error = None  # Code of the last X error
+        try:
+            self.attrs = self._attributes()
+            # Resizes are reported with events, that arrive along with
+            # replies, so checking them needs no round trip.
+            self.x11.XSelectInput(self.display, windowid,
+                                  STRUCTURE_NOTIFY_MASK)
+        except BaseException:
+            self.close()
+            raise
+
+    @property
+    def shared(self):
+        """
+        Check if pixels are passed through shared memory.
+
+        :return: True if MIT-SHM is used.
+        """
+        return self.xext is not None
+
+    def _check(self, what):
+        """
+        Raise X error, that has occured since the last check.
+
+        :param what: Description of the failed action.
+        :return: None.
+        """
+        if not _errors:
+            return
+        code = self.error = _errors[-1]
+        del _errors[:]
+        text = ctypes.create_string_buffer(256)
+        self.x11.XGetErrorText(self.display, code, text, len(text))
+        raise OSError("{0}: {1}".format(what, text.value.decode(
+            errors='replace')))
+
+    def _attributes(self):
+        """
+        Get the attributes of the window and check that it could be
+        captured.
+
+        :return: XWindowAttributes.
+        """
+        attrs = _XWindowAttributes()
+        status = self.x11.XGetWindowAttributes(self.display, self.windowid,
+                                               ctypes.byref(attrs))
+        self._check("Couldn't get window attributes")
+        if not status:
+            raise OSError("Couldn't get window attributes")
+        if attrs.visual.contents.c_class not in (TRUE_COLOR, DIRECT_COLOR):
+            raise ValueError("Only TrueColor windows could be captured "
+                             "in-process")
+        if attrs.map_state != IS_VIEWABLE:
+            raise OSError("Window is not viewable")
+        return attrs
+
+    def _get_layout(self, image):
+        """
+        Get the layout of the captured pixels, reusing the previous one if
+        it's the same.
+
+        :param image: Pointer to XImage.
+        :return: PixmapFormat.
+        """
+        img = image.contents
+        layout = xwd.PixmapFormat(img.width, img.height, img.bytes_per_line,
+                                  img.bits_per_pixel, img.byte_order,
+                                  (img.red_mask, img.green_mask,
+                                   img.blue_mask))
+        if self.layout is None or self.layout.key != layout.key:
+            self.layout = layout
+        return self.layout
+
+    def _attach(self, attrs):
+        """
+        Create an image in a new shared memory segment and let X server
+        attach it.
+
+        :param attrs: XWindowAttributes of the window.
+        :return: None.
+        """
+        segment = _XShmSegmentInfo()
+        image = self.xext.XShmCreateImage(
+            self.display, attrs.visual, attrs.depth, Z_PIXMAP, None,
+            ctypes.byref(segment), attrs.width, attrs.height)
+        if not image:
+            raise OSError("Couldn't create shared memory image")
+        size = image.contents.bytes_per_line * image.contents.height
+        segment.shmid = self.libc.shmget(IPC_PRIVATE, size,
+                                         IPC_CREAT | 0o600)
+        if segment.shmid < 0:
+            self.x11.XDestroyImage(image)
+            raise OSError(ctypes.get_errno(), "Couldn't allocate shared "
+                                              "memory")
+        address = self.libc.shmat(segment.shmid, None, 0)
+        if address in (None, ctypes.c_void_p(-1).value):
+            errno = ctypes.get_errno()
+            self.libc.shmctl(segment.shmid, IPC_RMID, None)
+            self.x11.XDestroyImage(image)
+            raise OSError(errno, "Couldn't attach shared memory")
+        segment.shmaddr = image.contents.data = address
+        segment.readOnly = False
+        attached = self.xext.XShmAttach(self.display, ctypes.byref(segment))
+        self.x11.XSync(self.display, False)
+        # Segment is removed, as soon as both sides detach from it.
+        self.libc.shmctl(segment.shmid, IPC_RMID, None)
+        if attached and not _errors:
+            self.image, self.segment = image, segment
+            return
+        self.libc.shmdt(address)
+        image.contents.data = None
+        self.x11.XDestroyImage(image)
+        self._check("X server couldn't attach shared memory")
+        raise OSError("X server couldn't attach shared memory")
+
+    def _detach(self):
+        """
+        Let X server detach the shared memory image and free it.
+
+        :return: None.
+        """
+        if self.image is None:
+            return
+        if self.display:
+            self.xext.XShmDetach(self.display, ctypes.byref(self.segment))
+            self.x11.XSync(self.display, False)
+            del _errors[:]
+        self.libc.shmdt(self.segment.shmaddr)
+        self.image.contents.data = None  # Not to be freed by Xlib
+        self.x11.XDestroyImage(self.image)
+        self.image = self.segment = None
+
+    def _capture_shared(self, attrs):
+        """
+        Let X server copy the window into shared memory.
+
+        :param attrs: XWindowAttributes of the window.
+        :return: Pixmap.
+        """
+        if self.image is None or \
+                (self.image.contents.width, self.image.contents.height) != \
+                (attrs.width, attrs.height):
+            self._detach()
+            self._attach(attrs)
+        ok = self.xext.XShmGetImage(self.display, self.windowid, self.image,
+                                    0, 0, ALL_PLANES)
+        self._check("Couldn't capture the window")
+        if not ok:
+            raise OSError("Couldn't capture the window")
+        img = self.image.contents
+        pixels = ctypes.string_at(img.data, img.bytes_per_line * img.height)
+        return xwd.Pixmap(self._get_layout(self.image), pixels)
+
+    def _capture_plain(self, attrs):
+        """
+        Transfer the window pixels through X connection.
+
+        :param attrs: XWindowAttributes of the window.
+        :return: Pixmap.
+        """
+        image = self.x11.XGetImage(self.display, self.windowid, 0, 0,
+                                   attrs.width, attrs.height, ALL_PLANES,
+                                   Z_PIXMAP)
+        try:
+            self._check("Couldn't capture the window")
+            if not image:
+                raise OSError("Couldn't capture the window")
+            img = image.contents
+            pixels = ctypes.string_at(img.data,
+                                      img.bytes_per_line * img.height)
+            return xwd.Pixmap(self._get_layout(image), pixels)
+        finally:
+            if image:
+                self.x11.XDestroyImage(image)
+
+    def _resized(self):
+        """
+        Check the events of the window for a new size.
+
+        :return: True if the window has changed its size.
+        """
+        resized = False
+        event = self.event
+        while self.x11.XCheckTypedWindowEvent(self.display, self.windowid,
+                                              CONFIGURE_NOTIFY,
+                                              ctypes.byref(event)):
+            config = event.xconfigure
+            if (config.width, config.height) != \
+                    (self.attrs.width, self.attrs.height):
+                resized = True
+        return resized
+
+    def _capture(self, attrs):
+        """
+        Capture the window through shared memory, if possible.
+
+        :param attrs: XWindowAttributes of the window.
+        :return: Pixmap.
+        """
+        if self.xext is not None:
+            try:
+                return self._capture_shared(attrs)
+            except OSError:
+                if self.error == BAD_MATCH:
+                    raise  # Window has changed, not the shared memory
+                # Shared memory could be refused by X server (e.g. when it
+                # runs in another IPC namespace), fall back to XGetImage.
+                self._detach()
+                self.xext = None
+        return self._capture_plain(attrs)
+
+    def capture(self):
+        """
+        Capture the window.
+
+        :return: Pixmap.
+        """
+        if self._resized():
+            self.attrs = self._attributes()
+        self.error = None
+        try:
+            return self._capture(self.attrs)
+        except OSError:
+            if self.error != BAD_MATCH:
+                raise
+        # Window was resized or unmapped before the event has come.
+        self.attrs = self._attributes()
+        self.error = None
+        return self._capture(self.attrs)
+
+    def close(self):
+        """
+        Free the shared memory and close the connection.
+
+        :return: None.
+        """
+        self._detach()
+        if self.display:
+            self.x11.XCloseDisplay(self.display)
+            self.display = None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        self.close()
@@ -0,0 +1,349 @@
+#      This file is part of pyttygif.
+#
+#      pyttygif is free software: you can redistribute it and/or modify
+#      it under the terms of the GNU General Public License as published by
+#      the Free Software Foundation, either version 3 of the License, or
+#      (at your option) any later version.
+#
+#      pyttygif is distributed in the hope that it will be useful,
+#      but WITHOUT ANY WARRANTY; without even the implied warranty of
+#      MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#      GNU General Public License for more details.
+#
+#      You should have received a copy of the GNU General Public License
+#      along with pyttygif.  If not, see <https://www.gnu.org/licenses/>.
+
+import array
+import struct
+import sys
+
+try:
+    import numpy
+except ImportError:  # Pixels are unpacked and mapped in pure Python then
+    numpy = None
+
+from pyttygif import gifencode, image
+
+# X visual classes.
+STATIC_GRAY, GRAY_SCALE, STATIC_COLOR, PSEUDO_COLOR, TRUE_COLOR, \
+    DIRECT_COLOR = range(6)
+
+ZPIXMAP = 2
+MSB_FIRST = 1
+
+# Fields of XWDFileHeader, all of them are big-endian CARD32.
+HEADER_FIELDS = (
+    'header_size', 'file_version', 'pixmap_format', 'pixmap_depth',
+    'pixmap_width', 'pixmap_height', 'xoffset', 'byte_order', 'bitmap_unit',
+    'bitmap_bit_order', 'bitmap_pad', 'bits_per_pixel', 'bytes_per_line',
+    'visual_class', 'red_mask', 'green_mask', 'blue_mask', 'bits_per_rgb',
+    'colormap_entries', 'ncolors', 'window_width', 'window_height',
+    'window_x', 'window_y', 'window_bdrwidth',
+)
+HEADER = struct.Struct('>25I')
+COLOR = struct.Struct('>IHHHBx')
+
+# Typecodes of arrays for supported pixel sizes.
+PIXEL_TYPES = {8: 'B', 16: 'H', 32: 'I'}
+
+
+class XwdHeader(object):
+    """
+    Parsed header of X Window Dump image.
+    """
+    def __init__(self, data):
+        """
+        Parse the header of XWD image.
+
+        :param data: Raw XWD image bytes.
+        """
+        if len(data) < HEADER.size:
+            raise ValueError("XWD image is too short")
+        for name, value in zip(HEADER_FIELDS, HEADER.unpack_from(data)):
+            setattr(self, name, value)
+        if self.file_version != 7:
+            raise ValueError("Unsupported XWD version: {0}"
+                             .format(self.file_version))
+        if self.pixmap_format != ZPIXMAP:
+            raise ValueError("Only ZPixmap XWD images are supported")
+        if self.bits_per_pixel not in (8, 16, 24, 32):
+            raise ValueError("Unsupported XWD pixel size: {0}"
+                             .format(self.bits_per_pixel))
+        self.width = self.pixmap_width
+        self.height = self.pixmap_height
+        self.colormap_offset = self.header_size
+        self.pixmap_offset = self.header_size + self.ncolors * COLOR.size
+        if len(data) < self.pixmap_offset + self.bytes_per_line * self.height:
+            raise ValueError("XWD image is truncated")
+
+    def colormap(self, data):
+        """
+        Read the colormap of the image.
+
+        :param data: Raw XWD image bytes.
+        :return: Dict of pixel values to (r, g, b) tuples.
+        """
+        colors = {}
+        for i in range(self.ncolors):
+            pixel, r, g, b, _ = COLOR.unpack_from(
+                data, self.colormap_offset + i * COLOR.size)
+            colors[pixel] = (r >> 8, g >> 8, b >> 8)
+        return colors
+
+    def rows(self, data, region=None):
+        """
+        Get the pixel rows of the image without padding.
+
+        :param data: Raw XWD image bytes.
+        :param region: Tuple of (left, top, width, height) to cut out
+                       (None - whole image).
+        :return: Bytes of pixels, packed row by row.
+        """
+        left, top, width, height = region or (0, 0, self.width, self.height)
+        if left < 0 or top < 0 or left + width > self.width or \
+                top + height > self.height:
+            raise ValueError("Crop rectangle is outside of the image")
+        pixelsize = self.bits_per_pixel // 8
+        rowsize = width * pixelsize
+        stride = self.bytes_per_line
+        start = self.pixmap_offset + top * stride + left * pixelsize
+        if rowsize == stride:
+            return bytes(data[start:start + stride * height])
+        view = memoryview(data)
+        return b''.join(view[start + y * stride:start + y * stride + rowsize]
+                        for y in range(height))
+
+
+class PixmapFormat(XwdHeader):
+    """
+    Layout of raw TrueColor pixels, that are captured without xwd. It's
+    described with the fields of XWD header, so that the pixels are decoded
+    the same way as XWD image.
+    """
+    def __init__(self, width, height, bytes_per_line, bits_per_pixel,
+                 byte_order, masks):
+        """
+        Describe the pixels.
+
+        :param width: Width of the image in pixels.
+        :param height: Height of the image in pixels.
+        :param bytes_per_line: Length of the pixel row (including padding).
+        :param bits_per_pixel: Size of the pixel in bits.
+        :param byte_order: Byte order of the pixels (1 - MSB first).
+        :param masks: Tuple of red, green and blue masks.
+        """
+        # There's no header to parse, so XwdHeader constructor isn't called.
+        if bits_per_pixel not in (8, 16, 24, 32):
+            raise ValueError("Unsupported pixel size: {0}"
+                             .format(bits_per_pixel))
+        self.width = self.pixmap_width = width
+        self.height = self.pixmap_height = height
+        self.bytes_per_line = bytes_per_line
+        self.bits_per_pixel = bits_per_pixel
+        self.byte_order = byte_order
+        self.visual_class = TRUE_COLOR
+        self.red_mask, self.green_mask, self.blue_mask = masks
+        self.ncolors = 0
+        self.colormap_offset = self.pixmap_offset = 0
+
+    @property
+    def key(self):
+        """
+        Get the values, that pixels of the same layout share.
+
+        :return: Tuple of layout fields.
+        """
+        return (self.width, self.height, self.bytes_per_line,
+                self.bits_per_pixel, self.byte_order, self.red_mask,
+                self.green_mask, self.blue_mask)
+
+
+class Pixmap(object):
+    """
+    Raw pixels of the window, that are handed to the decoder as is.
+    """
+    def __init__(self, layout, pixels):
+        """
+        Create a new pixmap.
+
+        :param layout: PixmapFormat of the pixels.
+        :param pixels: Bytes of pixels, row by row.
+        """
+        if len(pixels) < layout.bytes_per_line * layout.height:
+            raise ValueError("Pixel data doesn't match the image size")
+        self.layout = layout
+        self.pixels = pixels
+
+    def __eq__(self, other):
+        return isinstance(other, Pixmap) and \
+            self.layout.key == other.layout.key and \
+            self.pixels == other.pixels
+
+
+def _shift(mask):
+    """
+    Find the position and width of the color mask.
+
+    :param mask: Color channel bit mask.
+    :return: Tuple of shift and number of bits.
+    """
+    if not mask:
+        return 0, 0
+    shift = (mask & -mask).bit_length() - 1
+    return shift, (mask >> shift).bit_length()
+
+
+def _scale(value, bits):
+    """
+    Scale the color channel value to 8 bits.
+
+    :param value: Channel value.
+    :param bits: Width of the channel.
+    :return: 8-bit channel value.
+    """
+    if bits >= 8:
+        return value >> (bits - 8)
+    return value * 255 // ((1 << bits) - 1)
+
+
+def pixel_values(header, data, region=None):
+    """
+    Unpack the pixels of XWD image into integers.
+
+    :param header: Parsed XwdHeader.
+    :param data: Raw XWD image bytes.
+    :param region: Tuple of (left, top, width, height) to unpack
+                   (None - whole image).
+    :return: Array of pixel values (NumPy array, if it's available).
+    """
+    pixels = header.rows(data, region)
+    bpp = header.bits_per_pixel
+    msb = header.byte_order == MSB_FIRST
+    if numpy is not None:
+        if bpp == 24:
+            channels = numpy.frombuffer(pixels, numpy.uint8).reshape(-1, 3)
+            channels = channels.astype(numpy.uint32)
+            if not msb:
+                channels = channels[:, ::-1]
+            return (channels[:, 0] << 16) | (channels[:, 1] << 8) | \
+                channels[:, 2]
+        dtype = numpy.dtype('u{0}'.format(bpp // 8))
+        return numpy.frombuffer(pixels, dtype.newbyteorder('>' if msb
+                                                           else '<'))
+    if bpp == 24:
+        # Widen 3-byte pixels into 4-byte ones by interleaving the bytes.
+        wide = bytearray(len(pixels) // 3 * 4)
+        offset = 1 if msb else 0
+        for i in range(3):
+            wide[offset + i::4] = pixels[i::3]
+        pixels, bpp = wide, 32
+    values = array.array(PIXEL_TYPES[bpp])
+    if values.itemsize != bpp // 8:
+        values = array.array('L' if bpp == 32 else 'I')
+        if values.itemsize != bpp // 8:
+            raise ValueError("No suitable array type for {0}-bit pixels"
+                             .format(bpp))
+    values.frombytes(pixels)
+    if bpp > 8 and msb != (sys.byteorder == 'big'):
+        values.byteswap()
+    return values
+
+
+def colors(header, data, pixels):
+    """
+    Compute colors of the distinct pixel values.
+
+    :param header: Parsed XwdHeader.
+    :param data: Raw XWD image bytes.
+    :param pixels: Iterable of distinct pixel values.
+    :return: Dict of pixel values to (r, g, b) tuples.
+    """
+    if header.visual_class in (TRUE_COLOR, DIRECT_COLOR):
+        shifts = [_shift(m) for m in (header.red_mask, header.green_mask,
+                                      header.blue_mask)]
+        return {p: tuple(_scale((p >> s) & ((1 << n) - 1), n)
+                         for s, n in shifts) for p in pixels}
+    colormap = header.colormap(data)
+    return {p: colormap.get(p, (0, 0, 0)) for p in pixels}
+
+
+def quantize(rgb):
+    """
+    Map a color to the fixed 3-3-2 bit palette.
+
+    :param rgb: Tuple of (r, g, b).
+    :return: Palette index.
+    """
+    r, g, b = rgb
+    return (r & 0xE0) | ((g & 0xE0) >> 3) | (b >> 6)
+
+
+# Palette, used when image has more than 256 colors.
+QUANTIZED_PALETTE = [((i & 0xE0) | (i & 0xE0) >> 3 | (i & 0xE0) >> 6,
+                      ((i << 3) & 0xE0) | (i & 0x1C) | (i & 0x1C) >> 3,
+                      (i & 3) * 0x55) for i in range(256)]
+
+
+def decode(data, region=None, fixed=None):
+    """
+    Decode XWD image into an indexed image.
+
+    :param data: Raw XWD image bytes or Pixmap.
+    :param region: Tuple of (left, top, width, height) to decode
+                   (None - whole image).
+    :param fixed: Palette to map the image onto (None - use the colors of
+                  the image).
+    :return: IndexedImage.
+    """
+    if isinstance(data, Pixmap):
+        header, data = data.layout, data.pixels
+    else:
+        header = XwdHeader(data)
+    left, top, width, height = region or (0, 0, header.width, header.height)
+    values = pixel_values(header, data, region)
+    inverse = None
+    if numpy is not None:
+        # Pixels are replaced with indices of their distinct values, so that
+        # the lookup table is applied to the whole image at once.
+        ordered = numpy.sort(values)
+        distinct = ordered[numpy.flatnonzero(
+            numpy.diff(ordered, prepend=ordered[:1] + 1))]
+        inverse = numpy.searchsorted(distinct, values)
+        distinct = distinct.tolist()
+    else:
+        distinct = set(values)
+    rgbs = colors(header, data, distinct)
+    if fixed is not None:
+        palette = fixed.colors
+        lut = {p: fixed.nearest(rgb) for p, rgb in rgbs.items()}
+    else:
+        palette = sorted(set(rgbs.values()))
+        if len(palette) <= 256:
+            index = {rgb: i for i, rgb in enumerate(palette)}
+            lut = {p: index[rgb] for p, rgb in rgbs.items()}
+        else:
+            palette = QUANTIZED_PALETTE
+            lut = {p: quantize(rgb) for p, rgb in rgbs.items()}
+    if inverse is not None:
+        table = numpy.array([lut[p] for p in distinct], numpy.uint8)
+        pixels = table[inverse].tobytes()
+    else:
+        pixels = bytes(map(lut.__getitem__, values))
+    return image.IndexedImage(width, height, pixels, palette, left, top,
+                              (header.width, header.height))
+
+
+def convertimage(image, region=None, palette=None, encode=gifencode.encode):
+    """
+    Convert XWD image into a still GIF frame without external tools.
+
+    :param image: Raw XWD image bytes or Pixmap.
+    :param region: Tuple of (left, top, width, height) to crop the frame to
+                   (None - whole image).
+    :param palette: Palette to map the frame onto (None - use the colors of
+                    the frame).
+    :param encode: Function to encode the indexed frame with (GIF still by
+                   default).
+    :return: Compressed image.
+    """
+    return encode(decode(image, region, palette))
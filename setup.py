@@ -13,6 +13,10 @@ setuptools.setup(
     long_description_content_type="text/markdown",
     url="https://github.com/tmp6154/pyttygif",
     packages=setuptools.find_packages(),
+    extras_require={
+        "numpy": ["numpy"],
+        "zstd": ["zstandard"],
+    },
     classifiers=[
         "Development Status :: 4 - Beta",
         "Environment :: Console",